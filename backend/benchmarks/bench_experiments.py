@@ -0,0 +1,99 @@
+"""
+Experiment List Benchmark
+
+Seeds a scratch database with N experiments (and a few runs each), then
+measures GET /api/experiments-style list latency: the old per-experiment
+count_documents enrichment (101 round trips per page) against reading the
+stored run_count, plus the time of the one-off reconciliation aggregation.
+Needs a running MongoDB; the scratch database is dropped afterwards.
+
+Usage (from backend/):
+    python benchmarks/bench_experiments.py --experiments 10000 --runs 3
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.generation_store import reconcile_experiment_stats  # noqa: E402
+
+
+async def seed(db, experiments: int, runs: int) -> None:
+    now = datetime.now(timezone.utc)
+    exp_docs, run_docs = [], []
+    for i in range(experiments):
+        exp_id = str(uuid.uuid4())
+        updated = now - timedelta(seconds=i)
+        exp_docs.append({'id': exp_id, 'name': f'exp {i}', 'created_at': updated, 'updated_at': updated})
+        for j in range(runs):
+            run_docs.append({
+                'id': str(uuid.uuid4()), 'experiment_id': exp_id, 'prompt': f'prompt {i}.{j}',
+                'created_at': now - timedelta(seconds=i, milliseconds=j),
+                'results': [{'model_name': 'molt5', 'smiles': 'CCO', 'is_valid': True}],
+            })
+    await db.experiments.insert_many(exp_docs)
+    for start in range(0, len(run_docs), 10000):
+        await db.generation_history.insert_many(run_docs[start:start + 10000])
+    await db.experiments.create_index('updated_at')
+    await db.generation_history.create_index('experiment_id')
+
+
+async def list_with_counts(db):
+    experiments = await db.experiments.find({}, {'_id': 0}).sort('updated_at', -1).to_list(length=100)
+    for exp in experiments:
+        exp['run_count'] = await db.generation_history.count_documents({'experiment_id': exp['id']})
+    return experiments
+
+
+async def list_stored(db):
+    return await db.experiments.find({}, {'_id': 0}).sort('updated_at', -1).to_list(length=100)
+
+
+async def timed(fn, db, repeats: int):
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        await fn(db)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return statistics.median(latencies), max(latencies)
+
+
+async def main(args) -> None:
+    client = AsyncIOMotorClient(args.mongo_url)
+    db = client[args.db_name]
+    try:
+        await client.drop_database(args.db_name)
+        start = time.perf_counter()
+        await seed(db, args.experiments, args.runs)
+        print(f"seeded {args.experiments} experiments, {args.experiments * args.runs} runs "
+              f"in {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        summary = await reconcile_experiment_stats(db)
+        print(f"reconcile: {summary} in {time.perf_counter() - start:.2f}s")
+
+        for label, fn in (('count_documents per row', list_with_counts), ('stored run_count', list_stored)):
+            p50, worst = await timed(fn, db, args.repeats)
+            print(f"{label:<24} p50={p50:8.1f}ms  max={worst:8.1f}ms")
+    finally:
+        await client.drop_database(args.db_name)
+        client.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mongo-url', default='mongodb://localhost:27017')
+    parser.add_argument('--db-name', default='bench_experiments')
+    parser.add_argument('--experiments', type=int, default=10000)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--repeats', type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
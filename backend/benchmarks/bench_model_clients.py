@@ -0,0 +1,107 @@
+"""
+Model Client Connection Pooling Benchmark
+
+Starts a local stub text2mol server and compares the old per-call
+aiohttp.ClientSession pattern against the pooled, long-lived client session.
+
+Usage (from backend/):
+    python benchmarks/bench_model_clients.py --requests 2000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from dataclasses import replace
+from pathlib import Path
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.model_clients import ModelClient, get_model_clients  # noqa: E402
+
+
+async def stub_text2mol(request: web.Request) -> web.Response:
+    await request.json()
+    return web.json_response({
+        'success': True,
+        'data': {
+            'smiles': ['c1ccccc1'],
+            'confidence': [0.95],
+            'model_name': 'stub',
+            'model_version': 'stub-1',
+            'execution_time_ms': 1
+        }
+    })
+
+
+async def start_stub_server(port: int) -> web.AppRunner:
+    app = web.Application()
+    app.router.add_post('/api/text2mol', stub_text2mol)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    return runner
+
+
+async def per_call_session(url: str, text: str) -> None:
+    """Baseline: the pre-pooling client behaviour (new session per call)"""
+    async with aiohttp.ClientSession() as session:
+        async with session.post(url, json={'text': text, 'options': {}}) as response:
+            await response.json()
+
+
+async def run_load(call, total: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await call(f"benzene {i}")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    return latencies, elapsed
+
+
+def report(label: str, latencies, elapsed: float) -> None:
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{label:<18} p50={statistics.median(latencies):7.2f}ms "
+        f"p95={p95:7.2f}ms  throughput={len(latencies) / elapsed:8.1f} req/s"
+    )
+
+
+async def main(args) -> None:
+    runner = await start_stub_server(args.port)
+    url = f"http://127.0.0.1:{args.port}/api/text2mol"
+    client = ModelClient(replace(get_model_clients()['molt5'].spec, urls=[url]))
+    await client.start()
+    try:
+        # Warm-up both paths
+        await run_load(lambda t: per_call_session(url, t), 50, 10)
+        await run_load(client.generate, 50, 10)
+
+        lat, elapsed = await run_load(lambda t: per_call_session(url, t), args.requests, args.concurrency)
+        report("per-call session", lat, elapsed)
+
+        lat, elapsed = await run_load(client.generate, args.requests, args.concurrency)
+        report("pooled session", lat, elapsed)
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--port', type=int, default=18765)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,92 @@
+"""
+Parsed Molecule Cache Benchmark
+
+Replays the SMILES parsing one generation request does on its way through the
+backend (candidate ranking, conformer cache lookup, validation, 3D/docking
+preparation) over a workload where popular molecules repeat, and compares
+parsing with Chem.MolFromSmiles every time against the shared mol_cache.
+
+Usage (from backend/):
+    python benchmarks/bench_mol_cache.py --requests 20000 --molecules 500
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+from rdkit import Chem, RDLogger
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.mol_cache import MolCache  # noqa: E402
+
+SEED_SMILES = [
+    'CC(=O)Oc1ccccc1C(=O)O',
+    'CN1C=NC2=C1C(=O)N(C(=O)N2C)C',
+    'CC(C)Cc1ccc(C(C)C(=O)O)cc1',
+    'CC(=O)Nc1ccc(O)cc1',
+    'Nc1ncnc2c1ncn2C3OC(CO)C(O)C3O',
+    'c1ccc2ccccc2c1',
+    'CCN(CC)CCNC(=O)c1ccc(N)cc1',
+    'COc1ccc2[nH]cc(CCN(C)C)c2c1',
+]
+
+# Parses of one molecule per request, in pipeline order
+PARSES_PER_REQUEST = ('rank', 'canonical', 'validate', 'embed')
+
+
+def make_corpus(n: int):
+    """`n` distinct valid molecules derived from the seed set"""
+    corpus = []
+    i = 0
+    while len(corpus) < n:
+        base = SEED_SMILES[i % len(SEED_SMILES)]
+        corpus.append(base + 'C' * (i // len(SEED_SMILES)))
+        i += 1
+    return corpus
+
+
+def uncached(smiles: str) -> None:
+    for _ in PARSES_PER_REQUEST:
+        mol = Chem.MolFromSmiles(smiles)
+        Chem.MolToSmiles(mol)
+
+
+def cached(cache: MolCache, smiles: str) -> None:
+    for step in PARSES_PER_REQUEST:
+        if step == 'canonical':
+            cache.canonical(smiles)
+        else:
+            cache.get_mol(smiles)
+
+
+def run(label: str, fn, workload) -> None:
+    start = time.perf_counter()
+    for smiles in workload:
+        fn(smiles)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<16} {elapsed / len(workload) * 1e6:9.1f} us/request  total={elapsed:6.2f}s")
+
+
+def main(args) -> None:
+    RDLogger.DisableLog('rdApp.*')
+    rng = random.Random(42)
+    corpus = make_corpus(args.molecules)
+    # Zipf-like popularity: a few molecules are requested far more often
+    weights = [1 / (rank + 1) for rank in range(len(corpus))]
+    workload = rng.choices(corpus, weights=weights, k=args.requests)
+
+    run("MolFromSmiles", uncached, workload)
+    cache = MolCache(max_entries=args.cache_size)
+    run("mol_cache", lambda s: cached(cache, s), workload)
+    print(f"cache: {cache.stats()}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--molecules', type=int, default=500)
+    parser.add_argument('--cache-size', type=int, default=10000)
+    main(parser.parse_args())
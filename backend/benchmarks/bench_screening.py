@@ -0,0 +1,93 @@
+"""
+Screening Throughput Benchmark
+
+Prepares a synthetic receptor (protein-density atoms around a spherical
+pocket) with the target store's preparation task, then docks a ligand library
+with chem_tasks.dock_ligands: once serially in this process, and once in
+chunks across the chem process pool, the way a screening job runs.
+
+Usage (from backend/):
+    python benchmarks/bench_screening.py --ligands 200 --chunk-size 8
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services import chem_tasks  # noqa: E402
+from services.chem_executor import ChemExecutor  # noqa: E402
+from services.docking_service import docking_engine  # noqa: E402
+
+CENTER = (0.0, 0.0, 0.0)
+LIBRARY = [
+    'CC(=O)Oc1ccccc1C(=O)O', 'CN1C=NC2=C1C(=O)N(C(=O)N2C)C', 'CC(C)Cc1ccc(C(C)C(=O)O)cc1',
+    'CC(=O)Nc1ccc(O)cc1', 'Nc1ncnc2c1ncn2C3OC(CO)C(O)C3O', 'c1ccc2ccccc2c1',
+    'CCN(CC)CCNC(=O)c1ccc(N)cc1', 'COc1ccc2[nH]cc(CCN(C)C)c2c1', 'CC(C)NCC(O)COc1cccc2ccccc12',
+    'CN1CCC[C@H]1c1cccnc1', 'O=C(O)c1ccccc1O', 'CC12CCC3c4ccc(O)cc4CCC3C1CCC2O',
+]
+
+
+def synthetic_receptor(path: str, atoms: int, seed: int = 0) -> None:
+    """PDB file of backbone-like atoms filling a shell 6-18 A around CENTER"""
+    rng = np.random.default_rng(seed)
+    points = rng.uniform(-18, 18, size=(atoms * 4, 3))
+    radii = np.linalg.norm(points, axis=1)
+    points = points[(radii > 6) & (radii < 18)][:atoms]
+    names = [('N', 'N'), ('CA', 'C'), ('C', 'C'), ('O', 'O')]
+    with open(path, 'w') as f:
+        for i, (x, y, z) in enumerate(points):
+            name, element = names[i % 4]
+            f.write(f"ATOM  {i + 1:5d}  {name:<3s} ALA A{i // 4 + 1:4d}    "
+                    f"{x:8.3f}{y:8.3f}{z:8.3f}  1.00  0.00          {element:>2s}\n")
+
+
+async def run_pool(library, grid_dir, chunk_size, workers):
+    executor = ChemExecutor(max_workers=workers, task_timeout=600)
+    await executor.start()
+    try:
+        chunks = [library[i:i + chunk_size] for i in range(0, len(library), chunk_size)]
+        start = time.perf_counter()
+        await executor.map(chem_tasks.dock_ligands, chunks, grid_dir=grid_dir, center=CENTER,
+                           search=docking_engine.search)
+        return time.perf_counter() - start
+    finally:
+        await executor.close()
+
+
+def main(args) -> None:
+    library = [LIBRARY[i % len(LIBRARY)] for i in range(args.ligands)]
+    with tempfile.TemporaryDirectory() as tmp:
+        pdb_path = os.path.join(tmp, 'receptor.pdb')
+        grid_dir = os.path.join(tmp, 'cache')
+        synthetic_receptor(pdb_path, args.atoms)
+        start = time.perf_counter()
+        summary = chem_tasks.prepare_target(pdb_path, grid_dir, CENTER, 24.0, 0.4)
+        print(f"target: {summary['atoms']} atoms, grid {summary['grid_shape']} "
+              f"({summary['grid_mb']} MB) prepared in {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        chem_tasks.dock_ligands(library[:args.serial], grid_dir, CENTER, docking_engine.search)
+        serial = (time.perf_counter() - start) / args.serial
+        print(f"serial        {1 / serial:7.1f} ligands/s  ({serial * 1000:.0f} ms per ligand)")
+
+        elapsed = asyncio.run(run_pool(library, grid_dir, args.chunk_size, args.workers))
+        print(f"pool x{args.workers:<3}     {len(library) / elapsed:7.1f} ligands/s  "
+              f"({len(library)} ligands in {elapsed:.1f}s)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ligands', type=int, default=200)
+    parser.add_argument('--serial', type=int, default=24)
+    parser.add_argument('--atoms', type=int, default=3000)
+    parser.add_argument('--chunk-size', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    main(parser.parse_args())
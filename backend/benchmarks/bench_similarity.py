@@ -0,0 +1,100 @@
+"""
+Similarity Index Benchmark
+
+Fills a SimilarityIndex with N fingerprints and measures top-k Tanimoto query
+latency of the packed NumPy matrix (np.bitwise_count), against RDKit's
+BulkTanimotoSimilarity over ExplicitBitVects on a smaller sample.
+
+Real Morgan fingerprints are computed for a set of seed molecules; the
+remaining rows are those fingerprints with random bits flipped, which keeps a
+realistic bit density without fingerprinting a million molecules first.
+
+Usage (from backend/):
+    python benchmarks/bench_similarity.py --size 1000000 --queries 20
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from rdkit import DataStructs
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.chem_tasks import morgan_fingerprints  # noqa: E402
+from services.similarity_index import SimilarityIndex, tanimoto  # noqa: E402
+
+SEED_SMILES = [
+    'CC(=O)Oc1ccccc1C(=O)O', 'CN1C=NC2=C1C(=O)N(C(=O)N2C)C', 'CC(C)Cc1ccc(C(C)C(=O)O)cc1',
+    'CC(=O)Nc1ccc(O)cc1', 'Nc1ncnc2c1ncn2C3OC(CO)C(O)C3O', 'c1ccc2ccccc2c1',
+    'CCN(CC)CCNC(=O)c1ccc(N)cc1', 'COc1ccc2[nH]cc(CCN(C)C)c2c1', 'CC(C)NCC(O)COc1cccc2ccccc12',
+    'CN1CCC[C@H]1c1cccnc1', 'O=C(O)c1ccccc1O', 'CC12CCC3c4ccc(O)cc4CCC3C1CCC2O',
+]
+
+
+def build_rows(size: int, n_bits: int, rng: np.random.Generator) -> np.ndarray:
+    packed, _ = morgan_fingerprints(SEED_SMILES, n_bits=n_bits)
+    seeds = np.unpackbits(np.frombuffer(packed, dtype=np.uint8).reshape(len(SEED_SMILES), -1), axis=1)
+    rows = seeds[rng.integers(0, len(SEED_SMILES), size)]
+    # Flip ~1% of bits so rows differ while staying sparse
+    flips = rng.random(rows.shape, dtype=np.float32) < 0.01
+    rows ^= flips.astype(np.uint8)
+    return np.packbits(rows, axis=1)
+
+
+def timed(fn, repeats: int):
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return statistics.median(latencies), max(latencies)
+
+
+def main(args) -> None:
+    rng = np.random.default_rng(42)
+    index = SimilarityIndex(n_bits=args.bits)
+    start = time.perf_counter()
+    for offset in range(0, args.size, 50_000):
+        count = min(50_000, args.size - offset)
+        rows = build_rows(count, args.bits, rng)
+        meta = [(f"r{offset + i}", '', None, None) for i in range(count)]
+        index._append(meta, rows.tobytes(), [True] * count)
+    print(f"index: {len(index)} fingerprints x {args.bits} bits, "
+          f"{index.stats()['matrix_mb']} MB, filled in {time.perf_counter() - start:.1f}s")
+
+    size = len(index)
+    fps, counts = index._fps[:size], index._counts[:size]
+    query = fps[0].copy()
+
+    def numpy_topk():
+        scores = tanimoto(fps, counts, query)
+        top = np.argpartition(scores, -args.k)[-args.k:]
+        return top[np.argsort(scores[top])[::-1]]
+
+    p50, worst = timed(numpy_topk, args.queries)
+    print(f"numpy bitwise_count  n={size:>9}  p50={p50:8.1f}ms  max={worst:8.1f}ms")
+
+    sample = min(args.baseline_size, size)
+    bitvects = []
+    for row in np.unpackbits(fps[:sample].view(np.uint8), axis=1):
+        bv = DataStructs.ExplicitBitVect(args.bits)
+        bv.SetBitsFromList(np.flatnonzero(row).tolist())
+        bitvects.append(bv)
+    query_bv = bitvects[0]
+    p50, worst = timed(lambda: DataStructs.BulkTanimotoSimilarity(query_bv, bitvects), args.queries)
+    print(f"RDKit BulkTanimoto   n={sample:>9}  p50={p50:8.1f}ms  max={worst:8.1f}ms "
+          f"(~{p50 * size / sample:.0f}ms extrapolated to n={size})")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=1_000_000)
+    parser.add_argument('--bits', type=int, default=2048)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=20)
+    parser.add_argument('--baseline-size', type=int, default=100_000)
+    main(parser.parse_args())
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime, timezone
 import uuid
 
@@ -7,14 +7,47 @@ class MoleculeGenerationRequest(BaseModel):
     prompt: str
     models: List[str] = ["model_a"]
     experiment_id: Optional[str] = None # Link to experiment
+    num_candidates: int = Field(default=1, ge=1, le=20) # Top-N SMILES per model
+    use_cache: bool = True # Set False to bypass the generation result cache
+    latency_budget_ms: Optional[int] = Field(default=None, ge=1) # End-to-end deadline for model calls
+    hedge: bool = False # Duplicate slow calls to a second model replica
+
+class BatchGenerationRequest(BaseModel):
+    prompts: List[str] = Field(..., min_length=1, max_length=10000)
+    models: List[str] = ["model_a"]
+    experiment_id: Optional[str] = None
+    num_candidates: int = Field(default=1, ge=1, le=20)
+    use_cache: bool = True
+
+class ConformerBatchRequest(BaseModel):
+    smiles: List[str] = Field(..., min_length=1, max_length=5000)
+    num_conformers: int = Field(default=10, ge=1, le=100) # Conformers embedded per molecule
+    force_field: Literal["uff", "mmff"] = "uff" # MMFF falls back to UFF when parameters are missing
+    return_all: bool = False # False: lowest-energy conformer only
+    seed: int = 42
+
+class DescriptorRequest(BaseModel):
+    smiles: Optional[List[str]] = Field(default=None, max_length=100000)
+    experiment_id: Optional[str] = None # Use every molecule generated in this experiment
+    format: Literal["json", "arrow", "parquet"] = "json" # arrow/parquet need pyarrow (requirements-optional.txt)
+
+class MoleculeCandidate(BaseModel):
+    smiles: str
+    canonical_smiles: Optional[str] = None
+    confidence: float
+    is_valid: bool = True
 
 class SingleModelResult(BaseModel):
     model_name: str
-    smiles: str
+    smiles: str # Best-ranked candidate
     confidence: float
     execution_time: float
     model_version: Optional[str] = None
     is_valid: bool = True
+    candidates: List[MoleculeCandidate] = [] # De-duplicated, ranked by confidence
+    cached: bool = False # Served from the generation result cache
+    hedged: bool = False # A duplicate request went to a second replica
+    status: str = "ok" # ok | fallback (mock) | timed_out | cancelled | error
 
 class GenerationRecord(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -34,6 +67,13 @@ class ExperimentCreate(BaseModel):
     name: str
     description: Optional[str] = None
 
+class ExperimentRunSummary(BaseModel):
+    id: str # GenerationRecord id
+    prompt: str
+    created_at: datetime
+    num_results: int
+    num_valid: int
+
 class Experiment(BaseModel):
     model_config = ConfigDict(extra="ignore")
     
@@ -42,4 +82,5 @@ class Experiment(BaseModel):
     description: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-    run_count: int = 0 # Computed field
+    run_count: int = 0 # Maintained with $inc on every run insert
+    last_run: Optional[ExperimentRunSummary] = None # Latest run, set with run_count
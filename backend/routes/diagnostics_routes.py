@@ -0,0 +1,13 @@
+from fastapi import APIRouter, Depends
+from services.db_indexes import explain_query_plans
+
+router = APIRouter(prefix="/diagnostics", tags=["diagnostics"])
+
+def get_db():
+    from server import db
+    return db
+
+@router.get("/query-plans")
+async def get_query_plans(db=Depends(get_db)):
+    """explain() of every route query: winning plan stages and indexes, with collection scans flagged"""
+    return await explain_query_plans(db)
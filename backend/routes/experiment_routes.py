@@ -1,10 +1,15 @@
-from fastapi import APIRouter, HTTPException, Depends, Body
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Body, Query
+from fastapi.responses import Response, StreamingResponse
+from typing import List, Optional
+import asyncio
+from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorDatabase
 import os
-from datetime import datetime, timezone
 from models import Experiment, ExperimentCreate, GenerationRecord, MoleculeGenerationRequest
 from services.molecule_service import generate_molecules
+from services.generation_store import save_record, history_page, created_between, NEXT_CURSOR_HEADER
+from services.history_export import export_history, EXPORT_FORMATS, EXPORT_MEDIA_TYPES
+from services.streaming import stream_generation_events, STREAM_MEDIA_TYPES, STREAM_HEADERS
 
 router = APIRouter(prefix="/experiments", tags=["experiments"])
 
@@ -15,23 +20,14 @@ def get_db():
 @router.post("/", response_model=Experiment)
 async def create_experiment(experiment: ExperimentCreate, db=Depends(get_db)):
     exp_obj = Experiment(**experiment.model_dump())
-    doc = exp_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['updated_at'] = doc['updated_at'].isoformat()
-    
-    await db.experiments.insert_one(doc)
+    await db.experiments.insert_one(exp_obj.model_dump())
     return exp_obj
 
 @router.get("/", response_model=List[Experiment])
 async def list_experiments(db=Depends(get_db)):
+    # run_count / last_run are stored on the experiment (see services/generation_store.py)
     cursor = db.experiments.find({}, {"_id": 0}).sort("updated_at", -1)
     experiments = await cursor.to_list(length=100)
-    
-    # Enrich with run counts (optional optimization: store count in experiment doc)
-    for exp in experiments:
-        count = await db.generation_history.count_documents({"experiment_id": exp['id']})
-        exp['run_count'] = count
-        
     return experiments
 
 @router.get("/{experiment_id}", response_model=Experiment)
@@ -39,26 +35,65 @@ async def get_experiment(experiment_id: str, db=Depends(get_db)):
     exp = await db.experiments.find_one({"id": experiment_id}, {"_id": 0})
     if not exp:
         raise HTTPException(status_code=404, detail="Experiment not found")
-    
-    # Get run count
-    exp['run_count'] = await db.generation_history.count_documents({"experiment_id": experiment_id})
     return exp
 
 @router.get("/{experiment_id}/runs", response_model=List[GenerationRecord])
-async def get_experiment_runs(experiment_id: str, db=Depends(get_db)):
-    cursor = db.generation_history.find({"experiment_id": experiment_id}, {"_id": 0}).sort("created_at", -1)
-    runs = await cursor.to_list(length=200)
+async def get_experiment_runs(
+    experiment_id: str,
+    response: Response,
+    limit: int = Query(200, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    since: Optional[datetime] = Query(None, description="Only runs created at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only runs created before this time"),
+    db=Depends(get_db)
+):
+    """Runs of the experiment, newest first; the X-Next-Cursor header (absent on the last page) fetches the next page"""
+    query = {"experiment_id": experiment_id, **created_between(since, until)}
+    try:
+        runs, next_cursor = await history_page(db, query, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return runs
 
+@router.get("/{experiment_id}/runs/export")
+async def export_experiment_runs(
+    experiment_id: str,
+    format: str = Query("ndjson"),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    db=Depends(get_db)
+):
+    """Every run of the experiment, newest first: NDJSON (one record per line) or CSV (one row per model result)"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    if not await db.experiments.find_one({"id": experiment_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Experiment not found")
+    return StreamingResponse(
+        export_history(db, {"experiment_id": experiment_id, **created_between(since, until)}, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={'Content-Disposition': f'attachment; filename="experiment_{experiment_id}_runs.{format}"'}
+    )
+
 @router.post("/{experiment_id}/generate", response_model=GenerationRecord)
 async def generate_in_experiment(experiment_id: str, request: MoleculeGenerationRequest, db=Depends(get_db)):
-    # Verify experiment exists
-    exp = await db.experiments.find_one({"id": experiment_id})
+    # Verify the experiment exists while the models run
+    generation = asyncio.ensure_future(generate_molecules(
+        request.prompt, request.models, request.num_candidates, use_cache=request.use_cache,
+        latency_budget_ms=request.latency_budget_ms, hedge=request.hedge
+    ))
+    exp = None
+    try:
+        exp = await db.experiments.find_one({"id": experiment_id}, {"_id": 1})
+    finally:
+        if not exp:
+            generation.cancel()
     if not exp:
         raise HTTPException(status_code=404, detail="Experiment not found")
 
     try:
-        results = await generate_molecules(request.prompt, request.models)
+        results = await generation
         
         record = GenerationRecord(
             prompt=request.prompt,
@@ -66,17 +101,37 @@ async def generate_in_experiment(experiment_id: str, request: MoleculeGeneration
             experiment_id=experiment_id
         )
         
-        doc = record.model_dump()
-        doc['created_at'] = doc['created_at'].isoformat()
-        
-        await db.generation_history.insert_one(doc)
-        
-        # Update experiment timestamp
-        await db.experiments.update_one(
-            {"id": experiment_id},
-            {"$set": {"updated_at": datetime.now(timezone.utc).isoformat()}}
-        )
+        # Save to history (also updates the experiment timestamp)
+        await save_record(db, record)
         
         return record
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/{experiment_id}/generate/stream")
+async def generate_in_experiment_stream(
+    experiment_id: str,
+    request: MoleculeGenerationRequest,
+    format: str = Query("sse", pattern="^(sse|ndjson)$"),
+    db=Depends(get_db)
+):
+    """Streaming variant of /{experiment_id}/generate (per-model SSE/NDJSON events)"""
+    exp = await db.experiments.find_one({"id": experiment_id})
+    if not exp:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+    
+    async def persist(results):
+        record = GenerationRecord(
+            prompt=request.prompt,
+            results=results,
+            experiment_id=experiment_id
+        )
+        await save_record(db, record)
+        return record
+    
+    events = stream_generation_events(
+        request.prompt, request.models, format, persist,
+        num_candidates=request.num_candidates, use_cache=request.use_cache,
+        latency_budget_ms=request.latency_budget_ms, hedge=request.hedge
+    )
+    return StreamingResponse(events, media_type=STREAM_MEDIA_TYPES[format], headers=STREAM_HEADERS)
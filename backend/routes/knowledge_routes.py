@@ -88,10 +88,7 @@ async def chat_with_knowledge_base(request: ChatRequest, db=Depends(get_db)):
             )
             
             # Store in DB
-            await db.chat_history.insert_many([
-                {**user_msg.model_dump(), 'created_at': user_msg.created_at.isoformat()},
-                {**assistant_msg.model_dump(), 'created_at': assistant_msg.created_at.isoformat()}
-            ])
+            await db.chat_history.insert_many([user_msg.model_dump(), assistant_msg.model_dump()])
             
             return ChatResponse(
                 answer=result['answer'],
@@ -180,3 +177,10 @@ async def get_available_models():
     """Get list of available Text-to-Molecule models"""
     from services.molecule_service import get_available_models
     return await get_available_models()
+
+
+@router.get("/models/health")
+async def get_models_health():
+    """Background health monitor state: probe history and latency EWMA per model"""
+    from services.molecule_service import get_models_health
+    return get_models_health()
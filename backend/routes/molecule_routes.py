@@ -1,16 +1,32 @@
-from fastapi import APIRouter, HTTPException, Depends, Body
+from fastapi import APIRouter, HTTPException, Depends, Body, Query
+from fastapi.responses import Response, StreamingResponse
 from typing import List, Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
+import asyncio
+import json
 import os
 from bson import ObjectId
 from datetime import datetime, timezone
-from models import MoleculeGenerationRequest, GenerationRecord, GenerationHistoryResponse
-from services.molecule_service import generate_molecules
-from rdkit import Chem
-from rdkit.Chem import AllChem
+from models import MoleculeGenerationRequest, BatchGenerationRequest, ConformerBatchRequest, DescriptorRequest, GenerationRecord, GenerationHistoryResponse
+from services.molecule_service import generate_molecules, get_generation_stats
+from services.generation_store import save_record, save_records, experiment_smiles, history_page, created_between, history_writer, NEXT_CURSOR_HEADER
+from services.history_export import export_history, EXPORT_FORMATS, EXPORT_MEDIA_TYPES
+from services.streaming import stream_generation_events, STREAM_MEDIA_TYPES, STREAM_HEADERS
+from services import chem_tasks
+from services.chem_executor import chem_executor, ChemTaskError, ChemTaskTimeout
+from services.conformer_cache import conformer_cache
+from services.mol_cache import mol_cache
+from services.descriptor_service import compute_descriptors, to_arrow_ipc, to_parquet
+from services.similarity_index import similarity_index
+from services.substructure_index import substructure_index
 
 router = APIRouter(prefix="/molecules", tags=["molecules"])
 
+# Max prompts of one batch request being generated at the same time
+BATCH_GENERATION_CONCURRENCY = int(os.environ.get('BATCH_GENERATION_CONCURRENCY', '256'))
+# RDKit threads per conformer task, so concurrent pool workers share the cores
+CONFORMER_THREADS = max(1, (os.cpu_count() or 1) // chem_executor.max_workers)
+
 def get_db():
     from server import db
     return db
@@ -21,7 +37,10 @@ async def generate_molecule_from_text(request: MoleculeGenerationRequest, db=Dep
         raise HTTPException(status_code=422, detail="Prompt cannot be empty")
     
     try:
-        results = await generate_molecules(request.prompt, request.models)
+        results = await generate_molecules(
+            request.prompt, request.models, request.num_candidates, use_cache=request.use_cache,
+            latency_budget_ms=request.latency_budget_ms, hedge=request.hedge
+        )
         
         record = GenerationRecord(
             prompt=request.prompt,
@@ -29,26 +48,132 @@ async def generate_molecule_from_text(request: MoleculeGenerationRequest, db=Dep
         )
         
         # Save to history
-        doc = record.model_dump()
-        doc['created_at'] = doc['created_at'].isoformat()
-        await db.generation_history.insert_one(doc)
+        await save_record(db, record)
         
         return record
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/generate/stream")
+async def generate_molecule_stream(
+    request: MoleculeGenerationRequest,
+    format: str = Query("sse", pattern="^(sse|ndjson)$"),
+    db=Depends(get_db)
+):
+    """
+    Streaming variant of /generate: emits each model's result as SSE (default)
+    or NDJSON as soon as it completes, then the persisted GenerationRecord.
+    """
+    if not request.prompt or not request.prompt.strip():
+        raise HTTPException(status_code=422, detail="Prompt cannot be empty")
+    
+    async def persist(results):
+        record = GenerationRecord(prompt=request.prompt, results=results)
+        await save_record(db, record)
+        return record
+    
+    events = stream_generation_events(
+        request.prompt, request.models, format, persist,
+        num_candidates=request.num_candidates, use_cache=request.use_cache,
+        latency_budget_ms=request.latency_budget_ms, hedge=request.hedge
+    )
+    return StreamingResponse(events, media_type=STREAM_MEDIA_TYPES[format], headers=STREAM_HEADERS)
+
+@router.post("/generate/batch")
+async def generate_molecules_batch(request: BatchGenerationRequest, db=Depends(get_db)):
+    """
+    Generate molecules for many prompts. Model calls are micro-batched per model;
+    results are streamed back as NDJSON lines ({"index", "record"}) as each prompt
+    completes, and all records are saved with one bulk insert at the end.
+    """
+    if any(not prompt or not prompt.strip() for prompt in request.prompts):
+        raise HTTPException(status_code=422, detail="Prompts cannot be empty")
+    
+    semaphore = asyncio.Semaphore(BATCH_GENERATION_CONCURRENCY)
+    
+    async def run_prompt(index: int, prompt: str):
+        async with semaphore:
+            results = await generate_molecules(
+                prompt, request.models, request.num_candidates,
+                batched=True, use_cache=request.use_cache
+            )
+        return index, GenerationRecord(
+            prompt=prompt,
+            results=results,
+            experiment_id=request.experiment_id
+        )
+    
+    async def stream():
+        tasks = [asyncio.create_task(run_prompt(i, p)) for i, p in enumerate(request.prompts)]
+        records = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, record = await next_done
+                records.append(record)
+                yield json.dumps({"index": index, "record": record.model_dump(mode="json")}) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Single bulk insert for the whole batch (also on client disconnect)
+            await save_records(db, records)
+        yield json.dumps({"done": True, "count": len(records)}) + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@router.get("/stats")
+async def get_generation_pipeline_stats():
+    """Counters for the generation pipeline (coalesced calls, cache hits/misses/evictions) and the RDKit pool"""
+    return {
+        **get_generation_stats(),
+        'chem_executor': chem_executor.stats(),
+        'conformer_cache': conformer_cache.stats(),
+        'mol_cache': mol_cache.stats(),
+        'similarity_index': similarity_index.stats(),
+        'substructure_index': substructure_index.stats(),
+        'history_writer': history_writer.stats(),
+    }
+
 @router.get("/history", response_model=List[GenerationRecord])
-async def get_history(db=Depends(get_db)):
-    cursor = db.generation_history.find({}, {"_id": 0}).sort("created_at", -1).limit(50)
-    history = await cursor.to_list(length=50)
+async def get_history(
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    since: Optional[datetime] = Query(None, description="Only records created at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only records created before this time"),
+    db=Depends(get_db)
+):
+    """Generation history, newest first; the X-Next-Cursor header (absent on the last page) fetches the next page"""
+    try:
+        history, next_cursor = await history_page(db, created_between(since, until), limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return history
 
+@router.get("/history/export")
+async def export_history_records(
+    format: str = Query("ndjson"),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    db=Depends(get_db)
+):
+    """Whole generation history, newest first: NDJSON (one record per line) or CSV (one row per model result)"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    return StreamingResponse(
+        export_history(db, created_between(since, until), format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={'Content-Disposition': f'attachment; filename="generation_history.{format}"'}
+    )
+
 @router.patch("/history/{record_id}")
 async def update_history_description(record_id: str, prompt: str = Body(..., embed=True), db=Depends(get_db)):
-    # Find and update
+    # Find and update (a record still queued by the write-behind writer is written first)
+    await history_writer.settle(record_id)
     result = await db.generation_history.update_one(
         {"id": record_id},
-        {"$set": {"prompt": prompt, "updated_at": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {"prompt": prompt, "updated_at": datetime.now(timezone.utc)}}
     )
     
     if result.matched_count == 0:
@@ -57,8 +182,15 @@ async def update_history_description(record_id: str, prompt: str = Body(..., emb
     return {"status": "success", "message": "Description updated"}
 
 @router.post("/regenerate/{record_id}", response_model=GenerationRecord)
-async def regenerate_molecule(record_id: str, models: List[str] = Body(..., embed=True), db=Depends(get_db)):
+async def regenerate_molecule(
+    record_id: str,
+    models: List[str] = Body(..., embed=True),
+    num_candidates: int = Body(1, embed=True, ge=1, le=20),
+    use_cache: bool = Body(True, embed=True),
+    db=Depends(get_db)
+):
     # Get original record to retrieve prompt
+    await history_writer.settle(record_id)
     record = await db.generation_history.find_one({"id": record_id})
     if not record:
         raise HTTPException(status_code=404, detail="Record not found")
@@ -67,7 +199,7 @@ async def regenerate_molecule(record_id: str, models: List[str] = Body(..., embe
     
     try:
         # Generate NEW results
-        results = await generate_molecules(prompt, models)
+        results = await generate_molecules(prompt, models, num_candidates, use_cache=use_cache)
         
         # Create NEW record (Versioning strategy: New record is safest)
         new_record = GenerationRecord(
@@ -75,11 +207,7 @@ async def regenerate_molecule(record_id: str, models: List[str] = Body(..., embe
             results=results
         )
         
-        doc = new_record.model_dump()
-        doc['created_at'] = doc['created_at'].isoformat()
-        doc['parent_id'] = record_id # Link to parent if we want to track versions later
-        
-        await db.generation_history.insert_one(doc)
+        await save_record(db, new_record, parent_id=record_id)
         
         return new_record
     except Exception as e:
@@ -88,39 +216,132 @@ async def regenerate_molecule(record_id: str, models: List[str] = Body(..., embe
 @router.get("/3d")
 async def get_3d_structure(smiles: str):
     """
-    Generate 3D coordinates for a SMILES string using RDKit.
+    Generate 3D coordinates for a SMILES string using RDKit (in the chem process pool),
+    served from the conformer cache when this molecule was embedded before.
     Returns SDF format string.
     """
     try:
-        mol = Chem.MolFromSmiles(smiles)
-        if not mol:
-            raise HTTPException(status_code=400, detail="Invalid SMILES string")
-            
-        mol = Chem.AddHs(mol)
-        
-        # Generate 3D coords
-        # Use random seed for reproducibility if needed, or -1
-        res = AllChem.EmbedMolecule(mol, randomSeed=42)
-        
-        if res == -1:
-            # Try again with random coordinates if standard embedding fails
-            res = AllChem.EmbedMolecule(mol, useRandomCoords=True)
-            if res == -1:
-                 # Last resort: just compute 2D and pretend it's 3D (flat) or fail?
-                 # Better to fail or return 2D block
-                 # Let's try UFF optimization just in case it helps fix geometry
-                 pass
-
-        if res != -1:
-            try:
-                AllChem.UFFOptimizeMolecule(mol)
-            except:
-                pass # Optimization might fail but we have coords
-        
-        # Convert to SDF/MolBlock
-        sdf_block = Chem.MolToMolBlock(mol)
-        return {"sdf": sdf_block}
-        
-    except Exception as e:
-        # Fallback or error
+        sdf_block = await conformer_cache.get_molblock(smiles)
+    except ChemTaskTimeout:
+        raise HTTPException(status_code=504, detail="3D structure generation timed out")
+    except ChemTaskError as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate 3D structure: {str(e)}")
+    if sdf_block is None:
+        raise HTTPException(status_code=400, detail="Invalid SMILES string")
+    return {"sdf": sdf_block}
+
+@router.post("/3d/batch")
+async def get_3d_structures_batch(request: ConformerBatchRequest):
+    """
+    Embed `num_conformers` conformers per SMILES (multi-conformer ETKDG) and
+    force-field optimize all of them, molecules spread over the chem process pool.
+    Streams NDJSON lines ({"index", "smiles", "canonical_smiles", "force_field",
+    "conformers": [{"conf_id", "energy", "converged", "molblock"}]}) as each
+    molecule completes, lowest energy first; invalid or failed molecules carry
+    "error" instead. Ends with {"done": true, "count"}.
+    """
+    async def embed(index: int, smiles: str):
+        try:
+            result = await chem_executor.run(
+                chem_tasks.embed_conformers, smiles, request.num_conformers, request.seed,
+                request.force_field, request.return_all, CONFORMER_THREADS
+            )
+        except ChemTaskError as e:
+            return {"index": index, "smiles": smiles, "error": str(e)}
+        if result is None:
+            return {"index": index, "smiles": smiles, "error": "Invalid SMILES string"}
+        return {"index": index, "smiles": smiles, **result}
+    
+    async def stream():
+        tasks = [asyncio.create_task(embed(i, s)) for i, s in enumerate(request.smiles)]
+        count = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done) + "\n"
+                count += 1
+        finally:
+            for task in tasks:
+                task.cancel()
+        yield json.dumps({"done": True, "count": count}) + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@router.post("/descriptors")
+async def get_descriptors_bulk(request: DescriptorRequest, db=Depends(get_db)):
+    """
+    Descriptors (MW, logP, TPSA, QED, HBD/HBA, Lipinski, ...) for a SMILES list or
+    for every molecule generated in an experiment, computed in chunks across the
+    chem process pool. JSON output is columnar: {"count", "columns": {name: [values]}};
+    format=arrow / parquet return an Arrow IPC stream / Parquet file instead.
+    """
+    smiles = list(request.smiles or [])
+    if request.experiment_id:
+        smiles = list(dict.fromkeys(smiles + await experiment_smiles(db, request.experiment_id)))
+    if not smiles:
+        raise HTTPException(status_code=422, detail="Provide smiles or an experiment_id with generated molecules")
+    
+    try:
+        table = await compute_descriptors(smiles)
+    except ChemTaskTimeout:
+        raise HTTPException(status_code=504, detail="Descriptor computation timed out")
+    
+    try:
+        if request.format == "parquet":
+            return Response(to_parquet(table), media_type="application/vnd.apache.parquet",
+                            headers={"Content-Disposition": 'attachment; filename="descriptors.parquet"'})
+        if request.format == "arrow":
+            return Response(to_arrow_ipc(table), media_type="application/vnd.apache.arrow.stream")
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    return {"count": len(smiles), "columns": table}
+
+@router.get("/similar")
+async def search_similar_molecules(
+    smiles: str,
+    k: int = Query(10, ge=1, le=1000),
+    threshold: float = Query(0.0, ge=0.0, le=1.0),
+    experiment_id: Optional[str] = None
+):
+    """
+    Earlier generated molecules most similar to `smiles` (Morgan fingerprint
+    Tanimoto), best first, optionally limited to one experiment. `ready` is false
+    while the index is still being built from history at startup.
+    """
+    try:
+        hits = await similarity_index.search(smiles, k, threshold, experiment_id)
+    except ChemTaskTimeout:
+        raise HTTPException(status_code=504, detail="Fingerprint computation timed out")
+    if hits is None:
+        raise HTTPException(status_code=400, detail="Invalid SMILES string")
+    return {
+        "query": smiles,
+        "ready": similarity_index.ready,
+        "indexed": len(similarity_index),
+        "hits": hits,
+    }
+
+@router.get("/substructure")
+async def search_substructure(
+    smarts: str,
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: Optional[int] = Query(None, ge=0),
+    experiment_id: Optional[str] = None
+):
+    """
+    Earlier generated molecules containing the SMARTS pattern, most recent first,
+    optionally limited to one experiment. Candidates are pre-screened with pattern
+    fingerprints and then matched exactly in the chem process pool. Pass
+    `next_cursor` back as `cursor` for the next page (null on the last page).
+    """
+    try:
+        page = await substructure_index.search(smarts, limit, cursor, experiment_id)
+    except ChemTaskTimeout:
+        raise HTTPException(status_code=504, detail="Substructure search timed out")
+    if page is None:
+        raise HTTPException(status_code=400, detail="Invalid SMARTS pattern")
+    return {
+        "query": smarts,
+        "ready": substructure_index.ready,
+        "indexed": len(substructure_index),
+        **page,
+    }
@@ -1,14 +1,18 @@
-from fastapi import APIRouter, HTTPException, Body
-from pydantic import BaseModel
-from typing import List, Optional
-import asyncio
-import random
-import requests
-from rdkit import Chem
-from rdkit.Chem import AllChem
+from fastapi import APIRouter, HTTPException, Body, Depends, Query
+from pydantic import BaseModel, Field
+from typing import List, Optional, Tuple
+from services.chem_executor import ChemTaskError, ChemTaskTimeout
+from services.docking_service import docking_engine
+from services.generation_store import experiment_smiles
+from services.screening_service import screening_jobs
+from services.target_store import target_store, TargetUnavailable
 
 router = APIRouter(prefix="/simulation", tags=["simulation"])
 
+def get_db():
+    from server import db
+    return db
+
 class DockingRequest(BaseModel):
     ligand_smiles: str
     target_id: str 
@@ -19,99 +23,116 @@ class DockingResult(BaseModel):
     target_pdb: str 
     score_breakdown: dict
 
-# Preset Targets with PDB IDs and approx active site centers (x,y,z)
-TARGETS = {
-    "covid_protease": {"id": "6LU7", "name": "SARS-CoV-2 Main Protease", "center": (-10.7, 12.4, 68.8)},
-    "hiv_protease": {"id": "1HSG", "name": "HIV-1 Protease", "center": (16.0, 26.0, 5.0)},
-    "breast_cancer": {"id": "3ERT", "name": "Estrogen Receptor Alpha", "center": (30.0, -2.0, 25.0)},
-}
+class TargetRegistration(BaseModel):
+    target_id: str = Field(..., pattern=r"^[A-Za-z0-9_-]{1,64}$")
+    name: str
+    center: Tuple[float, float, float]  # Active site center (x, y, z) in Angstrom
+    pdb_id: Optional[str] = None  # Fetched in the background when no structure is uploaded
+    pdb: Optional[str] = None  # Receptor structure (PDB file contents)
+
+class ScreeningRequest(BaseModel):
+    target_id: str
+    ligands: Optional[List[str]] = Field(None, max_length=100000)  # SMILES to dock
+    experiment_id: Optional[str] = None  # Also dock every molecule generated in this experiment
 
-# Fallback PDB (Small part of a helix) if RCSB fails
-MOCK_PROTEIN_PDB = """ATOM      1  N   ALA A   1       0.000   0.000   0.000  1.00  0.00           N  
-ATOM      2  CA  ALA A   1       1.458   0.000   0.000  1.00  0.00           C  
-ATOM      3  C   ALA A   1       2.009   1.396   0.000  1.00  0.00           C  
-ATOM      4  O   ALA A   1       1.272   2.432   0.000  1.00  0.00           O  
-ATOM      5  CB  ALA A   1       2.000  -0.767   1.217  1.00  0.00           C  
-"""
+@router.get("/targets")
+async def list_docking_targets():
+    """Docking targets of the local target store and whether each is ready, mock (no structure file yet), preparing or failed"""
+    return target_store.list_targets()
+
+@router.post("/targets")
+async def register_docking_target(request: TargetRegistration):
+    """
+    Register (or update) a docking target. The structure is stored in the target
+    directory and prepared (parsed and grid maps computed) before returning;
+    without `pdb`, it is taken from the directory or fetched by `pdb_id`.
+    """
+    try:
+        await target_store.register(
+            request.target_id, request.name, request.center, pdb_id=request.pdb_id, pdb_text=request.pdb
+        )
+    except ChemTaskTimeout:
+        raise HTTPException(status_code=504, detail="Target preparation timed out")
+    except ChemTaskError as e:
+        raise HTTPException(status_code=400, detail=f"Could not prepare target: {str(e)}")
+    return next(t for t in target_store.list_targets() if t["target_id"] == request.target_id)
 
 @router.post("/docking/run", response_model=DockingResult)
 async def run_docking_simulation(request: DockingRequest):
-    # 1. Fetch Target PDB 
-    target_info = TARGETS.get(request.target_id)
-    if not target_info:
+    """
+    Dock a ligand into a target: rigid pose search scored on the target's
+    precomputed grid maps (van der Waals, electrostatic, desolvation, torsional
+    terms in kcal/mol). Deterministic for a given ligand and target. Targets
+    without a structure file yet are docked against a mock structure.
+    """
+    if request.target_id not in target_store.targets:
         raise HTTPException(status_code=404, detail="Target not found")
-        
-    pdb_id = target_info["id"]
-    target_pdb_data = MOCK_PROTEIN_PDB # Default fallback
     
     try:
-        # Real fetch from RCSB PDB
-        # Add timeout to avoid hanging
-        pdb_url = f"https://files.rcsb.org/download/{pdb_id}.pdb"
-        response = requests.get(pdb_url, timeout=5)
-        if response.status_code == 200:
-            target_pdb_data = response.text
-    except Exception as e:
-        print(f"PDB Fetch Warning: {e}")
-        # Continue with mock if fetch fails
+        result = await docking_engine.dock(request.ligand_smiles, request.target_id)
+    except (KeyError, TargetUnavailable) as e:
+        if request.target_id not in target_store.targets:
+            raise HTTPException(status_code=404, detail="Target not found")  # Removed while docking
+        raise HTTPException(status_code=503, detail=f"Target structure unavailable: {str(e)}")
+    except ChemTaskTimeout:
+        raise HTTPException(status_code=504, detail="Docking timed out")
+    except ChemTaskError as e:
+        raise HTTPException(status_code=500, detail=f"Simulation failed: {str(e)}")
+    if result is None:
+        raise HTTPException(status_code=400, detail="Invalid SMILES string")
+    
+    return DockingResult(
+        affinity=round(result["affinity"], 2),
+        ligand_pdb=result["ligand_pdb"],
+        target_pdb=result["target_pdb"],
+        score_breakdown={name: round(value, 2) for name, value in result["score_breakdown"].items()}
+    )
 
-    # 2. Prepare Ligand (RDKit)
+@router.post("/screening")
+async def start_screening_job(request: ScreeningRequest, db=Depends(get_db)):
+    """
+    Start a virtual screening job: dock a ligand list and/or every molecule of an
+    experiment against one target, in parallel across the chem process pool.
+    Returns the job immediately; poll GET /screening/{job_id} for progress and
+    /screening/{job_id}/results for the ranked results stored so far.
+    """
+    if request.target_id not in target_store.targets:
+        raise HTTPException(status_code=404, detail="Target not found")
     try:
-        mol = Chem.MolFromSmiles(request.ligand_smiles)
-        if not mol:
-             raise Exception("Invalid SMILES")
-             
-        mol = Chem.AddHs(mol)
-        res = AllChem.EmbedMolecule(mol, randomSeed=42)
-        if res == -1:
-             res = AllChem.EmbedMolecule(mol, useRandomCoords=True)
-             
-        if res != -1:
-            try:
-                AllChem.UFFOptimizeMolecule(mol)
-            except: pass
-        
-        # 3. Translation
-        conf = mol.GetConformer()
-        center = target_info["center"]
-        
-        # Calculate current centroid
-        centroid = [0,0,0]
-        num_atoms = mol.GetNumAtoms()
-        for i in range(num_atoms):
-            pos = conf.GetAtomPosition(i)
-            centroid[0] += pos.x
-            centroid[1] += pos.y
-            centroid[2] += pos.z
-        
-        if num_atoms > 0:
-            centroid = [c/num_atoms for c in centroid]
-            shift = [center[0]-centroid[0], center[1]-centroid[1], center[2]-centroid[2]]
-            
-            # Apply shift
-            for i in range(num_atoms):
-                pos = conf.GetAtomPosition(i)
-                conf.SetAtomPosition(i, [pos.x+shift[0], pos.y+shift[1], pos.z+shift[2]])
-            
-        ligand_pdb_block = Chem.MolToPDBBlock(mol)
-        
-        # 4. Calculate Mock Affinity
-        mw = Chem.rdMolDescriptors.CalcExactMolWt(mol)
-        base_score = -5.0 - (mw / 100.0 * 0.5) 
-        affinity = base_score + random.uniform(-1.5, 0.5)
-        
-        await asyncio.sleep(1.0)
-        
-        return DockingResult(
-            affinity=round(affinity, 2),
-            ligand_pdb=ligand_pdb_block,
-            target_pdb=target_pdb_data,
-            score_breakdown={
-                "van_der_waals": round(affinity * 0.6, 2),
-                "electrostatic": round(affinity * 0.3, 2),
-                "desolvation": round(affinity * 0.1, 2)
-            }
-        )
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Simulation failed: {str(e)}")
+        await target_store.get_grids(request.target_id)
+    except TargetUnavailable as e:
+        raise HTTPException(status_code=503, detail=f"Target structure unavailable: {str(e)}")
+    
+    ligands = list(request.ligands or [])
+    if request.experiment_id:
+        ligands += await experiment_smiles(db, request.experiment_id)
+    if not ligands:
+        raise HTTPException(status_code=422, detail="Provide ligands or an experiment_id with generated molecules")
+    return await screening_jobs.submit(request.target_id, ligands, request.experiment_id)
+
+@router.get("/screening/{job_id}")
+async def get_screening_job(job_id: str):
+    """Status and progress (completed/failed counts, throughput, ETA, best affinity) of a screening job"""
+    job = await screening_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Screening job not found")
+    return job
+
+@router.get("/screening/{job_id}/results")
+async def get_screening_results(
+    job_id: str,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    failed: bool = False
+):
+    """Docked ligands so far, best affinity first (partial while the job runs); failed=true lists failures"""
+    if await screening_jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Screening job not found")
+    return await screening_jobs.results(job_id, limit, offset, failed)
+
+@router.delete("/screening/{job_id}")
+async def cancel_screening_job(job_id: str):
+    """Cancel a queued or running screening job (results stored so far are kept)"""
+    if not await screening_jobs.cancel(job_id):
+        raise HTTPException(status_code=404, detail="No active screening job with this id")
+    return {"status": "success", "message": "Screening job cancelled"}
@@ -0,0 +1,55 @@
+"""
+Check Query Plans
+
+Runs explain() on every route query declared in services/db_indexes.py and
+prints the winning plan of each; exits with status 1 if any of them scans a
+whole collection (COLLSCAN), so it can gate a deploy or CI run. Blocking
+in-memory sorts are reported but do not fail the check.
+
+Usage (from backend/, uses MONGO_URL / DB_NAME from the environment or .env):
+    python scripts/check_query_plans.py [--create-indexes]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# Before importing services, which read their settings from the environment at import
+load_dotenv(Path(__file__).resolve().parent.parent / '.env')
+
+from services.db_indexes import ensure_indexes, explain_query_plans  # noqa: E402
+
+
+async def main(args) -> int:
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    try:
+        db = client[os.environ['DB_NAME']]
+        if args.create_indexes:
+            summary = await ensure_indexes(db)
+            for collection, error in summary['failed'].items():
+                print(f"index setup failed for {collection}: {error}")
+        report = await explain_query_plans(db)
+    finally:
+        client.close()
+
+    for plan in report['plans']:
+        if 'error' in plan:
+            status, detail = 'ERROR', plan['error']
+        else:
+            status = 'COLLSCAN' if plan['collscan'] else 'SORT' if plan['blocking_sort'] else 'ok'
+            detail = ' <- '.join(plan['stages']) + (f"  [{', '.join(plan['indexes'])}]" if plan['indexes'] else '')
+        print(f"{status:<9} {plan['collection']:<19} {plan['query']:<48} {detail}")
+    print(f"{len(report['collscans'])} collection scan(s), {len(report['blocking_sorts'])} blocking sort(s)")
+    return 0 if report['ok'] else 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--create-indexes', action='store_true', help='run the startup index bootstrap first')
+    sys.exit(asyncio.run(main(parser.parse_args())))
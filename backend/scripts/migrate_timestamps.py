@@ -0,0 +1,49 @@
+"""
+Migrate Timestamps
+
+Converts timestamps stored as ISO strings into BSON dates in
+generation_history, experiments, chat_history and screening_jobs
+(services/timestamp_migration.py). Batched and resumable: rerunning it after
+an interruption continues from the last checkpoint; --restart rescans
+everything, e.g. after an older build wrote more string timestamps.
+
+Usage (from backend/, uses MONGO_URL / DB_NAME from the environment or .env):
+    python scripts/migrate_timestamps.py [--batch-size 1000] [--restart]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# Before importing services, which read their settings from the environment at import
+load_dotenv(Path(__file__).resolve().parent.parent / '.env')
+
+from services.timestamp_migration import migrate_timestamps, MIGRATION_BATCH_SIZE  # noqa: E402
+
+
+async def main(args) -> None:
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    try:
+        start = time.perf_counter()
+        summary = await migrate_timestamps(client[os.environ['DB_NAME']], args.batch_size, args.restart)
+        for collection, progress in summary.items():
+            print(f"{collection:<19} {progress['converted']:>9} converted  {progress['unparseable']:>6} unparseable")
+        print(f"done in {time.perf_counter() - start:.2f}s")
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--batch-size', type=int, default=MIGRATION_BATCH_SIZE)
+    parser.add_argument('--restart', action='store_true', help='ignore the stored checkpoint and rescan')
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(parser.parse_args()))
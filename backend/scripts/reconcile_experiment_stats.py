@@ -0,0 +1,39 @@
+"""
+Reconcile Experiment Statistics
+
+One-off backfill of each experiment's stored `run_count` and `last_run` from
+`generation_history` (one aggregation plus one bulk write). Run it after
+deploying stored run counts, or whenever they are suspected to have drifted.
+
+Usage (from backend/, uses MONGO_URL / DB_NAME from the environment or .env):
+    python scripts/reconcile_experiment_stats.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# Before importing services, which read their settings from the environment at import
+load_dotenv(Path(__file__).resolve().parent.parent / '.env')
+
+from services.generation_store import reconcile_experiment_stats  # noqa: E402
+
+
+async def main() -> None:
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    try:
+        start = time.perf_counter()
+        summary = await reconcile_experiment_stats(client[os.environ['DB_NAME']])
+        print(f"{summary} in {time.perf_counter() - start:.2f}s")
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
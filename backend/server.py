@@ -5,14 +5,28 @@ from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
-from routes import molecule_routes, experiment_routes, knowledge_routes, simulation_routes
 
 ROOT_DIR = Path(__file__).parent.parent
+# Load .env before importing routes and services: their settings are read from the environment at import
 load_dotenv(ROOT_DIR / 'backend/.env')
 
+from routes import molecule_routes, experiment_routes, knowledge_routes, simulation_routes, diagnostics_routes  # noqa: E402
+from services.db_indexes import ensure_indexes  # noqa: E402
+from services.generation_store import NEXT_CURSOR_HEADER, history_writer  # noqa: E402
+from services.model_clients import start_model_clients, close_model_clients  # noqa: E402
+from services.generation_cache import generation_cache  # noqa: E402
+from services.health_monitor import health_monitor  # noqa: E402
+from services.chem_executor import chem_executor  # noqa: E402
+from services.conformer_cache import conformer_cache  # noqa: E402
+from services.similarity_index import similarity_index  # noqa: E402
+from services.substructure_index import substructure_index  # noqa: E402
+from services.target_store import target_store  # noqa: E402
+from services.screening_service import screening_jobs  # noqa: E402
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# Stored timestamps are BSON dates; read them back as UTC-aware datetimes
+client = AsyncIOMotorClient(mongo_url, tz_aware=True)
 db = client[os.environ['DB_NAME']]
 
 # Create the main app without a prefix
@@ -30,6 +44,7 @@ api_router.include_router(molecule_routes.router)
 api_router.include_router(experiment_routes.router)
 api_router.include_router(knowledge_routes.router)
 api_router.include_router(simulation_routes.router)
+api_router.include_router(diagnostics_routes.router)
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -40,11 +55,90 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def startup_db_indexes():
+    summary = await ensure_indexes(db)
+    if summary['failed']:
+        logger.warning(f"Index setup incomplete for: {', '.join(summary['failed'])}")
+
+@app.on_event("startup")
+async def startup_model_clients():
+    await start_model_clients()
+
+@app.on_event("startup")
+async def startup_generation_cache():
+    await generation_cache.attach(db)
+
+@app.on_event("startup")
+async def startup_conformer_cache():
+    await conformer_cache.attach(db)
+
+@app.on_event("startup")
+async def startup_health_monitor():
+    health_monitor.start()
+
+@app.on_event("startup")
+async def startup_chem_executor():
+    await chem_executor.start()
+
+@app.on_event("startup")
+async def startup_target_store():
+    target_store.start()
+
+@app.on_event("startup")
+async def startup_screening_jobs():
+    await screening_jobs.start(db)
+
+@app.on_event("startup")
+async def startup_similarity_index():
+    similarity_index.start(db)
+
+@app.on_event("startup")
+async def startup_substructure_index():
+    substructure_index.start(db)
+
+@app.on_event("startup")
+async def startup_history_writer():
+    history_writer.start(db)
+
+@app.on_event("shutdown")
+async def shutdown_history_writer():
+    await history_writer.stop()
+
+@app.on_event("shutdown")
+async def shutdown_substructure_index():
+    await substructure_index.stop()
+
+@app.on_event("shutdown")
+async def shutdown_similarity_index():
+    await similarity_index.stop()
+
+@app.on_event("shutdown")
+async def shutdown_screening_jobs():
+    await screening_jobs.stop()
+
+@app.on_event("shutdown")
+async def shutdown_target_store():
+    await target_store.stop()
+
+@app.on_event("shutdown")
+async def shutdown_chem_executor():
+    await chem_executor.close()
+
+@app.on_event("shutdown")
+async def shutdown_health_monitor():
+    await health_monitor.stop()
+
+@app.on_event("shutdown")
+async def shutdown_model_clients():
+    await close_model_clients()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
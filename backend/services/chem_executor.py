@@ -0,0 +1,268 @@
+"""
+RDKit Process Pool
+
+Runs CPU-bound chemistry (services/chem_tasks.py) in a pool of worker
+processes so a slow embedding never blocks the event loop. Each worker is a
+long-lived process fed over a pipe; a task that exceeds its timeout, or whose
+caller is cancelled, has its worker killed and replaced, so a runaway
+macrocycle embedding cannot hold a worker forever.
+
+    sdf = await chem_executor.run(chem_tasks.embed_3d, smiles)
+
+Configuration (environment):
+- CHEM_POOL_SIZE (worker processes, default min(4, CPU count))
+- CHEM_TASK_TIMEOUT_SECONDS (default per-task timeout, default 30)
+- CHEM_POOL_START_METHOD (multiprocessing start method, default spawn)
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from services import chem_tasks
+
+logger = logging.getLogger(__name__)
+
+CHEM_POOL_SIZE = int(os.environ.get('CHEM_POOL_SIZE', str(min(4, os.cpu_count() or 1))))
+CHEM_TASK_TIMEOUT_SECONDS = float(os.environ.get('CHEM_TASK_TIMEOUT_SECONDS', '30'))
+CHEM_POOL_START_METHOD = os.environ.get('CHEM_POOL_START_METHOD', 'spawn')
+# Task latencies kept for percentile metrics
+CHEM_LATENCY_WINDOW = 500
+# Time allowed for a new worker to start and import RDKit
+CHEM_WORKER_START_TIMEOUT_SECONDS = 60
+
+
+class ChemTaskError(Exception):
+    """A chemistry task raised inside its worker, or the worker died"""
+
+
+class ChemTaskTimeout(ChemTaskError):
+    """A chemistry task exceeded its timeout and its worker was recycled"""
+
+
+def _worker_main(conn) -> None:
+    """Worker process loop: receive (fn, args, kwargs), send back (ok, value)"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Shutdown is driven by the parent
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+        fn, args, kwargs = message
+        try:
+            reply = (True, fn(*args, **kwargs))
+        except Exception as e:
+            reply = (False, f"{type(e).__name__}: {e}")
+        conn.send(reply)
+
+
+class _Worker:
+    """One worker process and the parent's end of its pipe"""
+
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout=1)
+        self.conn.close()
+
+
+class ChemExecutor:
+    """Fixed-size pool of RDKit worker processes with per-task timeouts"""
+
+    def __init__(self, max_workers: int = CHEM_POOL_SIZE,
+                 task_timeout: float = CHEM_TASK_TIMEOUT_SECONDS,
+                 start_method: str = CHEM_POOL_START_METHOD):
+        self.max_workers = max(1, max_workers)
+        self.task_timeout = task_timeout
+        self._ctx = multiprocessing.get_context(start_method)
+        self._workers: List[_Worker] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self._closed = False
+        self._drained: Optional[asyncio.Event] = None  # Set when the last running task ends during close()
+        self._start_lock = asyncio.Lock()
+        self._latencies: Deque[float] = deque(maxlen=CHEM_LATENCY_WINDOW)
+        self._waits: Deque[float] = deque(maxlen=CHEM_LATENCY_WINDOW)
+        self.queued = 0
+        self.running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.cancelled = 0
+        self.recycled = 0
+
+    @property
+    def started(self) -> bool:
+        return self._idle is not None
+
+    async def start(self) -> None:
+        """Spawn the workers and wait until each has imported RDKit"""
+        async with self._start_lock:
+            if self.started:
+                return
+            self._closed = False
+            self._idle = asyncio.Queue()
+            self._workers = [_Worker(self._ctx) for _ in range(self.max_workers)]
+            await asyncio.gather(*(self._warm(worker) for worker in self._workers))
+
+    async def close(self) -> None:
+        """
+        Stop all workers (app shutdown). New and still-queued tasks are rejected
+        with ChemTaskError; tasks already on a worker are waited for, up to the
+        default task timeout.
+        """
+        if not self.started or self._closed:
+            return
+        self._closed = True
+        if self.running:
+            self._drained = asyncio.Event()
+            try:
+                await asyncio.wait_for(self._drained.wait(), self.task_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Chem pool closed with {self.running} tasks still running")
+        workers, self._workers, self._idle = self._workers, [], None
+        await asyncio.get_running_loop().run_in_executor(None, lambda: [w.stop() for w in workers])
+
+    async def run(self, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Run `fn(*args, **kwargs)` in a worker process. `fn` must be a picklable
+        top-level function (see services/chem_tasks.py). Raises ChemTaskTimeout
+        after `timeout` seconds (default CHEM_TASK_TIMEOUT_SECONDS) and
+        ChemTaskError if the task raised or its worker died.
+        """
+        if self._closed:
+            raise ChemTaskError(f"{fn.__name__}: chem pool is shut down")
+        if not self.started:
+            await self.start()
+        idle = self._idle  # close() drops the pool's queue; workers are returned to this one
+        self.submitted += 1
+        self.queued += 1
+        queued_at = time.perf_counter()
+        try:
+            worker = await idle.get()
+        finally:
+            self.queued -= 1
+        if self._closed:
+            idle.put_nowait(worker)
+            raise ChemTaskError(f"{fn.__name__}: chem pool is shut down")
+        started_at = time.perf_counter()
+        self._waits.append(started_at - queued_at)
+        self.running += 1
+        try:
+            ok, value = await asyncio.wait_for(
+                self._call(worker, fn, args, kwargs),
+                timeout if timeout is not None else self.task_timeout
+            )
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            self._recycle(worker)
+            raise ChemTaskTimeout(f"{fn.__name__} timed out") from None
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            self._recycle(worker)
+            raise
+        except (EOFError, OSError) as e:
+            self.failed += 1
+            self._recycle(worker)
+            raise ChemTaskError(f"{fn.__name__}: worker died ({e})") from None
+        finally:
+            self.running -= 1
+            if self._drained is not None and not self.running:
+                self._drained.set()
+
+        idle.put_nowait(worker)
+        self._latencies.append(time.perf_counter() - started_at)
+        if not ok:
+            self.failed += 1
+            raise ChemTaskError(value)
+        self.completed += 1
+        return value
+
+    async def map(self, fn: Callable[..., Any], items: List[Any], **kwargs) -> List[Any]:
+        """Run `fn(item, **kwargs)` for every item across the pool, preserving order"""
+        return list(await asyncio.gather(*(self.run(fn, item, **kwargs) for item in items)))
+
+    @staticmethod
+    async def _call(worker: _Worker, fn: Callable[..., Any], args: tuple, kwargs: Dict) -> Any:
+        loop = asyncio.get_running_loop()
+        readable = loop.create_future()
+        fd = worker.conn.fileno()
+        loop.add_reader(fd, lambda: readable.done() or readable.set_result(None))
+        try:
+            worker.conn.send((fn, args, kwargs))
+            await readable
+        finally:
+            loop.remove_reader(fd)
+        return worker.conn.recv()
+
+    async def _warm(self, worker: _Worker) -> None:
+        """Make a new worker import RDKit, then hand it to the idle queue"""
+        try:
+            await asyncio.wait_for(
+                self._call(worker, chem_tasks.warmup, (), {}),
+                CHEM_WORKER_START_TIMEOUT_SECONDS
+            )
+        except Exception as e:
+            logger.warning(f"Chem worker warm-up failed: {e}")
+        if self._idle is not None:
+            self._idle.put_nowait(worker)
+
+    def _recycle(self, worker: _Worker) -> None:
+        """Kill a busy or broken worker and start a fresh one in its place"""
+        self.recycled += 1
+        worker.kill()
+        if self._idle is None or self._closed:
+            return  # Pool is shutting down
+        replacement = _Worker(self._ctx)
+        self._workers = [replacement if w is worker else w for w in self._workers]
+        asyncio.create_task(self._warm(replacement))
+
+    @staticmethod
+    def _quantile_ms(samples: Deque[float], q: float) -> Optional[float]:
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000, 2)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'workers': len(self._workers),
+            'queue_depth': self.queued,
+            'running': self.running,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'timed_out': self.timed_out,
+            'cancelled': self.cancelled,
+            'recycled_workers': self.recycled,
+            'task_latency_p50_ms': self._quantile_ms(self._latencies, 0.5),
+            'task_latency_p95_ms': self._quantile_ms(self._latencies, 0.95),
+            'queue_wait_p95_ms': self._quantile_ms(self._waits, 0.95),
+        }
+
+
+# Shared pool (started/stopped with the app in server.py)
+chem_executor = ChemExecutor()
@@ -0,0 +1,395 @@
+"""
+RDKit Tasks
+
+CPU-bound chemistry run inside the chem executor's worker processes
+(services/chem_executor.py). Every function here is a picklable top-level
+function that takes and returns plain Python data; invalid input is reported
+in the return value (None / {'valid': False}) rather than raised.
+"""
+
+import os
+import shutil
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from rdkit import Chem, DataStructs
+from rdkit.Chem import AllChem, Crippen, Descriptors, Lipinski, QED, rdFingerprintGenerator, rdMolDescriptors
+
+from services import docking_grid
+from services.mol_cache import canonical_smiles, get_mol
+
+
+def warmup() -> bool:
+    """No-op used to import RDKit in a freshly started worker"""
+    return Chem.MolFromSmiles('C') is not None
+
+
+def canonicalize(smiles_list: Sequence[str]) -> List[Optional[str]]:
+    """RDKit canonical SMILES of each input; None where the SMILES is invalid"""
+    return [canonical_smiles(smiles) for smiles in smiles_list]
+
+
+def _embed(smiles: str, seed: int = 42) -> Optional[Chem.Mol]:
+    """Hydrogens added, 3D-embedded and UFF-optimized molecule; None for invalid SMILES"""
+    mol = get_mol(smiles)
+    if not mol:
+        return None
+    mol = Chem.AddHs(mol)
+    res = AllChem.EmbedMolecule(mol, randomSeed=seed)
+    if res == -1:
+        # Try again with random coordinates if standard embedding fails
+        res = AllChem.EmbedMolecule(mol, useRandomCoords=True)
+    if res != -1:
+        try:
+            AllChem.UFFOptimizeMolecule(mol)
+        except Exception:
+            pass  # Optimization might fail but we have coords
+    return mol
+
+
+def embed_3d(smiles: str, seed: int = 42) -> Optional[str]:
+    """MolBlock with 3D coordinates for a SMILES string; None if the SMILES is invalid"""
+    mol = _embed(smiles, seed)
+    if mol is None:
+        return None
+    return Chem.MolToMolBlock(mol)
+
+
+def embed_conformers(smiles: str, num_conformers: int = 10, seed: int = 42,
+                     force_field: str = 'uff', return_all: bool = False,
+                     num_threads: int = 0) -> Optional[Dict]:
+    """
+    Embed `num_conformers` conformers with multi-conformer ETKDG and optimize
+    all of them with UFF or MMFF, both using RDKit's own threads
+    (`num_threads`, 0 = all cores). Returns conformers sorted by energy, lowest
+    first (only the lowest unless `return_all`); None for invalid SMILES.
+    """
+    mol = get_mol(smiles)
+    if not mol:
+        return None
+    mol = Chem.AddHs(mol)
+
+    params = AllChem.ETKDGv3()
+    params.randomSeed = seed
+    params.numThreads = num_threads
+    conf_ids = list(AllChem.EmbedMultipleConfs(mol, numConfs=num_conformers, params=params))
+    if not conf_ids:
+        # Try again with random coordinates if standard embedding fails
+        params.useRandomCoords = True
+        conf_ids = list(AllChem.EmbedMultipleConfs(mol, numConfs=num_conformers, params=params))
+    if not conf_ids:
+        return {'canonical_smiles': canonical_smiles(smiles), 'force_field': None, 'conformers': []}
+
+    if force_field == 'mmff' and AllChem.MMFFHasAllMoleculeParams(mol):
+        outcomes = AllChem.MMFFOptimizeMoleculeConfs(mol, numThreads=num_threads)
+    else:
+        force_field = 'uff'
+        outcomes = AllChem.UFFOptimizeMoleculeConfs(mol, numThreads=num_threads)
+
+    conformers = sorted(
+        (
+            {'conf_id': conf_id, 'energy': round(energy, 4), 'converged': not_converged == 0}
+            for conf_id, (not_converged, energy) in zip(conf_ids, outcomes)
+        ),
+        key=lambda c: c['energy']
+    )
+    if not return_all:
+        conformers = conformers[:1]
+    for conformer in conformers:
+        conformer['molblock'] = Chem.MolToMolBlock(mol, confId=conformer['conf_id'])
+
+    return {
+        'canonical_smiles': canonical_smiles(smiles),
+        'force_field': force_field,
+        'conformers': conformers,
+    }
+
+
+def prepare_ligand(molblock: str) -> Dict:
+    """
+    Docking input of an embedded ligand (MolBlock, e.g. from the conformer
+    cache) in the united-atom form of AutoDock: Gasteiger charges of nonpolar
+    hydrogens merged into their carbon, and only heavy atoms and polar
+    hydrogens scored. Returns all atom coordinates, the indices of the scored
+    atoms with their elements and charges, rotatable bond count and exact mass.
+    """
+    mol = Chem.MolFromMolBlock(molblock, removeHs=False)
+    AllChem.ComputeGasteigerCharges(mol)
+    charges = [atom.GetDoubleProp('_GasteigerCharge') for atom in mol.GetAtoms()]
+    charges = [0.0 if c != c else c for c in charges]  # NaN for unsupported elements
+    scored = []
+    for atom in mol.GetAtoms():
+        if atom.GetAtomicNum() == 1 and all(n.GetAtomicNum() == 6 for n in atom.GetNeighbors()):
+            for neighbor in atom.GetNeighbors():
+                charges[neighbor.GetIdx()] += charges[atom.GetIdx()]
+        else:
+            scored.append(atom.GetIdx())
+    return {
+        'coords': mol.GetConformer().GetPositions().astype(np.float32),
+        'scored': scored,
+        'elements': [mol.GetAtomWithIdx(i).GetSymbol() for i in scored],
+        'charges': [charges[i] for i in scored],
+        'torsions': rdMolDescriptors.CalcNumRotatableBonds(mol),
+        'exact_mw': rdMolDescriptors.CalcExactMolWt(mol),
+    }
+
+
+def ligand_pdb(molblock: str, coords: Sequence[Sequence[float]]) -> str:
+    """PDB block of a ligand (MolBlock) moved to the given atom coordinates (a docked pose)"""
+    mol = Chem.MolFromMolBlock(molblock, removeHs=False)
+    conf = mol.GetConformer()
+    for i, (x, y, z) in enumerate(coords):
+        conf.SetAtomPosition(i, (float(x), float(y), float(z)))
+    return Chem.MolToPDBBlock(mol)
+
+
+def prepare_target(pdb_path: str, cache_dir: str, center: Sequence[float], size: float, spacing: float) -> Dict:
+    """
+    Parse a receptor PDB file once into NumPy arrays (coords, elements, charges)
+    and its docking grid maps, all written as .npy files to `cache_dir`
+    (built in a temporary directory, then renamed into place). Returns a summary.
+    """
+    with open(pdb_path) as f:
+        coords, elements, charges = docking_grid.parse_pdb_atoms(f.read())
+    grids = docking_grid.build_grid_maps(coords, elements, charges, center, size, spacing)
+
+    staging = f"{cache_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    grids.save(staging)
+    np.save(os.path.join(staging, 'coords.npy'), coords)
+    np.save(os.path.join(staging, 'elements.npy'), np.array(elements, dtype='<U2'))
+    np.save(os.path.join(staging, 'charges.npy'), charges)
+    try:
+        os.rename(staging, cache_dir)
+    except OSError:
+        shutil.rmtree(staging, ignore_errors=True)  # Prepared concurrently by another worker
+    return {'atoms': len(coords), 'grid_shape': list(grids.shape), 'grid_mb': round(grids.nbytes / 2**20, 1)}
+
+
+_target_grids: Dict[str, docking_grid.GridMaps] = {}
+_pose_sets: Dict[Tuple, Tuple[np.ndarray, np.ndarray]] = {}
+
+
+def _grids(grid_dir: str) -> docking_grid.GridMaps:
+    """Grid maps of a prepared target, memory-mapped once per worker (pages shared between workers)"""
+    grids = _target_grids.get(grid_dir)
+    if grids is None:
+        if len(_target_grids) >= 16:
+            _target_grids.clear()
+        grids = _target_grids[grid_dir] = docking_grid.GridMaps.load(grid_dir)
+    return grids
+
+
+def _poses(rotations: int, translation_range: float, translation_step: float) -> Tuple[np.ndarray, np.ndarray]:
+    key = (rotations, translation_range, translation_step)
+    if key not in _pose_sets:
+        _pose_sets[key] = (
+            docking_grid.random_rotations(rotations),
+            docking_grid.translation_offsets(translation_range, translation_step),
+        )
+    return _pose_sets[key]
+
+
+def dock_molblock(molblock: str, grid_dir: str, center: Sequence[float], search: Dict,
+                  include_pdb: bool = True) -> Dict:
+    """
+    Dock an embedded ligand (MolBlock) into a prepared target (grid maps in
+    `grid_dir`, see services/target_store.py). `search` holds the pose search
+    settings: rotations, translation_range, translation_step, refine_rounds.
+    Returns affinity, per-term breakdown, exact mass and (optionally) the posed
+    ligand as a PDB block.
+    """
+    ligand = prepare_ligand(molblock)
+    params = docking_grid.ligand_parameters(ligand['elements'], ligand['charges'])
+    rotations, offsets = _poses(search['rotations'], search['translation_range'], search['translation_step'])
+    result = docking_grid.dock_rigid(
+        _grids(grid_dir), params, ligand['coords'][ligand['scored']], center,
+        rotations, offsets, search['refine_rounds'], torsions=ligand['torsions']
+    )
+    docked = {
+        'affinity': result['affinity'],
+        'score_breakdown': result['terms'],
+        'poses_scored': result['poses_scored'],
+        'exact_mw': ligand['exact_mw'],
+    }
+    if include_pdb:
+        coords = docking_grid.apply_pose(ligand['coords'], result['pose'])
+        docked['ligand_pdb'] = ligand_pdb(molblock, np.round(coords, 3).tolist())
+    return docked
+
+
+def dock_ligands(smiles_list: List[str], grid_dir: str, center: Sequence[float], search: Dict,
+                 seed: int = 42) -> List[Dict]:
+    """
+    Screening chunk: embed (as the conformer cache does: canonical SMILES,
+    ETKDG + UFF, fixed seed) and dock each SMILES. One dict per input with
+    "smiles" and either the docking result or "error".
+    """
+    results = []
+    for smiles in smiles_list:
+        canonical = canonical_smiles(smiles)
+        molblock = embed_3d(canonical, seed) if canonical else None
+        if molblock is None:
+            results.append({'smiles': smiles, 'error': 'Invalid SMILES string'})
+            continue
+        try:
+            docked = dock_molblock(molblock, grid_dir, center, search, include_pdb=False)
+        except Exception as e:
+            results.append({'smiles': smiles, 'error': str(e)})
+            continue
+        results.append({'smiles': smiles, 'canonical_smiles': canonical, **docked})
+    return results
+
+
+def smiles_info(smiles: str) -> Dict:
+    """Validate a SMILES string and describe the molecule"""
+    try:
+        mol = get_mol(smiles)
+        if mol is None:
+            return {'valid': False, 'error': 'Invalid SMILES string'}
+
+        return {
+            'valid': True,
+            'smiles': smiles,
+            'canonical_smiles': canonical_smiles(smiles),
+            'molecular_formula': rdMolDescriptors.CalcMolFormula(mol),
+            'molecular_weight': round(Descriptors.MolWt(mol), 2),
+            'num_atoms': mol.GetNumAtoms(),
+            'num_heavy_atoms': mol.GetNumHeavyAtoms(),
+            'num_rings': rdMolDescriptors.CalcNumRings(mol),
+            'num_rotatable_bonds': rdMolDescriptors.CalcNumRotatableBonds(mol)
+        }
+    except Exception as e:
+        return {'valid': False, 'error': str(e)}
+
+
+# Columns produced by descriptor_columns, in output order
+DESCRIPTOR_COLUMNS = (
+    'smiles', 'valid', 'canonical_smiles', 'molecular_formula', 'molecular_weight',
+    'exact_mw', 'logp', 'tpsa', 'qed', 'hbd', 'hba', 'num_heavy_atoms', 'num_rings',
+    'num_aromatic_rings', 'num_rotatable_bonds', 'fraction_csp3', 'lipinski_violations',
+)
+
+
+def descriptor_columns(smiles_list: List[str]) -> Dict[str, List]:
+    """
+    Descriptors for a chunk of SMILES as columns (one list per descriptor,
+    aligned with the input). Invalid SMILES get valid=False and None elsewhere.
+    """
+    columns: Dict[str, List] = {name: [] for name in DESCRIPTOR_COLUMNS}
+    for smiles in smiles_list:
+        mol = get_mol(smiles)
+        columns['smiles'].append(smiles)
+        columns['valid'].append(mol is not None)
+        if mol is None:
+            for name in DESCRIPTOR_COLUMNS[2:]:
+                columns[name].append(None)
+            continue
+
+        # QED's property pass already computes MW, logP and TPSA; reuse them
+        try:
+            props = QED.properties(mol)
+            mw, logp, tpsa = props.MW, props.ALOGP, props.PSA
+            qed = round(QED.qed(mol, qedProperties=props), 4)
+        except Exception:
+            mw, logp = Descriptors.MolWt(mol), Crippen.MolLogP(mol)
+            tpsa, qed = rdMolDescriptors.CalcTPSA(mol), None
+        hbd = Lipinski.NumHDonors(mol)
+        hba = Lipinski.NumHAcceptors(mol)
+        columns['canonical_smiles'].append(canonical_smiles(smiles))
+        columns['molecular_formula'].append(rdMolDescriptors.CalcMolFormula(mol))
+        columns['molecular_weight'].append(round(mw, 3))
+        columns['exact_mw'].append(round(rdMolDescriptors.CalcExactMolWt(mol), 4))
+        columns['logp'].append(round(logp, 3))
+        columns['tpsa'].append(round(tpsa, 2))
+        columns['qed'].append(qed)
+        columns['hbd'].append(hbd)
+        columns['hba'].append(hba)
+        columns['num_heavy_atoms'].append(mol.GetNumHeavyAtoms())
+        columns['num_rings'].append(rdMolDescriptors.CalcNumRings(mol))
+        columns['num_aromatic_rings'].append(rdMolDescriptors.CalcNumAromaticRings(mol))
+        columns['num_rotatable_bonds'].append(rdMolDescriptors.CalcNumRotatableBonds(mol))
+        columns['fraction_csp3'].append(round(rdMolDescriptors.CalcFractionCSP3(mol), 4))
+        columns['lipinski_violations'].append(
+            (mw > 500) + (logp > 5) + (hbd > 5) + (hba > 10)
+        )
+    return columns
+
+
+_morgan_generators: Dict[Tuple[int, int], object] = {}
+
+
+def morgan_fingerprints(smiles_list: List[str], radius: int = 2, n_bits: int = 2048) -> Tuple[bytes, List[bool]]:
+    """
+    Packed Morgan fingerprints for a chunk of SMILES: `n_bits / 8` bytes per
+    molecule, concatenated in input order (all-zero rows for invalid SMILES),
+    plus a validity flag per molecule.
+    """
+    generator = _morgan_generators.get((radius, n_bits))
+    if generator is None:
+        generator = rdFingerprintGenerator.GetMorganGenerator(radius=radius, fpSize=n_bits)
+        _morgan_generators[(radius, n_bits)] = generator
+
+    rows = np.zeros((len(smiles_list), n_bits // 8), dtype=np.uint8)
+    valid = []
+    for i, smiles in enumerate(smiles_list):
+        mol = get_mol(smiles)
+        valid.append(mol is not None)
+        if mol is not None:
+            rows[i] = np.packbits(generator.GetFingerprintAsNumPy(mol))
+    return rows.tobytes(), valid
+
+
+def _packed_bits(fp, n_bits: int) -> np.ndarray:
+    bits = np.zeros(n_bits, dtype=np.uint8)
+    DataStructs.ConvertToNumpyArray(fp, bits)
+    return np.packbits(bits)
+
+
+def pattern_fingerprints(smiles_list: List[str], n_bits: int = 2048) -> Tuple[bytes, List[bool]]:
+    """
+    Packed RDKit pattern (substructure screening) fingerprints for a chunk of
+    SMILES, laid out like morgan_fingerprints.
+    """
+    rows = np.zeros((len(smiles_list), n_bits // 8), dtype=np.uint8)
+    valid = []
+    for i, smiles in enumerate(smiles_list):
+        mol = get_mol(smiles)
+        valid.append(mol is not None)
+        if mol is not None:
+            rows[i] = _packed_bits(Chem.PatternFingerprint(mol, fpSize=n_bits), n_bits)
+    return rows.tobytes(), valid
+
+
+_smarts_queries: Dict[str, Optional[Chem.Mol]] = {}
+
+
+def _smarts_query(smarts: str) -> Optional[Chem.Mol]:
+    if smarts not in _smarts_queries:
+        if len(_smarts_queries) >= 256:
+            _smarts_queries.clear()
+        _smarts_queries[smarts] = Chem.MolFromSmarts(smarts)
+    return _smarts_queries[smarts]
+
+
+def query_pattern_fingerprint(smarts: str, n_bits: int = 2048) -> Optional[bytes]:
+    """
+    Packed pattern fingerprint of a SMARTS query; every molecule containing the
+    query has all of its bits set. None for invalid or empty SMARTS.
+    """
+    query = _smarts_query(smarts)
+    if query is None or not query.GetNumAtoms():
+        return None
+    return _packed_bits(Chem.PatternFingerprint(query, fpSize=n_bits), n_bits).tobytes()
+
+
+def substructure_matches(smiles_list: List[str], smarts: str) -> List[bool]:
+    """Whether each SMILES contains the SMARTS query (False for invalid SMILES or SMARTS)"""
+    query = _smarts_query(smarts)
+    if query is None:
+        return [False] * len(smiles_list)
+    matches = []
+    for smiles in smiles_list:
+        mol = get_mol(smiles)
+        matches.append(mol is not None and mol.HasSubstructMatch(query))
+    return matches
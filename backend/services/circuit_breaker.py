@@ -0,0 +1,135 @@
+"""
+Circuit Breaker for Model Backends
+
+Tracks the outcome and latency of recent calls to one model server:
+- CLOSED: calls go through; failures and slow calls are counted over a window
+- OPEN: calls are rejected immediately (the client falls back to mock)
+- HALF_OPEN: the backend looked healthy again; one trial call at a time is let
+  through, and its outcome closes or re-opens the breaker
+
+Breakers are re-closed by probe results from the background health monitor
+(services/health_monitor.py), never by the passage of time alone.
+
+Configuration (environment):
+- BREAKER_WINDOW (recent calls considered, default 20)
+- BREAKER_FAILURE_THRESHOLD (failures in window that open the breaker, default 5)
+- BREAKER_SLOW_CALL_SECONDS (successful calls slower than this count as failures, default 10)
+"""
+
+import os
+import time
+from collections import deque
+from enum import Enum
+from typing import Any, Deque, Dict, Optional
+
+BREAKER_WINDOW = int(os.environ.get('BREAKER_WINDOW', '20'))
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_SLOW_CALL_SECONDS = float(os.environ.get('BREAKER_SLOW_CALL_SECONDS', '10'))
+
+
+class CircuitOpenError(Exception):
+    """A call was rejected without being sent because the breaker is open"""
+
+
+class CircuitState(str, Enum):
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker driven by recent failures and latencies"""
+
+    def __init__(self, name: str, window: int = BREAKER_WINDOW,
+                 failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 slow_call_seconds: float = BREAKER_SLOW_CALL_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.state = CircuitState.CLOSED
+        self._outcomes: Deque[bool] = deque(maxlen=window)  # True = failure
+        self._trial_in_flight = False
+        self.opened_at: Optional[float] = None
+        self.last_latency: Optional[float] = None
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == CircuitState.OPEN
+
+    def allow_request(self) -> bool:
+        """Whether a real call may be sent now"""
+        if self.state == CircuitState.CLOSED:
+            return True
+        if self.state == CircuitState.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self, latency: float) -> None:
+        self.last_latency = latency
+        if latency > self.slow_call_seconds:
+            self.record_failure(latency)
+            return
+        self._trial_in_flight = False
+        if self.state == CircuitState.HALF_OPEN:
+            self._close()
+        else:
+            self._outcomes.append(False)
+
+    def record_failure(self, latency: Optional[float] = None) -> None:
+        if latency is not None:
+            self.last_latency = latency
+        self._trial_in_flight = False
+        if self.state == CircuitState.HALF_OPEN:
+            self._open()
+            return
+        self._outcomes.append(True)
+        if self.state == CircuitState.CLOSED and sum(self._outcomes) >= self.failure_threshold:
+            self._open()
+
+    def record_cancelled(self) -> None:
+        """A call was cancelled by its caller; it says nothing about the backend"""
+        self._trial_in_flight = False
+
+    def record_probe(self, healthy: bool) -> None:
+        """
+        Apply a background health probe result: open -> half-open -> closed.
+        A failed probe counts like a failed call while closed (one transient
+        timeout does not open the breaker) and re-opens a half-open breaker.
+        """
+        if not healthy:
+            if self.state == CircuitState.CLOSED:
+                self.record_failure()
+            elif self.state == CircuitState.HALF_OPEN:
+                self._open()
+            return
+        if self.state == CircuitState.OPEN:
+            self.state = CircuitState.HALF_OPEN
+            self._trial_in_flight = False
+        elif self.state == CircuitState.HALF_OPEN:
+            self._close()
+
+    def _open(self) -> None:
+        self.state = CircuitState.OPEN
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+        self._trial_in_flight = False
+
+    def _close(self) -> None:
+        self.state = CircuitState.CLOSED
+        self.opened_at = None
+        self._outcomes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'state': self.state.value,
+            'recent_failures': sum(self._outcomes),
+            'recent_calls': len(self._outcomes),
+            'open_for_seconds': round(time.monotonic() - self.opened_at, 1) if self.opened_at else None,
+            'last_latency_seconds': round(self.last_latency, 3) if self.last_latency is not None else None,
+            'rejected': self.rejected,
+            'times_opened': self.times_opened,
+        }
@@ -0,0 +1,153 @@
+"""
+Conformer Cache
+
+3D embedding (AddHs, ETKDG with a fixed seed, UFF optimization) is
+deterministic for a given molecule, so results are cached by canonical SMILES
+and embedding parameters:
+1. In-process LRU (CONFORMER_CACHE_SIZE entries)
+2. MongoDB collection `conformer_cache` with a TTL index on `expires_at`
+   (CONFORMER_CACHE_TTL_SECONDS)
+
+Keys include the RDKit version, since a different RDKit may embed differently.
+Concurrent misses for the same key share one embedding (single-flight), which
+runs in the chem process pool, as does canonicalizing a SMILES seen for the
+first time; known inputs are mapped to their canonical form in-process.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from rdkit import rdBase
+
+from services import chem_tasks
+from services.chem_executor import chem_executor
+from services.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+CONFORMER_CACHE_SIZE = int(os.environ.get('CONFORMER_CACHE_SIZE', '2048'))
+CONFORMER_CACHE_TTL_SECONDS = int(os.environ.get('CONFORMER_CACHE_TTL_SECONDS', str(30 * 24 * 3600)))
+
+EMBED_METHOD = 'ETKDG+UFF'
+DEFAULT_EMBED_SEED = 42
+
+
+class ConformerCache:
+    """LRU + MongoDB cache of embedded MolBlocks keyed by canonical SMILES and parameters"""
+
+    def __init__(self, max_entries: int = CONFORMER_CACHE_SIZE,
+                 ttl_seconds: int = CONFORMER_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lru: "OrderedDict[str, str]" = OrderedDict()
+        self._canonical: "OrderedDict[str, str]" = OrderedDict()  # Input SMILES -> canonical SMILES
+        self._collection = None
+        self._flight = SingleFlight()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def attach(self, db) -> None:
+        """Use `db.conformer_cache` as the persistent tier"""
+        self._collection = db.conformer_cache
+
+    @staticmethod
+    def make_key(canonical: str, seed: int) -> str:
+        raw = json.dumps([canonical, EMBED_METHOD, seed, rdBase.rdkitVersion])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    async def get_molblock(self, smiles: str, seed: int = DEFAULT_EMBED_SEED) -> Optional[str]:
+        """
+        MolBlock with 3D coordinates for `smiles` (atoms in canonical order),
+        from cache or freshly embedded; None if the SMILES is invalid.
+        """
+        canonical = await self._canonicalize(smiles)
+        if canonical is None:
+            return None
+        key = self.make_key(canonical, seed)
+        molblock = self._lru.get(key)
+        if molblock is not None:
+            self._lru.move_to_end(key)
+            self.memory_hits += 1
+            return molblock
+        return await self._flight.do(key, lambda: self._load_or_embed(key, canonical, seed))
+
+    async def _canonicalize(self, smiles: str) -> Optional[str]:
+        canonical = self._canonical.get(smiles)
+        if canonical is not None:
+            self._canonical.move_to_end(smiles)
+            return canonical
+        canonical = (await chem_executor.run(chem_tasks.canonicalize, [smiles]))[0]
+        if canonical is not None:
+            self._canonical[smiles] = canonical
+            while len(self._canonical) > self.max_entries:
+                self._canonical.popitem(last=False)
+        return canonical
+
+    async def _load_or_embed(self, key: str, canonical: str, seed: int) -> Optional[str]:
+        if self._collection is not None:
+            try:
+                doc = await self._collection.find_one({'key': key}, {'_id': 0, 'molblock': 1})
+            except Exception as e:
+                logger.warning(f"Conformer cache lookup failed: {e}")
+                doc = None
+            if doc:
+                self.persistent_hits += 1
+                self._remember(key, doc['molblock'])
+                return doc['molblock']
+
+        self.misses += 1
+        molblock = await chem_executor.run(chem_tasks.embed_3d, canonical, seed)
+        if molblock is None:
+            return None
+        self._remember(key, molblock)
+
+        if self._collection is not None:
+            try:
+                await self._collection.update_one(
+                    {'key': key},
+                    {'$set': {
+                        'key': key,
+                        'canonical_smiles': canonical,
+                        'seed': seed,
+                        'method': EMBED_METHOD,
+                        'rdkit_version': rdBase.rdkitVersion,
+                        'molblock': molblock,
+                        'expires_at': datetime.now(timezone.utc) + timedelta(seconds=self.ttl_seconds),
+                    }},
+                    upsert=True
+                )
+            except Exception as e:
+                logger.warning(f"Conformer cache write failed: {e}")
+        return molblock
+
+    def _remember(self, key: str, molblock: str) -> None:
+        self._lru[key] = molblock
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.memory_hits + self.persistent_hits
+        lookups = hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'persistent_hits': self.persistent_hits,
+            'misses': self.misses,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'memory_entries': len(self._lru),
+            'max_entries': self.max_entries,
+            'coalesced': self._flight.coalesced,
+        }
+
+
+# Shared cache instance (persistent tier attached on app startup)
+conformer_cache = ConformerCache()
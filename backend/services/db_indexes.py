@@ -0,0 +1,172 @@
+"""
+MongoDB Indexes
+
+Single declaration of the indexes every route and service query relies on,
+created idempotently at startup (ensure_indexes, from server.py) before the
+caches, screening jobs and search indexes attach to the database. Creating an
+index that already exists with the same keys and options is a no-op, so this
+runs on every start; a conflicting definition (same keys, other options) is
+logged and left alone.
+
+QUERY_PLANS lists the query shape behind each route. explain_query_plans()
+runs explain() on all of them and flags collection scans (COLLSCAN) and
+blocking in-memory sorts, so a route whose index went missing or no longer
+matches is caught before it reaches production. Exposed as
+GET /api/diagnostics/query-plans and scripts/check_query_plans.py.
+
+Aggregations that read a whole collection by design (chat session listing,
+experiment stats reconciliation, search index builds) are not listed.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError
+
+from services.generation_store import HISTORY_SORT
+
+logger = logging.getLogger(__name__)
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    'generation_history': [
+        IndexModel([('id', ASCENDING)], unique=True),
+        IndexModel([('experiment_id', ASCENDING), ('created_at', DESCENDING), ('id', DESCENDING)]),
+        IndexModel([('created_at', DESCENDING), ('id', DESCENDING)]),
+    ],
+    'experiments': [
+        IndexModel([('id', ASCENDING)], unique=True),
+        IndexModel([('updated_at', DESCENDING)]),
+    ],
+    'chat_history': [
+        IndexModel([('session_id', ASCENDING), ('created_at', ASCENDING)]),
+    ],
+    'generation_cache': [
+        IndexModel([('key', ASCENDING)], unique=True),
+        IndexModel([('expires_at', ASCENDING)], expireAfterSeconds=0),
+    ],
+    'conformer_cache': [
+        IndexModel([('key', ASCENDING)], unique=True),
+        IndexModel([('expires_at', ASCENDING)], expireAfterSeconds=0),
+    ],
+    'screening_jobs': [
+        IndexModel([('id', ASCENDING)], unique=True),
+        IndexModel([('status', ASCENDING)]),
+    ],
+    'screening_results': [
+        IndexModel([('job_id', ASCENDING), ('index', ASCENDING)], unique=True),
+        IndexModel([('job_id', ASCENDING), ('affinity', ASCENDING), ('index', ASCENDING)]),
+    ],
+}
+
+
+@dataclass
+class QueryPlan:
+    """Shape of one route query; filter values are placeholders, only the plan matters"""
+    name: str
+    collection: str
+    filter: Dict[str, Any]
+    sort: Optional[List] = None
+    limit: int = 0
+    projection: Optional[Dict[str, Any]] = field(default_factory=lambda: {'_id': 0})
+
+
+_SINCE = datetime(2000, 1, 1, tzinfo=timezone.utc)
+_UNTIL = datetime(2100, 1, 1, tzinfo=timezone.utc)
+
+QUERY_PLANS: List[QueryPlan] = [
+    QueryPlan('GET /molecules/history', 'generation_history', {}, HISTORY_SORT, 50),
+    QueryPlan('GET /molecules/history?cursor', 'generation_history', {'$or': [
+        {'created_at': {'$lt': _UNTIL}}, {'created_at': _UNTIL, 'id': {'$lt': ''}},
+        {'created_at': {'$type': 'string'}}]}, HISTORY_SORT, 50),
+    QueryPlan('GET /molecules/history?since&until', 'generation_history',
+              {'created_at': {'$gte': _SINCE, '$lt': _UNTIL}}, HISTORY_SORT, 50),
+    QueryPlan('history record by id', 'generation_history', {'id': ''}, limit=1),
+    QueryPlan('GET /experiments/{id}/runs', 'generation_history', {'experiment_id': ''}, HISTORY_SORT, 200),
+    QueryPlan('GET /experiments/{id}/runs?cursor', 'generation_history', {'experiment_id': '', '$or': [
+        {'created_at': {'$lt': _UNTIL}}, {'created_at': _UNTIL, 'id': {'$lt': ''}},
+        {'created_at': {'$type': 'string'}}]}, HISTORY_SORT, 200),
+    QueryPlan('GET /experiments/{id}/runs?since&until', 'generation_history',
+              {'experiment_id': '', 'created_at': {'$gte': _SINCE, '$lt': _UNTIL}}, HISTORY_SORT, 200),
+    QueryPlan('experiment SMILES', 'generation_history', {'experiment_id': ''},
+              projection={'_id': 0, 'results.smiles': 1}),
+    QueryPlan('GET /experiments', 'experiments', {}, [('updated_at', DESCENDING)]),
+    QueryPlan('experiment by id', 'experiments', {'id': ''}, limit=1),
+    QueryPlan('GET /knowledge/chat/history/{session_id}', 'chat_history', {'session_id': ''},
+              [('created_at', ASCENDING)], 100),
+    QueryPlan('generation cache lookup', 'generation_cache', {'key': ''}, limit=1),
+    QueryPlan('conformer cache lookup', 'conformer_cache', {'key': ''}, limit=1),
+    QueryPlan('screening job by id', 'screening_jobs', {'id': ''}, limit=1),
+    QueryPlan('screening jobs to resume', 'screening_jobs', {'status': {'$in': ['queued', 'running']}},
+              projection={'id': 1}),
+    QueryPlan('GET /simulation/screening/{id}/results', 'screening_results', {'job_id': '', 'error': None},
+              [('affinity', ASCENDING), ('index', ASCENDING)], 100),
+    QueryPlan('GET /simulation/screening/{id}/results?failed', 'screening_results',
+              {'job_id': '', 'error': {'$ne': None}}, [('index', ASCENDING)], 100),
+    QueryPlan('screening results done', 'screening_results', {'job_id': ''}, projection={'_id': 0, 'index': 1}),
+]
+
+
+async def ensure_indexes(db) -> Dict[str, Any]:
+    """Create every declared index; per-collection failures are logged, never raised"""
+    names: Dict[str, List[str]] = {}
+    failed: Dict[str, str] = {}
+    for collection, indexes in INDEXES.items():
+        try:
+            names[collection] = await db[collection].create_indexes(indexes)
+        except PyMongoError as e:
+            failed[collection] = str(e)
+            logger.warning(f"Index setup for {collection} failed: {e}")
+    return {'indexes': names, 'failed': failed}
+
+
+def _plan_stages(plan: Dict[str, Any], stages: List[str], indexes: List[str]) -> None:
+    plan = plan.get('queryPlan', plan)  # MongoDB 7+ wraps the tree alongside the slot-based plan
+    if 'stage' in plan:
+        stages.append(plan['stage'])
+    for shard in plan.get('shards', []):
+        _plan_stages(shard.get('winningPlan', {}), stages, indexes)
+    if plan.get('indexName'):
+        indexes.append(plan['indexName'])
+    for child in [plan.get('inputStage')] + plan.get('inputStages', []):
+        if child:
+            _plan_stages(child, stages, indexes)
+
+
+async def explain_query(db, query: QueryPlan) -> Dict[str, Any]:
+    """Winning plan of one query: stages, indexes used, and whether it scans or sorts in memory"""
+    cursor = db[query.collection].find(query.filter, query.projection)
+    if query.sort:
+        cursor = cursor.sort(query.sort)
+    if query.limit:
+        cursor = cursor.limit(query.limit)
+    explained = await cursor.explain()
+    stages: List[str] = []
+    indexes: List[str] = []
+    _plan_stages(explained.get('queryPlanner', {}).get('winningPlan', {}), stages, indexes)
+    return {
+        'query': query.name,
+        'collection': query.collection,
+        'stages': stages,
+        'indexes': indexes,
+        'collscan': 'COLLSCAN' in stages,
+        'blocking_sort': 'SORT' in stages,
+    }
+
+
+async def explain_query_plans(db) -> Dict[str, Any]:
+    """explain() every route query; ok is False when any of them scans its collection"""
+    plans = []
+    for query in QUERY_PLANS:
+        try:
+            plans.append(await explain_query(db, query))
+        except PyMongoError as e:
+            plans.append({'query': query.name, 'collection': query.collection, 'error': str(e)})
+    return {
+        'ok': not any(plan.get('collscan') or plan.get('error') for plan in plans),
+        'collscans': [plan['query'] for plan in plans if plan.get('collscan')],
+        'blocking_sorts': [plan['query'] for plan in plans if plan.get('blocking_sort')],
+        'plans': plans,
+    }
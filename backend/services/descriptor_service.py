@@ -0,0 +1,65 @@
+"""
+Bulk Descriptor Service
+
+Computes an extended descriptor set (MW, exact mass, logP, TPSA, QED, HBD/HBA,
+ring and rotatable-bond counts, Fsp3, Lipinski violations) for large SMILES
+lists. The list is split into chunks that run concurrently across the chem
+process pool; each chunk returns columns, and the chunks are concatenated
+into one columnar table ({column: [values]}) aligned with the input order.
+
+Arrow IPC / Parquet output needs the optional `pyarrow` package
+(requirements-optional.txt); without it those formats answer 501.
+
+Configuration (environment):
+- DESCRIPTOR_CHUNK_SIZE (SMILES per pool task, default 500)
+"""
+
+import io
+import os
+from typing import Dict, List
+
+from services import chem_tasks
+from services.chem_executor import chem_executor
+
+DESCRIPTOR_CHUNK_SIZE = int(os.environ.get('DESCRIPTOR_CHUNK_SIZE', '500'))
+
+DESCRIPTOR_COLUMNS = chem_tasks.DESCRIPTOR_COLUMNS
+
+
+async def compute_descriptors(smiles: List[str], chunk_size: int = DESCRIPTOR_CHUNK_SIZE) -> Dict[str, List]:
+    """Descriptor table for `smiles` as {column: [values]} in input order"""
+    chunks = [smiles[i:i + chunk_size] for i in range(0, len(smiles), chunk_size)]
+    results = await chem_executor.map(chem_tasks.descriptor_columns, chunks)
+
+    table: Dict[str, List] = {name: [] for name in DESCRIPTOR_COLUMNS}
+    for columns in results:
+        for name in DESCRIPTOR_COLUMNS:
+            table[name].extend(columns[name])
+    return table
+
+
+def _arrow_table(table: Dict[str, List]):
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise RuntimeError("Arrow/Parquet output requires the pyarrow package")
+    return pa.table(table)
+
+
+def to_arrow_ipc(table: Dict[str, List]) -> bytes:
+    """Serialize a descriptor table as an Arrow IPC stream"""
+    arrow_table = _arrow_table(table)
+    import pyarrow as pa
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, arrow_table.schema) as writer:
+        writer.write_table(arrow_table)
+    return sink.getvalue().to_pybytes()
+
+
+def to_parquet(table: Dict[str, List]) -> bytes:
+    """Serialize a descriptor table as a Parquet file"""
+    arrow_table = _arrow_table(table)
+    import pyarrow.parquet as pq
+    buffer = io.BytesIO()
+    pq.write_table(arrow_table, buffer, compression='zstd')
+    return buffer.getvalue()
@@ -0,0 +1,379 @@
+"""
+Docking Grid Maps
+
+Grid-based rigid docking score in the style of AutoDock 4. For a target, the
+protein atoms around the active-site center are precomputed once into NumPy
+grid maps:
+
+- steric: 12-6 van der Waals energy of a probe atom, one map per ligand element
+- electrostatic: Coulomb potential with a distance-dependent dielectric (4r)
+- volume / solvation: Gaussian-weighted protein atom volumes and solvation
+  parameters, for the pairwise desolvation term
+
+A ligand pose is then scored by trilinear interpolation of its atom
+coordinates into the maps, vectorized over all atoms of many poses at once.
+Everything here is plain NumPy so it runs both in the API process and in the
+chem worker processes.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# Free energy weights (kcal/mol) of the AutoDock 4 scoring function
+VDW_WEIGHT = 0.1662
+ELEC_WEIGHT = 0.1406
+DESOLV_WEIGHT = 0.1322
+TORSION_WEIGHT = 0.2983
+
+COULOMB = 332.06371
+DESOLV_SIGMA = 3.6
+CHARGE_SOLVATION = 0.01097
+GRID_CUTOFF = 8.0
+# Cap of a steric grid value (kcal/mol) so clashes stay finite
+STERIC_CAP = 10.0
+# Energy per ligand atom (kcal/mol) placed outside the grid box
+OUT_OF_GRID_PENALTY = 1.0
+
+# Element: (Rii, epsii, atomic solvation volume, atomic solvation parameter)
+ATOM_PARAMS = {
+    'C': (4.00, 0.150, 33.5103, -0.00143),
+    'N': (3.50, 0.160, 22.4493, -0.00162),
+    'O': (3.20, 0.200, 17.1573, -0.00251),
+    'S': (4.00, 0.200, 33.5103, -0.00214),
+    'H': (2.00, 0.020, 0.0000, 0.00051),
+    'P': (4.20, 0.200, 38.7924, -0.00110),
+    'F': (3.09, 0.080, 15.4480, -0.00110),
+    'Cl': (4.09, 0.276, 35.8235, -0.00110),
+    'Br': (4.33, 0.389, 42.5661, -0.00110),
+    'I': (4.72, 0.550, 55.0585, -0.00110),
+    'Zn': (1.48, 0.550, 1.7000, -0.00110),
+    'Mg': (1.30, 0.875, 1.5600, -0.00110),
+    'Ca': (1.98, 0.550, 2.7700, -0.00110),
+    'Fe': (1.30, 0.010, 1.8400, -0.00110),
+    'Mn': (1.30, 0.875, 2.1400, -0.00110),
+}
+# Ligand atom types with their own steric map; anything else is scored as carbon
+PROBE_TYPES = ('C', 'N', 'O', 'S', 'H', 'P', 'F', 'Cl', 'Br', 'I')
+
+# Approximate protein partial charges: ionizable side chains plus backbone dipoles
+RESIDUE_CHARGES = {
+    ('ASP', 'OD1'): -0.5, ('ASP', 'OD2'): -0.5,
+    ('GLU', 'OE1'): -0.5, ('GLU', 'OE2'): -0.5,
+    ('LYS', 'NZ'): 1.0,
+    ('ARG', 'NH1'): 0.5, ('ARG', 'NH2'): 0.5,
+}
+BACKBONE_CHARGES = {'N': -0.25, 'CA': 0.25, 'C': 0.45, 'O': -0.45}
+ION_CHARGES = {'Zn': 2.0, 'Mg': 2.0, 'Ca': 2.0, 'Fe': 2.0, 'Mn': 2.0, 'Na': 1.0, 'K': 1.0}
+
+
+def _element(symbol: str) -> str:
+    symbol = symbol.strip()
+    return symbol[:1].upper() + symbol[1:].lower()
+
+
+def parse_pdb_atoms(pdb_text: str) -> Tuple[np.ndarray, List[str], np.ndarray]:
+    """
+    Receptor atoms of a PDB file: (coords float32 (N, 3), elements, charges
+    float32 (N,)). Protein ATOM records and metal ions are kept; waters and
+    other HETATM records (co-crystallized ligands) are dropped.
+    """
+    coords, elements, charges = [], [], []
+    for line in pdb_text.splitlines():
+        record = line[:6].strip()
+        if record not in ('ATOM', 'HETATM'):
+            continue
+        name = line[12:16].strip()
+        residue = line[17:20].strip()
+        element = _element(line[76:78]) if len(line) >= 78 and line[76:78].strip() else _element(name[:1])
+        if record == 'HETATM' and element not in ION_CHARGES:
+            continue
+        try:
+            coords.append((float(line[30:38]), float(line[38:46]), float(line[46:54])))
+        except ValueError:
+            continue
+        elements.append(element)
+        if record == 'HETATM':
+            charges.append(ION_CHARGES[element])
+        else:
+            charges.append(RESIDUE_CHARGES.get((residue, name), BACKBONE_CHARGES.get(name, 0.0)))
+    return (
+        np.asarray(coords, dtype=np.float32).reshape(-1, 3),
+        elements,
+        np.asarray(charges, dtype=np.float32),
+    )
+
+
+@dataclass
+class GridMaps:
+    """Precomputed maps of one target; `steric` is stacked in PROBE_TYPES order"""
+    origin: np.ndarray      # Coordinates of grid point (0, 0, 0)
+    spacing: float
+    steric: np.ndarray      # (len(PROBE_TYPES), nx, ny, nz)
+    electrostatic: np.ndarray
+    volume: np.ndarray
+    solvation: np.ndarray
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        return self.electrostatic.shape
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.steric, self.electrostatic, self.volume, self.solvation))
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            'origin': self.origin, 'spacing': np.float32(self.spacing), 'steric': self.steric,
+            'electrostatic': self.electrostatic, 'volume': self.volume, 'solvation': self.solvation,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays) -> 'GridMaps':
+        return cls(
+            origin=np.asarray(arrays['origin']), spacing=float(arrays['spacing']),
+            steric=arrays['steric'], electrostatic=arrays['electrostatic'],
+            volume=arrays['volume'], solvation=arrays['solvation'],
+        )
+
+    def save(self, directory: str) -> None:
+        """Write every map as a .npy file in `directory`"""
+        os.makedirs(directory, exist_ok=True)
+        for name, array in self.to_arrays().items():
+            np.save(os.path.join(directory, f'grid_{name}.npy'), array)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> 'GridMaps':
+        """Maps written by save(); memory-mapped read-only, so processes share the pages"""
+        names = ('origin', 'spacing', 'steric', 'electrostatic', 'volume', 'solvation')
+        return cls.from_arrays({
+            name: np.load(os.path.join(directory, f'grid_{name}.npy'), mmap_mode='r' if mmap else None)
+            for name in names
+        })
+
+
+def build_grid_maps(coords: np.ndarray, elements: Sequence[str], charges: np.ndarray,
+                    center: Sequence[float], size: float = 24.0, spacing: float = 0.4,
+                    block: int = 10) -> GridMaps:
+    """
+    Grid maps of a `size` Angstrom cube around `center`. Grid points are
+    processed in blocks of block^3 points against only the atoms within the
+    cutoff of that block.
+    """
+    n = int(round(size / spacing)) + 1
+    origin = np.asarray(center, dtype=np.float32) - spacing * (n - 1) / 2
+    params = np.array([ATOM_PARAMS.get(e, ATOM_PARAMS['C']) for e in elements], dtype=np.float32).reshape(-1, 4)
+    radius, eps, volume, solpar = params.T
+    solpar = solpar + CHARGE_SOLVATION * np.abs(charges)
+    probes = np.array([ATOM_PARAMS[t][:2] for t in PROBE_TYPES], dtype=np.float32)
+    # 12-6 coefficients per probe type and atom: E = A / r^12 - B / r^6
+    r_eq6 = ((probes[:, :1] + radius[None, :]) / 2) ** 6
+    eps_pair = np.sqrt(probes[:, 1:] * eps[None, :])
+    coef_a, coef_b = eps_pair * r_eq6 ** 2, 2 * eps_pair * r_eq6
+
+    steric = np.zeros((len(PROBE_TYPES), n, n, n), dtype=np.float32)
+    electrostatic = np.zeros((n, n, n), dtype=np.float32)
+    volume_map = np.zeros((n, n, n), dtype=np.float32)
+    solvation_map = np.zeros((n, n, n), dtype=np.float32)
+    axis = np.arange(n, dtype=np.float32) * spacing
+
+    for i in range(0, n, block):
+        for j in range(0, n, block):
+            for k in range(0, n, block):
+                xs = origin[0] + axis[i:i + block]
+                ys = origin[1] + axis[j:j + block]
+                zs = origin[2] + axis[k:k + block]
+                lo = np.array([xs[0], ys[0], zs[0]]) - GRID_CUTOFF
+                hi = np.array([xs[-1], ys[-1], zs[-1]]) + GRID_CUTOFF
+                near = np.flatnonzero(((coords >= lo) & (coords <= hi)).all(axis=1))
+                if not len(near):
+                    continue
+                points = np.stack(np.meshgrid(xs, ys, zs, indexing='ij'), axis=-1).reshape(-1, 3)
+                r2 = ((points[:, None, :] - coords[None, near, :]) ** 2).sum(axis=-1)
+                within = r2 < GRID_CUTOFF ** 2
+                r2 = np.maximum(r2, 0.25)
+                inv_r2 = 1.0 / r2
+                shape = (len(xs), len(ys), len(zs))
+
+                # All probe types at once: (points x atoms) @ (atoms x probes)
+                inv_r6 = np.where(within, inv_r2 ** 3, 0.0)
+                energy = (inv_r6 * inv_r6) @ coef_a[:, near].T - inv_r6 @ coef_b[:, near].T
+                steric[:, i:i + block, j:j + block, k:k + block] = np.minimum(
+                    VDW_WEIGHT * energy.T, STERIC_CAP
+                ).reshape((len(PROBE_TYPES),) + shape)
+
+                # Coulomb with dielectric 4r: 332 q / (4 r^2), from 1 Angstrom
+                potential = np.where(within, charges[near] / np.maximum(r2, 1.0), 0.0)
+                electrostatic[i:i + block, j:j + block, k:k + block] = (
+                    ELEC_WEIGHT * COULOMB / 4 * potential.sum(axis=1)
+                ).reshape(shape)
+
+                gauss = np.where(within, np.exp(-r2 / (2 * DESOLV_SIGMA ** 2)), 0.0)
+                volume_map[i:i + block, j:j + block, k:k + block] = (gauss @ volume[near]).reshape(shape)
+                solvation_map[i:i + block, j:j + block, k:k + block] = (gauss @ solpar[near]).reshape(shape)
+
+    return GridMaps(origin=origin, spacing=spacing, steric=steric, electrostatic=electrostatic,
+                    volume=volume_map, solvation=solvation_map)
+
+
+def ligand_parameters(elements: Sequence[str], charges: Sequence[float]) -> Dict[str, np.ndarray]:
+    """Per-atom probe type index, charge, solvation volume and parameter of a ligand"""
+    charges = np.nan_to_num(np.asarray(charges, dtype=np.float32))
+    types = np.array([PROBE_TYPES.index(e) if e in PROBE_TYPES else 0 for e in elements], dtype=np.int64)
+    params = np.array([ATOM_PARAMS.get(e, ATOM_PARAMS['C']) for e in elements], dtype=np.float32).reshape(-1, 4)
+    return {
+        'types': types,
+        'charges': charges,
+        'volume': params[:, 2],
+        'solvation': params[:, 3] + CHARGE_SOLVATION * np.abs(charges),
+    }
+
+
+def _trilinear(maps: GridMaps, points: np.ndarray):
+    """Flat base index, corner offsets, corner weights and outside-grid mask for points (N, 3)"""
+    shape = np.array(maps.shape)
+    grid = (points - maps.origin) / maps.spacing
+    outside = ((grid < 0) | (grid > shape - 1)).any(axis=1)
+    grid = np.clip(grid, 0, shape - 1)
+    # The last cell ends at the upper face, where frac reaches 1
+    base = np.minimum(np.floor(grid), shape - 2).astype(np.int64)
+    frac = (grid - base).astype(np.float32)
+    strides = np.array([shape[1] * shape[2], shape[2], 1])
+    flat = base @ strides
+    offsets, weights = [], []
+    for dx in (0, 1):
+        for dy in (0, 1):
+            for dz in (0, 1):
+                offsets.append(dx * strides[0] + dy * strides[1] + dz)
+                weights.append(
+                    (frac[:, 0] if dx else 1 - frac[:, 0])
+                    * (frac[:, 1] if dy else 1 - frac[:, 1])
+                    * (frac[:, 2] if dz else 1 - frac[:, 2])
+                )
+    return flat, offsets, weights, outside
+
+
+def _interpolate(values: np.ndarray, flat: np.ndarray, offsets, weights) -> np.ndarray:
+    result = np.zeros(len(flat), dtype=np.float32)
+    for offset, weight in zip(offsets, weights):
+        result += values[flat + offset] * weight
+    return result
+
+
+def score_poses(maps: GridMaps, ligand: Dict[str, np.ndarray], poses: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Energy terms (kcal/mol) of ligand poses, each array of shape (P,).
+    `poses` holds the atom coordinates of P poses, shape (P, A, 3).
+    """
+    num_poses, num_atoms = poses.shape[:2]
+    flat, offsets, weights, outside = _trilinear(maps, poses.reshape(-1, 3))
+    grid_size = maps.electrostatic.size
+
+    steric_flat = flat + np.tile(ligand['types'], num_poses) * grid_size
+    vdw = _interpolate(maps.steric.reshape(-1), steric_flat, offsets, weights)
+    vdw[outside] = OUT_OF_GRID_PENALTY
+    elec = _interpolate(maps.electrostatic.reshape(-1), flat, offsets, weights) * np.tile(ligand['charges'], num_poses)
+    desolv = DESOLV_WEIGHT * (
+        _interpolate(maps.volume.reshape(-1), flat, offsets, weights) * np.tile(ligand['solvation'], num_poses)
+        + _interpolate(maps.solvation.reshape(-1), flat, offsets, weights) * np.tile(ligand['volume'], num_poses)
+    )
+    elec[outside] = 0.0
+    desolv[outside] = 0.0
+    return {
+        'van_der_waals': vdw.reshape(num_poses, num_atoms).sum(axis=1),
+        'electrostatic': elec.reshape(num_poses, num_atoms).sum(axis=1),
+        'desolvation': desolv.reshape(num_poses, num_atoms).sum(axis=1),
+    }
+
+
+def random_rotations(count: int, seed: int = 0) -> np.ndarray:
+    """`count` rotation matrices (count, 3, 3) from uniformly sampled unit quaternions, identity first"""
+    q = np.random.default_rng(seed).normal(size=(count, 4))
+    q[0] = (1.0, 0.0, 0.0, 0.0)
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    w, x, y, z = q.T
+    return np.stack([
+        np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)], axis=-1),
+        np.stack([2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)], axis=-1),
+        np.stack([2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)], axis=-1),
+    ], axis=1).astype(np.float32)
+
+
+def translation_offsets(extent: float, step: float) -> np.ndarray:
+    """Cubic lattice of translations within +/- extent"""
+    axis = np.arange(-extent, extent + 1e-6, step, dtype=np.float32)
+    return np.stack(np.meshgrid(axis, axis, axis, indexing='ij'), axis=-1).reshape(-1, 3)
+
+
+def dock_rigid(maps: GridMaps, ligand: Dict[str, np.ndarray], coords: np.ndarray, center: Sequence[float],
+               rotations: np.ndarray, offsets: np.ndarray, refine_rounds: int = 2,
+               max_points: int = 1_000_000, torsions: int = 0) -> Dict:
+    """
+    Rigid-body pose search: every rotation x translation of the ligand's scored
+    atoms (`coords`, centered on their centroid) around `center` is scored, then
+    the best pose is refined with progressively smaller perturbations. Returns
+    the best pose (see apply_pose), total energy and per-term breakdown.
+    """
+    coords = np.asarray(coords, dtype=np.float32)
+    centroid = coords.mean(axis=0)
+    coords = coords - centroid
+    center = np.asarray(center, dtype=np.float32)
+    chunk = max(1, max_points // max(len(coords), 1))
+
+    def search(rotation_set, translation_set, base_rotation, base_translation):
+        rotated = np.einsum('rij,aj->rai', rotation_set @ base_rotation, coords)
+        best = (np.inf, None, None)
+        r_all = np.repeat(np.arange(len(rotation_set)), len(translation_set))
+        t_all = np.tile(np.arange(len(translation_set)), len(rotation_set))
+        for start in range(0, len(r_all), chunk):
+            r_idx, t_idx = r_all[start:start + chunk], t_all[start:start + chunk]
+            poses = rotated[r_idx] + (base_translation + translation_set[t_idx])[:, None, :]
+            terms = score_poses(maps, ligand, poses)
+            total = terms['van_der_waals'] + terms['electrostatic'] + terms['desolvation']
+            i = int(np.argmin(total))
+            if total[i] < best[0]:
+                best = (float(total[i]), rotation_set[r_idx[i]] @ base_rotation,
+                        base_translation + translation_set[t_idx[i]])
+        return best
+
+    _, rotation, translation = search(rotations, offsets, np.eye(3, dtype=np.float32), center)
+    scale = 1.0
+    for _ in range(refine_rounds):
+        scale /= 2
+        small = _small_rotations(rotations, scale)
+        _, rotation, translation = search(small, offsets * scale, rotation, translation)
+
+    pose = coords @ rotation.T + translation
+    terms = {name: float(values[0]) for name, values in score_poses(maps, ligand, pose[None]).items()}
+    terms['torsional'] = TORSION_WEIGHT * torsions
+    return {
+        'pose': {'centroid': centroid, 'rotation': rotation, 'translation': translation},
+        'affinity': sum(terms.values()),
+        'terms': terms,
+        'poses_scored': len(rotations) * len(offsets) * (1 + refine_rounds),
+    }
+
+
+def apply_pose(coords: np.ndarray, pose: Dict[str, np.ndarray]) -> np.ndarray:
+    """Move ligand coordinates (all atoms, in the frame dock_rigid was given) into a docked pose"""
+    return (np.asarray(coords, dtype=np.float32) - pose['centroid']) @ pose['rotation'].T + pose['translation']
+
+
+def _small_rotations(rotations: np.ndarray, scale: float) -> np.ndarray:
+    """Rotations shrunk towards the identity (angle scaled by `scale`)"""
+    angles = np.arccos(np.clip((np.trace(rotations, axis1=1, axis2=2) - 1) / 2, -1, 1))
+    axes = np.stack([
+        rotations[:, 2, 1] - rotations[:, 1, 2],
+        rotations[:, 0, 2] - rotations[:, 2, 0],
+        rotations[:, 1, 0] - rotations[:, 0, 1],
+    ], axis=1)
+    norms = np.linalg.norm(axes, axis=1, keepdims=True)
+    axes = np.divide(axes, norms, out=np.zeros_like(axes), where=norms > 1e-6)
+    # Rodrigues' formula for the scaled angle
+    theta = (angles * scale)[:, None, None]
+    k = np.zeros((len(axes), 3, 3), dtype=np.float32)
+    k[:, 0, 1], k[:, 0, 2], k[:, 1, 2] = -axes[:, 2], axes[:, 1], -axes[:, 0]
+    k[:, 1, 0], k[:, 2, 0], k[:, 2, 1] = axes[:, 2], -axes[:, 1], axes[:, 0]
+    return (np.eye(3, dtype=np.float32) + np.sin(theta) * k + (1 - np.cos(theta)) * (k @ k)).astype(np.float32)
@@ -0,0 +1,198 @@
+"""
+History Fingerprint Index
+
+Base for the in-memory molecule indexes over `generation_history` (each
+result's best SMILES and its candidates): one packed uint64 bit matrix with a
+fingerprint row per molecule, plus per-row record metadata (record id, SMILES,
+model, experiment). Subclasses choose the fingerprint (a chem_tasks function
+returning packed rows) and implement the queries:
+
+- services/similarity_index.py: Morgan fingerprints, top-k Tanimoto
+- services/substructure_index.py: pattern fingerprints, SMARTS substructure search
+
+An index is built from MongoDB in the background on startup (fingerprints
+computed in the chem process pool) and kept current by the history store
+(services/generation_store.py), which hands it every newly inserted record.
+"""
+
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.chem_executor import chem_executor
+from services.generation_store import on_records_saved
+
+logger = logging.getLogger(__name__)
+
+# SMILES per fingerprinting task while building
+INDEX_BUILD_CHUNK = 2000
+# Fingerprint rows scanned per vectorized block (bounds temporary memory)
+INDEX_BLOCK_ROWS = 65536
+
+HISTORY_PROJECTION = {
+    '_id': 0, 'id': 1, 'experiment_id': 1,
+    'results.smiles': 1, 'results.model_name': 1, 'results.is_valid': 1,
+    'results.candidates.smiles': 1, 'results.candidates.is_valid': 1,
+}
+
+
+def record_entries(doc: Dict) -> List[Tuple[str, Optional[str]]]:
+    """Distinct valid (smiles, model_name) pairs of one history document"""
+    seen = set()
+    entries = []
+    for result in doc.get('results') or []:
+        if not result.get('is_valid', True):
+            continue
+        smiles_list = [result.get('smiles')] + [
+            c.get('smiles') for c in result.get('candidates') or [] if c.get('is_valid', True)
+        ]
+        for smiles in smiles_list:
+            if smiles and smiles not in seen:
+                seen.add(smiles)
+                entries.append((smiles, result.get('model_name')))
+    return entries
+
+
+class FingerprintIndex:
+    """Packed fingerprint matrix with per-row record metadata"""
+
+    label = 'Fingerprint index'
+
+    def __init__(self, n_bits: int, fingerprint_task: Callable, **fingerprint_options):
+        if n_bits % 64:
+            raise ValueError(f"{self.label} fingerprint length must be a multiple of 64")
+        self.n_bits = n_bits
+        self.n_words = n_bits // 64
+        self.fingerprint_task = fingerprint_task
+        self.fingerprint_options = {**fingerprint_options, 'n_bits': n_bits}
+        self._fps = np.zeros((0, self.n_words), dtype=np.uint64)
+        self._counts = np.zeros(0, dtype=np.int32)
+        self._experiments = np.zeros(0, dtype=np.int32)  # Experiment code per row, -1 = none
+        self._size = 0
+        self._experiment_codes: Dict[str, int] = {}
+        self._indexed_records = set()
+        self._pending_records = set()  # Being fingerprinted; indexed once appended
+        self.record_ids: List[str] = []
+        self.smiles: List[str] = []
+        self.model_names: List[Optional[str]] = []
+        self.ready = False
+        self._build_task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def start(self, db) -> None:
+        """Follow new history inserts and build from MongoDB in the background"""
+        on_records_saved(self.add_docs)
+        if self._build_task is None:
+            self._build_task = asyncio.create_task(self.build(db))
+
+    async def stop(self) -> None:
+        if self._build_task is not None and not self._build_task.done():
+            self._build_task.cancel()
+            try:
+                await self._build_task
+            except asyncio.CancelledError:
+                pass
+
+    async def build(self, db) -> None:
+        """Index every history document (chunks fingerprinted across the chem pool)"""
+        pending: List[Dict] = []
+        pending_smiles = 0
+        batch_smiles = INDEX_BUILD_CHUNK * chem_executor.max_workers
+        try:
+            async for doc in db.generation_history.find({}, HISTORY_PROJECTION):
+                pending.append(doc)
+                pending_smiles += len(doc.get('results') or [])
+                if pending_smiles >= batch_smiles:
+                    await self.add_docs(pending)
+                    pending, pending_smiles = [], 0
+            if pending:
+                await self.add_docs(pending)
+            self.ready = True
+            logger.info(f"{self.label} built: {self._size} fingerprints")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"{self.label} build failed: {e}")
+
+    async def add_docs(self, docs: List[Dict]) -> None:
+        """Fingerprint and append the SMILES of history documents not indexed yet"""
+        rows = []
+        record_ids = set()
+        for doc in docs:
+            record_id = doc.get('id')
+            if record_id in self._indexed_records or record_id in self._pending_records:
+                continue
+            record_ids.add(record_id)
+            for smiles, model_name in record_entries(doc):
+                rows.append((record_id, smiles, model_name, doc.get('experiment_id')))
+        if not rows:
+            self._indexed_records |= record_ids
+            return
+
+        # Records are only marked indexed once appended, so a failed batch is retried on a later save
+        self._pending_records |= record_ids
+        try:
+            chunks = [rows[i:i + INDEX_BUILD_CHUNK] for i in range(0, len(rows), INDEX_BUILD_CHUNK)]
+            results = await chem_executor.map(
+                self.fingerprint_task,
+                [[row[1] for row in chunk] for chunk in chunks],
+                **self.fingerprint_options
+            )
+            for chunk, (packed, valid) in zip(chunks, results):
+                self._append(chunk, packed, valid)
+            self._indexed_records |= record_ids
+        finally:
+            self._pending_records -= record_ids
+
+    def _append(self, rows: List[Tuple], packed: bytes, valid: List[bool]) -> None:
+        fps = np.frombuffer(packed, dtype=np.uint64).reshape(-1, self.n_words)
+        keep = [i for i, ok in enumerate(valid) if ok]
+        if not keep:
+            return
+        fps = fps[keep]
+        new_size = self._size + len(keep)
+        if new_size > len(self._fps):
+            # Grow by doubling; queries in flight keep their view of the old arrays
+            capacity = max(new_size, 2 * len(self._fps), 1024)
+            self._fps = np.resize(self._fps, (capacity, self.n_words))
+            self._counts = np.resize(self._counts, capacity)
+            self._experiments = np.resize(self._experiments, capacity)
+
+        self._fps[self._size:new_size] = fps
+        self._counts[self._size:new_size] = np.bitwise_count(fps).sum(axis=1, dtype=np.int32)
+        for offset, i in enumerate(keep):
+            record_id, smiles, model_name, experiment_id = rows[i]
+            self._experiments[self._size + offset] = self._experiment_code(experiment_id)
+            self.record_ids.append(record_id)
+            self.smiles.append(smiles)
+            self.model_names.append(model_name)
+        self._size = new_size
+
+    def _experiment_code(self, experiment_id: Optional[str]) -> int:
+        if not experiment_id:
+            return -1
+        return self._experiment_codes.setdefault(experiment_id, len(self._experiment_codes))
+
+    def _experiment_names(self) -> Dict[int, str]:
+        return {code: name for name, code in self._experiment_codes.items()}
+
+    def _row(self, i: int, experiment_names: Dict[int, str]) -> Dict[str, Any]:
+        return {
+            'record_id': self.record_ids[i],
+            'smiles': self.smiles[i],
+            'model_name': self.model_names[i],
+            'experiment_id': experiment_names.get(int(self._experiments[i])),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'ready': self.ready,
+            'fingerprints': self._size,
+            'records': len(self._indexed_records),
+            'n_bits': self.n_bits,
+            'matrix_mb': round(self._fps.nbytes / 2**20, 1),
+        }
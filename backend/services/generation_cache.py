@@ -0,0 +1,163 @@
+"""
+Generation Result Cache
+
+Two-tier cache in front of the model clients for deterministic generation
+settings (e.g. MolT5 beam search):
+1. In-process LRU (GENERATION_CACHE_SIZE entries)
+2. MongoDB collection `generation_cache` with a TTL index on `expires_at`
+   (GENERATION_CACHE_TTL_SECONDS)
+
+Keys combine the normalized prompt, model, options and the model_version the
+model server currently reports (from generation responses and /health, see
+ModelClient.current_version). When a redeployed model reports a new
+version, keys built from the old version are never looked up again and age out.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from services.model_clients import ModelResult
+from services.single_flight import normalize_prompt
+
+logger = logging.getLogger(__name__)
+
+GENERATION_CACHE_SIZE = int(os.environ.get('GENERATION_CACHE_SIZE', '1024'))
+GENERATION_CACHE_TTL_SECONDS = int(os.environ.get('GENERATION_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
+
+
+class GenerationCache:
+    """LRU + MongoDB cache of ModelResults keyed by prompt, model, options and version"""
+
+    def __init__(self, max_entries: int = GENERATION_CACHE_SIZE,
+                 ttl_seconds: int = GENERATION_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lru: "OrderedDict[str, Tuple[float, ModelResult]]" = OrderedDict()
+        self._collection = None
+        self._versions_seen: Dict[str, str] = {}
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.version_changes = 0
+
+    async def attach(self, db) -> None:
+        """Use `db.generation_cache` as the persistent tier"""
+        self._collection = db.generation_cache
+
+    @staticmethod
+    def make_key(prompt: str, model_name: str, options: Dict[str, Any], model_version: str) -> str:
+        raw = json.dumps(
+            [normalize_prompt(prompt), model_name, options, model_version],
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    async def get(self, prompt: str, model_name: str, options: Dict[str, Any],
+                  model_version: Optional[str]) -> Optional[ModelResult]:
+        """Look up a result for the model's current version; None on miss"""
+        if not model_version:
+            # Version not known yet (model not reached since startup)
+            self.misses += 1
+            return None
+
+        key = self.make_key(prompt, model_name, options, model_version)
+        entry = self._lru.get(key)
+        if entry is not None:
+            expires_at, result = entry
+            if expires_at > time.time():
+                self._lru.move_to_end(key)
+                self.memory_hits += 1
+                return result
+            del self._lru[key]
+
+        if self._collection is not None:
+            try:
+                doc = await self._collection.find_one(
+                    {'key': key, 'expires_at': {'$gt': datetime.now(timezone.utc)}},
+                    {'_id': 0, 'result': 1, 'expires_at': 1}
+                )
+            except Exception as e:
+                logger.warning(f"Generation cache lookup failed: {e}")
+                doc = None
+            if doc:
+                result = ModelResult(**doc['result'])
+                expires_at = doc['expires_at']
+                if expires_at.tzinfo is None:
+                    expires_at = expires_at.replace(tzinfo=timezone.utc)
+                self._remember(key, expires_at.timestamp(), result)
+                self.persistent_hits += 1
+                return result
+
+        self.misses += 1
+        return None
+
+    async def put(self, prompt: str, model_name: str, options: Dict[str, Any], result: ModelResult,
+                  model_version: Optional[str]) -> None:
+        """
+        Store a real (non-mock) model result under `model_version`, the
+        server-reported version that get() is called with. Skipped while the
+        model has not reported one: such an entry could never be looked up.
+        """
+        if result.is_mock or not model_version:
+            return
+        previous = self._versions_seen.get(model_name)
+        if previous is not None and previous != model_version:
+            self.version_changes += 1
+            logger.info(f"{model_name} version changed {previous} -> {model_version}; cache keys rotated")
+        self._versions_seen[model_name] = model_version
+
+        key = self.make_key(prompt, model_name, options, model_version)
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl_seconds)
+        self._remember(key, expires_at.timestamp(), result)
+
+        if self._collection is not None:
+            try:
+                await self._collection.update_one(
+                    {'key': key},
+                    {'$set': {
+                        'key': key,
+                        'model_name': model_name,
+                        'model_version': model_version,
+                        'result': asdict(result),
+                        'expires_at': expires_at,
+                    }},
+                    upsert=True
+                )
+            except Exception as e:
+                logger.warning(f"Generation cache write failed: {e}")
+
+    def _remember(self, key: str, expires_at: float, result: ModelResult) -> None:
+        self._lru[key] = (expires_at, result)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.memory_hits + self.persistent_hits
+        lookups = hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'persistent_hits': self.persistent_hits,
+            'misses': self.misses,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'memory_entries': len(self._lru),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'version_changes': self.version_changes,
+            'model_versions': dict(self._versions_seen),
+        }
+
+
+# Shared cache instance (persistent tier attached on app startup)
+generation_cache = GenerationCache()
@@ -0,0 +1,500 @@
+"""
+Generation History Store
+
+Single write path for `generation_history`: serializes GenerationRecords,
+inserts them (one or many), updates the linked experiment's run statistics
+(`run_count` with $inc, `last_run`, `updated_at`) in one atomic update, and
+then hands the stored documents to registered listeners (e.g. the similarity
+index) so derived indexes stay current without re-reading the collection.
+Listeners run as background tasks, never on the request path.
+
+Optional write-behind (HISTORY_WRITE_BEHIND): save_record/save_records queue
+the documents in memory and return at once; a background flusher writes them
+with one insert_many plus one experiments bulk_write per batch, when
+HISTORY_FLUSH_SIZE documents are queued or every HISTORY_FLUSH_INTERVAL_MS.
+Failed flushes are retried with backoff: re-inserted duplicates are ignored,
+and each experiment update carries the batch id, so a retry never counts a
+run twice. A batch failing with anything but a MongoDB error (e.g. a document
+BSON cannot encode) is written one document at a time, dropping the ones that
+still fail; should the flusher die anyway, what it had queued is written
+directly and saves go straight to the database from then on. Callers wait once HISTORY_QUEUE_MAX documents are queued; shutdown
+drains the queue, and saves arriving during or after the drain are written
+directly. Routes reading a single record call history_writer.settle(id)
+first, so a record that is still queued is found.
+
+Timestamps are stored as BSON dates (scripts/migrate_timestamps.py converts
+documents written with ISO strings). Reads page through history newest first
+with a keyset cursor on (`created_at`, `id`) (history_page), optionally within
+a `created_at` range (created_between), or iterate it in batches for exports
+(iter_history), so neither holds more than one page or batch in memory.
+Until the migration has run, documents with string timestamps sort after all
+dated ones (MongoDB orders dates above strings) and are paged through there.
+
+reconcile_experiment_stats() rebuilds the experiment statistics from history
+with one aggregation (scripts/reconcile_experiment_stats.py).
+
+Configuration (environment):
+- HISTORY_WRITE_BEHIND (true/false, default false)
+- HISTORY_FLUSH_SIZE (documents per batch, default 200)
+- HISTORY_FLUSH_INTERVAL_MS (longest a document stays queued, default 250)
+- HISTORY_QUEUE_MAX (queued documents before callers wait, default 10000)
+- HISTORY_DRAIN_TIMEOUT_SECONDS (shutdown drain limit, default 30)
+"""
+
+import asyncio
+import base64
+import binascii
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+
+from models import GenerationRecord
+
+logger = logging.getLogger(__name__)
+
+HISTORY_WRITE_BEHIND = os.environ.get('HISTORY_WRITE_BEHIND', 'false').lower() in ('1', 'true', 'yes')
+HISTORY_FLUSH_SIZE = int(os.environ.get('HISTORY_FLUSH_SIZE', '200'))
+HISTORY_FLUSH_INTERVAL_MS = int(os.environ.get('HISTORY_FLUSH_INTERVAL_MS', '250'))
+HISTORY_QUEUE_MAX = int(os.environ.get('HISTORY_QUEUE_MAX', '10000'))
+HISTORY_DRAIN_TIMEOUT_SECONDS = float(os.environ.get('HISTORY_DRAIN_TIMEOUT_SECONDS', '30'))
+# Backoff between retries of a failed flush: doubles from the first value up to the second
+HISTORY_RETRY_BACKOFF_SECONDS = (0.5, 30.0)
+DUPLICATE_KEY_ERROR = 11000
+# Recent write-behind batch ids kept on each experiment (makes retried flushes idempotent)
+FLUSHED_BATCHES_KEPT = 10
+
+# Newest first; `id` breaks ties between records created in the same instant
+HISTORY_SORT = [('created_at', -1), ('id', -1)]
+HISTORY_EXPORT_BATCH_SIZE = 500
+# Response header of paged history endpoints carrying the next page's cursor
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+RecordListener = Callable[[List[Dict]], Awaitable[None]]
+
+_listeners: List[RecordListener] = []
+_listener_tasks: Set[asyncio.Task] = set()  # Strong references until each listener call finishes
+
+
+def on_records_saved(listener: RecordListener) -> None:
+    """Register an async callback that receives newly inserted history documents"""
+    _listeners.append(listener)
+
+
+def record_to_doc(record: GenerationRecord, parent_id: Optional[str] = None) -> Dict:
+    """MongoDB document for a GenerationRecord"""
+    doc = record.model_dump()
+    if parent_id:
+        doc['parent_id'] = parent_id  # Link to parent if we want to track versions later
+    return doc
+
+
+async def save_record(db, record: GenerationRecord, parent_id: Optional[str] = None) -> Dict:
+    """Insert one record (or queue it, with write-behind), update its experiment and notify listeners"""
+    doc = record_to_doc(record, parent_id)
+    if history_writer.running:
+        await history_writer.submit([doc])
+    else:
+        await _write(db, [doc])
+    return doc
+
+
+async def save_records(db, records: List[GenerationRecord]) -> List[Dict]:
+    """Bulk-insert records (unordered; or queue them, with write-behind), update experiments and notify listeners"""
+    docs = [record_to_doc(record) for record in records]
+    if docs and history_writer.running:
+        await history_writer.submit(docs)
+    elif docs:
+        await _write(db, docs)
+    return docs
+
+
+async def _write(db, docs: List[Dict]) -> None:
+    """Write-through path: insert, update experiments, notify listeners"""
+    if len(docs) == 1:
+        await db.generation_history.insert_one(docs[0])
+    else:
+        await db.generation_history.insert_many(docs, ordered=False)
+    await _update_experiments(db, docs)
+    _notify(docs)
+
+
+async def experiment_smiles(db, experiment_id: str) -> List[str]:
+    """Distinct SMILES generated in an experiment (each result's best molecule), first-seen order"""
+    smiles = []
+    cursor = db.generation_history.find({"experiment_id": experiment_id}, {"_id": 0, "results.smiles": 1})
+    async for doc in cursor:
+        smiles.extend(result["smiles"] for result in doc.get("results", []) if result.get("smiles"))
+    return list(dict.fromkeys(smiles))
+
+
+def encode_cursor(doc: Dict) -> str:
+    """Opaque cursor pointing just past `doc` in HISTORY_SORT order"""
+    created_at = doc['created_at']
+    if isinstance(created_at, datetime):
+        fields = [created_at.isoformat(), doc['id']]
+    else:
+        fields = [str(created_at), doc['id'], 'str']  # Not migrated yet: compare as a string
+    raw = json.dumps(fields, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[Union[datetime, str], str]:
+    """(created_at, id) of a cursor from encode_cursor; ValueError if it is malformed"""
+    try:
+        fields = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if fields[2:] == ['str'] and isinstance(fields[0], str):
+            created_at, record_id = fields[0], fields[1]
+        else:
+            created_at, record_id = fields
+            created_at = datetime.fromisoformat(created_at)
+    except (binascii.Error, UnicodeDecodeError, IndexError, KeyError, TypeError, ValueError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(record_id, str):
+        raise ValueError("Invalid cursor")
+    return created_at, record_id
+
+
+def created_between(since: Optional[datetime] = None, until: Optional[datetime] = None) -> Dict:
+    """History filter for `since` <= created_at < `until` (either bound optional; naive values are UTC)"""
+    bounds = {}
+    if since is not None:
+        bounds["$gte"] = since
+    if until is not None:
+        bounds["$lt"] = until
+    return {"created_at": bounds} if bounds else {}
+
+
+async def history_page(db, query: Dict, limit: int, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Up to `limit` history documents matching `query`, newest first, starting
+    after `cursor`; plus the cursor of the next page (None on the last page).
+    Uses an index range on (created_at, id) instead of skip, so every page
+    costs the same however deep it is.
+    """
+    if cursor:
+        created_at, record_id = decode_cursor(cursor)
+        after = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": record_id}},
+        ]
+        if isinstance(created_at, datetime):
+            after.append({"created_at": {"$type": "string"}})  # Unmigrated documents come after every date
+        query = {**query, "$or": after}
+    docs = await db.generation_history.find(query, {"_id": 0}).sort(HISTORY_SORT).limit(limit + 1).to_list(length=limit + 1)
+    if len(docs) > limit:
+        return docs[:limit], encode_cursor(docs[limit - 1])
+    return docs, None
+
+
+async def iter_history(db, query: Dict, batch_size: int = HISTORY_EXPORT_BATCH_SIZE) -> AsyncIterator[Dict]:
+    """Every history document matching `query` in HISTORY_SORT order, fetched `batch_size` at a time"""
+    cursor = db.generation_history.find(query, {"_id": 0}).sort(HISTORY_SORT).batch_size(batch_size)
+    try:
+        async for doc in cursor:
+            yield doc
+    finally:
+        await cursor.close()
+
+
+def run_summary(doc: Dict) -> Dict:
+    """`last_run` summary (ExperimentRunSummary) of a history document"""
+    results = doc.get('results') or []
+    return {
+        'id': doc['id'],
+        'prompt': doc['prompt'],
+        'created_at': doc['created_at'],
+        'num_results': len(results),
+        'num_valid': sum(1 for result in results if result.get('is_valid', True)),
+    }
+
+
+async def _update_experiments(db, docs: List[Dict], batch_id: Optional[str] = None) -> None:
+    """
+    One atomic update per experiment with runs in `docs`, sent as a single bulk
+    write. With `batch_id`, an experiment that already counted that batch is
+    skipped, so a retry after a partially applied bulk write is safe.
+    """
+    runs: Dict[str, List[Dict]] = {}
+    for doc in docs:
+        if doc.get('experiment_id'):
+            runs.setdefault(doc['experiment_id'], []).append(doc)
+    updates = []
+    for experiment_id, experiment_docs in runs.items():
+        latest = max(experiment_docs, key=lambda doc: doc['created_at'])
+        query: Dict[str, Any] = {"id": experiment_id}
+        update: Dict[str, Any] = {
+            "$inc": {"run_count": len(experiment_docs)},
+            "$set": {"updated_at": datetime.now(timezone.utc), "last_run": run_summary(latest)},
+        }
+        if batch_id:
+            query["flushed_batches"] = {"$ne": batch_id}
+            update["$push"] = {"flushed_batches": {"$each": [batch_id], "$slice": -FLUSHED_BATCHES_KEPT}}
+        updates.append(UpdateOne(query, update))
+    if updates:
+        await db.experiments.bulk_write(updates, ordered=False)
+
+
+async def _call_listener(listener: RecordListener, docs: List[Dict]) -> None:
+    try:
+        await listener(docs)
+    except Exception as e:
+        logger.warning(f"History listener {getattr(listener, '__qualname__', listener)} failed: {e}")
+
+
+def _notify(docs: List[Dict]) -> None:
+    """Dispatch the stored documents to every listener in the background"""
+    for listener in _listeners:
+        task = asyncio.create_task(_call_listener(listener, docs))
+        _listener_tasks.add(task)
+        task.add_done_callback(_listener_tasks.discard)
+
+
+async def reconcile_experiment_stats(db) -> Dict[str, Any]:
+    """
+    Recompute every experiment's `run_count` and `last_run` from
+    `generation_history` with a single aggregation, then write them back in
+    one unordered bulk write. Experiments without runs are reset to zero.
+    """
+    pipeline = [
+        {"$match": {"experiment_id": {"$ne": None}}},
+        {"$sort": {"created_at": 1}},
+        {"$group": {
+            "_id": "$experiment_id",
+            "run_count": {"$sum": 1},
+            "last": {"$last": {
+                "id": "$id", "prompt": "$prompt", "created_at": "$created_at", "results": "$results.is_valid",
+            }},
+        }},
+    ]
+    updates, experiment_ids = [], []
+    async for group in db.generation_history.aggregate(pipeline, allowDiskUse=True):
+        last = group['last']
+        last['results'] = [{'is_valid': valid} for valid in last.get('results') or []]
+        experiment_ids.append(group['_id'])
+        updates.append(UpdateOne(
+            {"id": group['_id']},
+            {"$set": {"run_count": group['run_count'], "last_run": run_summary(last)}}
+        ))
+    matched = 0
+    if updates:
+        result = await db.experiments.bulk_write(updates, ordered=False)
+        matched = result.matched_count
+    reset = await db.experiments.update_many(
+        {"id": {"$nin": experiment_ids}, "run_count": {"$ne": 0}},
+        {"$set": {"run_count": 0, "last_run": None}}
+    )
+    return {'experiments_with_runs': matched, 'experiments_reset': reset.modified_count}
+
+
+class HistoryWriter:
+    """Write-behind queue of history documents, flushed in batches by a background task"""
+
+    def __init__(self, enabled: bool = HISTORY_WRITE_BEHIND, flush_size: int = HISTORY_FLUSH_SIZE,
+                 flush_interval_ms: int = HISTORY_FLUSH_INTERVAL_MS, max_queued: int = HISTORY_QUEUE_MAX):
+        self.enabled = enabled
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_queued = max_queued
+        self._db = None
+        self._queue: List[Dict] = []
+        self._batch: List[Dict] = []  # Being written
+        self._pending = set()  # Record ids queued or being written
+        self._wake = asyncio.Event()
+        self._flushed = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+        self._draining = False
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+        self.rejected = 0
+
+    @property
+    def running(self) -> bool:
+        """True while new records are queued instead of written directly"""
+        return self._task is not None and not self._draining
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue) + len(self._batch)
+
+    def start(self, db) -> None:
+        """Start the flusher (no-op unless HISTORY_WRITE_BEHIND is enabled)"""
+        if not self.enabled or self._task is not None:
+            return
+        self._db = db
+        self._draining = False
+        self._task = asyncio.create_task(self._run())
+        self._task.add_done_callback(self._on_flusher_done)
+
+    async def stop(self, timeout: float = HISTORY_DRAIN_TIMEOUT_SECONDS) -> None:
+        """Write everything still queued (up to `timeout` seconds), then stop"""
+        if self._task is None:
+            return
+        self._draining = True  # Saves from now on write directly
+        self._wake.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"History writer drain timed out; {self.queued} records were not written")
+        except Exception:
+            # The flusher died (logged by _on_flusher_done); let its queue be written
+            if self._task is not None:
+                await asyncio.wait([self._task], timeout=timeout)
+        finally:
+            self._task = None
+            async with self._flushed:
+                self._flushed.notify_all()
+
+    async def submit(self, docs: List[Dict]) -> None:
+        """
+        Queue documents for the next flush; waits while the queue is full.
+        Once stop() has begun draining, the documents are written directly, as
+        the final flush may already have run.
+        """
+        async with self._flushed:
+            while self.queued >= self.max_queued and self.running:
+                self._wake.set()
+                await self._flushed.wait()
+        if not self.running:
+            await _write(self._db, docs)
+            return
+        self._queue.extend(docs)
+        self._pending.update(doc['id'] for doc in docs)
+        if len(self._queue) >= self.flush_size:
+            self._wake.set()
+
+    async def settle(self, record_id: str) -> None:
+        """Wait until `record_id` is written if it is still queued, so a following read finds it"""
+        async with self._flushed:
+            while record_id in self._pending and self._task is not None:
+                self._wake.set()
+                await self._flushed.wait()
+
+    def _on_flusher_done(self, task: asyncio.Task) -> None:
+        if task.cancelled() or task.exception() is None or self._task is not task:
+            return
+        logger.error("History writer flusher died; writing directly from now on", exc_info=task.exception())
+        self._draining = True
+        self._task = asyncio.create_task(self._write_stranded())
+
+    async def _write_stranded(self) -> None:
+        """Write what a dead flusher left queued, then release callers waiting on it"""
+        docs, self._batch, self._queue = self._batch + self._queue, [], []
+        try:
+            docs = await self._salvage(docs, False, uuid.uuid4().hex)
+            self.written += len(docs)
+            _notify(docs)
+        finally:
+            self._pending.clear()
+            self._task = None
+            async with self._flushed:
+                self._flushed.notify_all()
+
+    async def _run(self) -> None:
+        while self._queue or not self._draining:
+            if len(self._queue) < self.flush_size and not self._draining:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+            if self._queue:
+                await self._flush()
+
+    async def _flush(self) -> None:
+        self._batch, self._queue = self._queue[:self.flush_size], self._queue[self.flush_size:]
+        docs, inserted = self._batch, False
+        batch_id = uuid.uuid4().hex
+        delay, max_delay = HISTORY_RETRY_BACKOFF_SECONDS
+        while True:
+            try:
+                if not inserted:
+                    docs = await self._insert(docs)
+                    inserted = True
+                await _update_experiments(self._db, docs, batch_id)
+                break
+            except PyMongoError as e:
+                self.retries += 1
+                logger.warning(f"History flush of {len(docs)} records failed, retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, max_delay)
+            except Exception:
+                # Not transient: retrying the same batch would fail forever
+                logger.exception(f"History flush of {len(docs)} records failed, writing them one by one")
+                docs = await self._salvage(docs, inserted, batch_id)
+                break
+        self._pending.difference_update(doc['id'] for doc in self._batch)
+        self._batch = []
+        self.written += len(docs)
+        self.batches += 1
+        async with self._flushed:
+            self._flushed.notify_all()
+        _notify(docs)
+
+    async def _insert(self, docs: List[Dict]) -> List[Dict]:
+        """
+        Unordered insert_many. Duplicate keys (documents inserted by an earlier
+        attempt of the same batch) count as written; documents rejected for any
+        other reason are dropped and logged. Returns the documents written.
+        """
+        try:
+            await self._db.generation_history.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            if e.details.get('writeConcernErrors'):
+                raise
+            rejected = {
+                error['index'] for error in e.details.get('writeErrors', [])
+                if error.get('code') != DUPLICATE_KEY_ERROR
+            }
+            if rejected:
+                self.rejected += len(rejected)
+                logger.error(f"History flush dropped {len(rejected)} records the server rejected: {e.details['writeErrors'][0]}")
+                docs = [doc for index, doc in enumerate(docs) if index not in rejected]
+        return docs
+
+    async def _salvage(self, docs: List[Dict], inserted: bool, batch_id: str) -> List[Dict]:
+        """
+        Insert documents one at a time (unless already `inserted`), dropping
+        those that fail, then update experiments once. Returns the documents written.
+        """
+        if not inserted:
+            written = []
+            for doc in docs:
+                try:
+                    await self._db.generation_history.insert_one(doc)
+                except DuplicateKeyError:
+                    pass  # Inserted by an earlier attempt
+                except Exception as e:
+                    self.rejected += 1
+                    logger.error(f"History writer dropped record {doc.get('id')}: {e}")
+                    continue
+                written.append(doc)
+            docs = written
+        try:
+            await _update_experiments(self._db, docs, batch_id)
+        except Exception as e:
+            logger.error(f"Experiment stats of {len(docs)} records not updated (run reconcile_experiment_stats): {e}")
+        return docs
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'running': self.running,
+            'queued': self.queued,
+            'written': self.written,
+            'batches': self.batches,
+            'retries': self.retries,
+            'rejected': self.rejected,
+            'flush_size': self.flush_size,
+            'flush_interval_ms': int(self.flush_interval * 1000),
+        }
+
+
+# Shared writer (started from server.py when HISTORY_WRITE_BEHIND is set)
+history_writer = HistoryWriter()
@@ -0,0 +1,140 @@
+"""
+Background Health Monitor for Model Backends
+
+Probes every registered model client's /health endpoint concurrently on a
+fixed interval and keeps, per model, a bounded probe history and an EWMA of
+probe latency. Results feed each client's circuit breaker, and
+GET /api/knowledge/models/available is answered from this in-memory state.
+
+Configuration (environment):
+- HEALTH_MONITOR_INTERVAL_SECONDS (probe interval, default 10)
+- HEALTH_HISTORY_SIZE (probes kept per model, default 60)
+- HEALTH_EWMA_ALPHA (weight of the newest latency sample, default 0.3)
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Optional
+
+from services.model_clients import ModelClient, MODEL_CLIENTS
+
+logger = logging.getLogger(__name__)
+
+HEALTH_MONITOR_INTERVAL_SECONDS = float(os.environ.get('HEALTH_MONITOR_INTERVAL_SECONDS', '10'))
+HEALTH_HISTORY_SIZE = int(os.environ.get('HEALTH_HISTORY_SIZE', '60'))
+HEALTH_EWMA_ALPHA = float(os.environ.get('HEALTH_EWMA_ALPHA', '0.3'))
+
+
+@dataclass
+class HealthSample:
+    """One health probe of a model server"""
+    checked_at: str
+    healthy: bool
+    latency_ms: float
+
+
+class ModelHealth:
+    """Probe history and latency EWMA for one model"""
+
+    def __init__(self, history_size: int = HEALTH_HISTORY_SIZE, alpha: float = HEALTH_EWMA_ALPHA):
+        self.alpha = alpha
+        self.history: Deque[HealthSample] = deque(maxlen=history_size)
+        self.latency_ewma_ms: Optional[float] = None
+        self.consecutive_failures = 0
+
+    @property
+    def healthy(self) -> Optional[bool]:
+        """Result of the latest probe (None before the first probe)"""
+        return self.history[-1].healthy if self.history else None
+
+    def record(self, healthy: bool, latency_ms: float) -> None:
+        self.history.append(HealthSample(
+            checked_at=datetime.now(timezone.utc).isoformat(),
+            healthy=healthy,
+            latency_ms=round(latency_ms, 2)
+        ))
+        if healthy:
+            self.consecutive_failures = 0
+            if self.latency_ewma_ms is None:
+                self.latency_ewma_ms = latency_ms
+            else:
+                self.latency_ewma_ms = self.alpha * latency_ms + (1 - self.alpha) * self.latency_ewma_ms
+        else:
+            self.consecutive_failures += 1
+
+    def summary(self, include_history: bool = False) -> Dict[str, Any]:
+        probes = len(self.history)
+        data = {
+            'healthy': self.healthy,
+            'last_checked': self.history[-1].checked_at if self.history else None,
+            'latency_ewma_ms': round(self.latency_ewma_ms, 2) if self.latency_ewma_ms is not None else None,
+            'consecutive_failures': self.consecutive_failures,
+            'uptime_ratio': round(sum(s.healthy for s in self.history) / probes, 3) if probes else None,
+        }
+        if include_history:
+            data['history'] = [asdict(s) for s in self.history]
+        return data
+
+
+class HealthMonitor:
+    """Periodically probes all model clients concurrently"""
+
+    def __init__(self, clients: Dict[str, ModelClient],
+                 interval: float = HEALTH_MONITOR_INTERVAL_SECONDS):
+        self.clients = clients
+        self.interval = interval
+        self.health: Dict[str, ModelHealth] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def probe_all(self) -> None:
+        """Probe every client at once and update history, EWMA and breakers"""
+        names = list(self.clients.keys())
+        results = await asyncio.gather(*(self._probe(self.clients[n]) for n in names))
+        for name, (healthy, latency_ms) in zip(names, results):
+            self.health.setdefault(name, ModelHealth()).record(healthy, latency_ms)
+            self.clients[name].breaker.record_probe(healthy)
+
+    @staticmethod
+    async def _probe(client: ModelClient):
+        start = time.perf_counter()
+        try:
+            healthy = await client.health_check()
+        except Exception:
+            healthy = False
+        return healthy, (time.perf_counter() - start) * 1000
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.probe_all()
+            except Exception as e:
+                logger.warning(f"Health monitor probe failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self, name: str, include_history: bool = False) -> Dict[str, Any]:
+        health = self.health.get(name)
+        if health is None:
+            return ModelHealth().summary(include_history)
+        return health.summary(include_history)
+
+
+# Shared monitor over the model registry, filled in place at startup (started/stopped in server.py)
+health_monitor = HealthMonitor(MODEL_CLIENTS)
@@ -0,0 +1,62 @@
+"""
+Generation History Export
+
+Streams generation history (services/generation_store.iter_history) as NDJSON
+(one GenerationRecord document per line) or CSV (one row per model result),
+so an experiment with hundreds of thousands of runs is exported with the
+memory of a single cursor batch.
+"""
+
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict
+
+from services.generation_store import iter_history
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+
+EXPORT_MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+CSV_COLUMNS = [
+    'record_id', 'created_at', 'experiment_id', 'prompt', 'model_name', 'smiles',
+    'confidence', 'is_valid', 'status', 'model_version', 'execution_time', 'num_candidates',
+]
+
+
+def _json_default(value: Any) -> str:
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def csv_rows(doc: Dict):
+    """CSV rows of one history document, one per model result"""
+    for result in doc.get('results') or []:
+        yield [
+            doc['id'], _json_default(doc['created_at']), doc.get('experiment_id') or '', doc.get('prompt', ''),
+            result.get('model_name', ''), result.get('smiles', ''), result.get('confidence', ''),
+            result.get('is_valid', True), result.get('status', 'ok'), result.get('model_version') or '',
+            result.get('execution_time', ''), len(result.get('candidates') or []),
+        ]
+
+
+async def export_history(db, query: Dict, fmt: str) -> AsyncIterator[str]:
+    """History documents matching `query`, newest first, as NDJSON lines or CSV text chunks"""
+    if fmt == 'ndjson':
+        async for doc in iter_history(db, query):
+            yield json.dumps(doc, default=_json_default) + "\n"
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    async for doc in iter_history(db, query):
+        writer.writerows(csv_rows(doc))
+        if buffer.tell() >= 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
@@ -0,0 +1,95 @@
+"""
+Micro-Batching for Model Calls
+
+Concurrent generation calls for the same model are held for a short linger
+window and sent to the model server together through
+ModelClient.generate_batch(). A batch is flushed when it reaches the
+configured size or when the linger time expires, whichever comes first.
+The model client is looked up for every batch, so batchers keep following the
+registry when start_model_clients() replaces the clients.
+
+Configuration (environment):
+- MICRO_BATCH_MAX_SIZE (prompts per upstream request, default 16)
+- MICRO_BATCH_LINGER_MS (max wait for a batch to fill, default 20)
+"""
+
+import asyncio
+import os
+import logging
+from typing import Dict, List, Set, Tuple
+
+from services.model_clients import ModelResult, get_model_client
+
+logger = logging.getLogger(__name__)
+
+MICRO_BATCH_MAX_SIZE = int(os.environ.get('MICRO_BATCH_MAX_SIZE', '16'))
+MICRO_BATCH_LINGER_MS = float(os.environ.get('MICRO_BATCH_LINGER_MS', '20'))
+
+
+class MicroBatcher:
+    """Collects generate() calls for one model and flushes them as batches"""
+
+    def __init__(self, model_name: str, max_batch_size: int = MICRO_BATCH_MAX_SIZE,
+                 linger_ms: float = MICRO_BATCH_LINGER_MS):
+        self.model_name = model_name
+        self.max_batch_size = max(max_batch_size, 1)
+        self.linger = max(linger_ms, 0) / 1000
+        # Pending prompts grouped by candidate count (one batch shares its options)
+        self._pending: Dict[int, List[Tuple[str, asyncio.Future]]] = {}
+        self._timers: Dict[int, asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()  # Batches in flight (strong references)
+
+    async def submit(self, text: str, num_candidates: int = 1) -> ModelResult:
+        """Queue a prompt and wait for its result from the next flushed batch"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.setdefault(num_candidates, [])
+        batch.append((text, future))
+
+        if len(batch) >= self.max_batch_size:
+            self._flush(num_candidates)
+        elif num_candidates not in self._timers:
+            self._timers[num_candidates] = loop.call_later(self.linger, self._flush, num_candidates)
+
+        return await future
+
+    def _flush(self, num_candidates: int) -> None:
+        timer = self._timers.pop(num_candidates, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(num_candidates, [])
+        if batch:
+            task = asyncio.create_task(self._run_batch(batch, num_candidates))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]], num_candidates: int) -> None:
+        texts = [text for text, _ in batch]
+        try:
+            client = await get_model_client(self.model_name)
+            results = await client.generate_batch(texts, num_candidates=num_candidates)
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            logger.error(f"Micro-batch for {self.model_name} failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+_batchers: Dict[str, MicroBatcher] = {}
+
+
+async def get_micro_batcher(model_name: str) -> MicroBatcher:
+    """Get or create the shared micro-batcher for a (normalized) model name"""
+    if model_name not in _batchers:
+        await get_model_client(model_name)  # ValueError for an unknown model
+        _batchers.setdefault(model_name, MicroBatcher(model_name))
+    return _batchers[model_name]
@@ -1,27 +1,58 @@
 """
 Model Client Services
 
-This module provides client implementations for external Text-to-Molecule models.
-Supports: Your Model (custom), MolT5, ChemBERTa
-
-When your models are deployed, update the environment variables:
+This module provides the HTTP client for external Text-to-Molecule models.
+Models, their replica URLs and default options are declared in the model
+registry (services/model_registry.py); the defaults are Your Model (custom),
+MolT5 and ChemBERTa, whose URLs can still be set with:
 - YOUR_MODEL_API_URL
 - MOLT5_API_URL  
 - CHEMBERTA_API_URL
+
+Replicas of a model can be listed comma-separated in YOUR_MODEL_API_URLS,
+MOLT5_API_URLS or CHEMBERTA_API_URLS (or `urls` in the registry). Each call
+goes to the replica with the fewest requests in flight, or the better of two
+random replicas ("p2c"); replicas failing their health probe are skipped.
+
+Each client keeps one long-lived aiohttp session (and connection pool) for its
+replicas, and a circuit breaker (services/circuit_breaker.py) that makes calls
+fall back to mock immediately while the model server is failing. The registry
+is resolved and sessions are opened by start_model_clients() on app startup and
+closed by close_model_clients() on shutdown. Pool tuning:
+- MODEL_CLIENT_POOL_LIMIT (total connections per client, default 100)
+- MODEL_CLIENT_POOL_LIMIT_PER_HOST (default 20)
+- MODEL_CLIENT_KEEPALIVE_TIMEOUT (seconds, default 30)
+- MODEL_CLIENT_DNS_CACHE_TTL (seconds, default 300)
 """
 
 import asyncio
 import aiohttp
 import os
 import random
+import time
 import logging
+from collections import deque
 from typing import Optional, Dict, Any, List
-from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from rdkit import Chem
+from dataclasses import dataclass, field
+from services import chem_tasks
+from services.chem_executor import ChemTaskError, chem_executor
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from services.model_registry import ModelSpec, load_model_specs
+from services.mol_cache import canonical_smiles
 
 logger = logging.getLogger(__name__)
 
+# Connection pool settings shared by every model client session
+POOL_LIMIT = int(os.environ.get('MODEL_CLIENT_POOL_LIMIT', '100'))
+POOL_LIMIT_PER_HOST = int(os.environ.get('MODEL_CLIENT_POOL_LIMIT_PER_HOST', '20'))
+KEEPALIVE_TIMEOUT = float(os.environ.get('MODEL_CLIENT_KEEPALIVE_TIMEOUT', '30'))
+DNS_CACHE_TTL = int(os.environ.get('MODEL_CLIENT_DNS_CACHE_TTL', '300'))
+HEALTH_CHECK_TIMEOUT = 5
+# Successful call latencies kept per client for percentile estimates
+LATENCY_WINDOW = int(os.environ.get('MODEL_CLIENT_LATENCY_WINDOW', '200'))
+LATENCY_MIN_SAMPLES = 20
+
+
 @dataclass
 class ModelResult:
     """Standard result from any model"""
@@ -32,279 +63,433 @@ class ModelResult:
     execution_time_ms: float
     is_valid: bool = True
     error: Optional[str] = None
+    candidates: List[Dict[str, Any]] = field(default_factory=list)
+    is_mock: bool = False
+    hedged: bool = False  # A duplicate request was sent to a second replica
 
 
-class BaseModelClient(ABC):
-    """Abstract base class for model clients"""
+async def canonicalize(smiles_list: List[str]) -> List[Optional[str]]:
+    """
+    RDKit canonical forms of `smiles_list` (None where invalid), parsed in the
+    chem process pool. Parses in-process only if the pool rejects the task
+    (e.g. while shutting down).
+    """
+    if not smiles_list:
+        return []
+    try:
+        return await chem_executor.run(chem_tasks.canonicalize, smiles_list)
+    except ChemTaskError as e:
+        logger.warning(f"Canonicalization in the chem pool failed ({e}), parsing in-process")
+        return [canonical_smiles(smiles) for smiles in smiles_list]
+
+
+def rank_candidates(smiles_list: List[str], canonical_list: List[Optional[str]],
+                    confidences: List[float], limit: int) -> List[Dict[str, Any]]:
+    """
+    De-duplicate candidate SMILES by RDKit canonical form (`canonical_list`, from
+    canonicalize()) and rank them by confidence (RDKit-valid candidates first).
+    Keeps the highest-confidence spelling of each molecule; returns at most `limit`.
+    """
+    best: Dict[str, Dict[str, Any]] = {}
+    for i, smiles in enumerate(smiles_list):
+        if not smiles:
+            continue
+        confidence = float(confidences[i]) if i < len(confidences) else 0.0
+        canonical = canonical_list[i]
+        mol_valid = canonical is not None
+        key = canonical or smiles
+        if key not in best or confidence > best[key]['confidence']:
+            best[key] = {
+                'smiles': smiles,
+                'canonical_smiles': canonical,
+                'confidence': confidence,
+                'is_valid': mol_valid,
+            }
+    ranked = sorted(best.values(), key=lambda c: (c['is_valid'], c['confidence']), reverse=True)
+    return ranked[:max(limit, 1)]
+
+
+class Replica:
+    """One model server replica and the requests currently in flight to it"""
     
-    def __init__(self, api_url: str, model_name: str, timeout: int = 30):
-        self.api_url = api_url
-        self.model_name = model_name
-        self.timeout = timeout
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.healthy: Optional[bool] = None  # Latest health probe (None before the first)
+        self.requests = 0
+        self.failures = 0
     
-    @abstractmethod
-    async def generate(self, text: str, options: Optional[Dict] = None) -> ModelResult:
-        """Generate molecule from text description"""
-        pass
+    @property
+    def health_url(self) -> str:
+        return self.url.replace('/api/text2mol', '/health')
     
-    async def health_check(self) -> bool:
-        """Check if model service is available"""
-        try:
-            async with aiohttp.ClientSession() as session:
-                health_url = self.api_url.replace('/api/text2mol', '/health')
-                async with session.get(health_url, timeout=5) as response:
-                    return response.status == 200
-        except:
-            return False
-    
-    def validate_smiles(self, smiles: str) -> bool:
-        """Validate SMILES using RDKit"""
-        try:
-            mol = Chem.MolFromSmiles(smiles)
-            return mol is not None
-        except:
-            return False
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'outstanding': self.outstanding,
+            'requests': self.requests,
+            'failures': self.failures,
+        }
 
 
-class YourModelClient(BaseModelClient):
-    """Client for Your Custom Model"""
+class ModelClient:
+    """HTTP client for one registered model, load-balanced across its replicas"""
     
-    def __init__(self):
-        api_url = os.environ.get('YOUR_MODEL_API_URL', 'http://localhost:5001/api/text2mol')
-        super().__init__(api_url, 'your_model')
+    def __init__(self, spec: ModelSpec):
+        self.spec = spec
+        self.model_name = spec.name
+        self.timeout = spec.timeout
+        self.count_option = spec.count_option
+        self.default_options = spec.default_options
+        self.default_version = spec.default_version
+        self.replicas = [Replica(url) for url in spec.urls]
+        self.api_url = spec.urls[0]
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._batch_supported: Optional[bool] = None  # Unknown until first batch call
+        self.reported_version: Optional[str] = None  # Last model_version the server reported
+        self.breaker = CircuitBreaker(spec.name)
+        self._latencies: deque = deque(maxlen=LATENCY_WINDOW)
     
-    async def generate(self, text: str, options: Optional[Dict] = None) -> ModelResult:
-        """Generate molecule using Your Model"""
-        try:
-            async with aiohttp.ClientSession() as session:
-                payload = {
-                    'text': text,
-                    'options': options or {'num_samples': 1, 'temperature': 0.7}
-                }
-                
-                async with session.post(
-                    self.api_url, 
-                    json=payload, 
-                    timeout=self.timeout
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if data.get('success'):
-                            result_data = data['data']
-                            smiles = result_data['smiles'][0] if result_data['smiles'] else 'C'
-                            return ModelResult(
-                                smiles=smiles,
-                                confidence=result_data.get('confidence', [0.9])[0],
-                                model_name=self.model_name,
-                                model_version=result_data.get('model_version', '1.0.0'),
-                                execution_time_ms=result_data.get('execution_time_ms', 0),
-                                is_valid=self.validate_smiles(smiles)
-                            )
-                    
-                    # Fallback to mock if API fails
-                    return await self._mock_generate(text)
-                    
-        except Exception as e:
-            logger.warning(f"Your Model API error: {e}, using mock")
-            return await self._mock_generate(text)
+    @property
+    def replica_urls(self) -> List[str]:
+        return [replica.url for replica in self.replicas]
     
-    async def _mock_generate(self, text: str) -> ModelResult:
-        """Mock generation for testing when model is not available"""
-        await asyncio.sleep(random.uniform(0.3, 1.0))
-        
-        # Simple keyword-based mock responses
-        text_lower = text.lower()
-        mock_data = {
-            'aspirin': 'CC(=O)OC1=CC=CC=C1C(=O)O',
-            'ethanol': 'CCO',
-            'caffeine': 'CN1C=NC2=C1C(=O)N(C(=O)N2C)C',
-            'benzene': 'c1ccccc1',
-            'aromatic': 'c1ccccc1CO',
-            'alcohol': 'CCO',
-            'hydroxyl': 'CC(O)C',
-            'ring': 'C1CCCCC1',
-            'anti-inflammatory': 'CC(C)Cc1ccc(C(C)C(=O)O)cc1',
-            'painkiller': 'CC(=O)Nc1ccc(O)cc1',
-        }
-        
-        smiles = 'C'  # Default: methane
-        for key, val in mock_data.items():
-            if key in text_lower:
-                smiles = val
-                break
-        
-        return ModelResult(
-            smiles=smiles,
-            confidence=random.uniform(0.85, 0.98),
-            model_name=self.model_name,
-            model_version='1.0.0-mock',
-            execution_time_ms=random.uniform(100, 300),
-            is_valid=True
+    async def start(self) -> None:
+        """Open the pooled HTTP session for this model's replicas"""
+        if self._session is not None and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=POOL_LIMIT,
+            limit_per_host=POOL_LIMIT_PER_HOST,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+            use_dns_cache=True,
+            ttl_dns_cache=DNS_CACHE_TTL,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
         )
-
-
-class MolT5Client(BaseModelClient):
-    """Client for MolT5 Model"""
     
-    def __init__(self):
-        api_url = os.environ.get('MOLT5_API_URL', 'http://localhost:5002/api/text2mol')
-        super().__init__(api_url, 'molt5')
+    async def close(self) -> None:
+        """Close the pooled HTTP session and release its connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
     
-    async def generate(self, text: str, options: Optional[Dict] = None) -> ModelResult:
-        """Generate molecule using MolT5"""
-        try:
-            async with aiohttp.ClientSession() as session:
-                payload = {
-                    'text': text,
-                    'options': options or {'num_beams': 5, 'num_return_sequences': 1}
-                }
-                
-                async with session.post(
-                    self.api_url,
-                    json=payload,
-                    timeout=self.timeout
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if data.get('success'):
-                            result_data = data['data']
-                            smiles = result_data['smiles'][0] if result_data['smiles'] else 'C'
-                            return ModelResult(
-                                smiles=smiles,
-                                confidence=result_data.get('confidence', [0.9])[0],
-                                model_name=self.model_name,
-                                model_version=result_data.get('model_version', 'large'),
-                                execution_time_ms=result_data.get('execution_time_ms', 0),
-                                is_valid=self.validate_smiles(smiles)
-                            )
-                    
-                    return await self._mock_generate(text)
-                    
-        except Exception as e:
-            logger.warning(f"MolT5 API error: {e}, using mock")
-            return await self._mock_generate(text)
+    async def get_session(self) -> aiohttp.ClientSession:
+        """Return the shared session, opening it lazily outside the app lifecycle"""
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
     
-    async def _mock_generate(self, text: str) -> ModelResult:
-        """Mock generation for MolT5"""
-        await asyncio.sleep(random.uniform(0.4, 1.2))
-        
-        text_lower = text.lower()
-        mock_data = {
-            'aspirin': 'CC(=O)Oc1ccccc1C(=O)O',  # Slightly different representation
-            'ethanol': 'C(C)O',
-            'caffeine': 'Cn1cnc2c1c(=O)n(c(=O)n2C)C',
-            'benzene': 'c1ccccc1',
-            'purine': 'c1ncc2[nH]cnc2n1',
-            'antiviral': 'Nc1ncnc2c1ncn2C3OC(CO)C(O)C3O',
-            'aromatic': 'c1ccc2ccccc2c1',
+    def pick_replica(self, exclude: Optional[str] = None) -> Replica:
+        """
+        Choose the replica for the next call: fewest requests in flight
+        ("least_outstanding"), or the less loaded of two random replicas ("p2c").
+        Replicas whose last health probe failed are only used when no other is left.
+        """
+        candidates = [r for r in self.replicas if r.url != exclude] or self.replicas
+        candidates = [r for r in candidates if r.healthy is not False] or candidates
+        if self.spec.load_balancing == 'p2c' and len(candidates) > 2:
+            candidates = random.sample(candidates, 2)
+        least = min(r.outstanding for r in candidates)
+        return random.choice([r for r in candidates if r.outstanding == least])
+    
+    def _replica_for(self, api_url: Optional[str]) -> Replica:
+        if api_url is not None:
+            for replica in self.replicas:
+                if replica.url == api_url:
+                    return replica
+            return Replica(api_url)  # Ad-hoc URL outside the registry
+        return self.pick_replica()
+    
+    def latency_quantile(self, q: float) -> Optional[float]:
+        """Observed latency quantile (seconds) of successful calls; None until enough samples"""
+        if len(self._latencies) < LATENCY_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+    
+    def build_options(self, options: Optional[Dict], num_candidates: int) -> Dict:
+        """Merge caller options over the model defaults and request `num_candidates` sequences"""
+        merged = {**self.default_options, **(options or {})}
+        count = max(num_candidates, 1)
+        merged[self.count_option] = count
+        for option in self.spec.count_floor_options:
+            merged[option] = max(merged.get(option, 1), count)
+        return merged
+    
+    async def request_generation(self, text: str, options: Optional[Dict],
+                                 num_candidates: int, api_url: Optional[str] = None) -> Optional[Dict]:
+        """
+        POST one prompt to /api/text2mol on a load-balanced replica (or `api_url`)
+        through the circuit breaker.
+        Returns the response `data` payload, or None when the call failed.
+        Raises CircuitOpenError without sending anything while the breaker is open.
+        """
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(self.model_name)
+        payload = {
+            'text': text,
+            'options': self.build_options(options, num_candidates)
         }
-        
-        smiles = 'CC'  # Default: ethane
-        for key, val in mock_data.items():
-            if key in text_lower:
-                smiles = val
-                break
-        
-        return ModelResult(
-            smiles=smiles,
-            confidence=random.uniform(0.82, 0.96),
-            model_name=self.model_name,
-            model_version='large-mock',
-            execution_time_ms=random.uniform(150, 400),
-            is_valid=True
-        )
-
-
-class ChemBERTaClient(BaseModelClient):
-    """Client for ChemBERTa Model"""
+        replica = self._replica_for(api_url)
+        replica.outstanding += 1
+        replica.requests += 1
+        start = time.monotonic()
+        try:
+            session = await self.get_session()
+            async with session.post(replica.url, json=payload) as response:
+                data = await response.json() if response.status == 200 else None
+                elapsed = time.monotonic() - start
+                if data and data.get('success'):
+                    self.breaker.record_success(elapsed)
+                    self._latencies.append(elapsed)
+                    return data['data']
+                if response.status >= 500 or data is not None:
+                    replica.failures += 1
+                    self.breaker.record_failure(elapsed)
+                else:
+                    # 4xx: the server answered; the request itself was rejected
+                    self.breaker.record_success(elapsed)
+                return None
+        except asyncio.CancelledError:
+            self.breaker.record_cancelled()
+            raise
+        except Exception:
+            replica.failures += 1
+            self.breaker.record_failure(time.monotonic() - start)
+            raise
+        finally:
+            replica.outstanding -= 1
+    
+    def is_deterministic(self, options: Dict) -> bool:
+        """Whether these options always give the same output for the same prompt"""
+        for key, expected in self.spec.deterministic_when.items():
+            value = options.get(key)
+            if isinstance(expected, bool):
+                value = bool(value)
+            if value != expected:
+                return False
+        return True
+    
+    def note_version(self, version: Optional[str]) -> None:
+        """Record the model_version reported by the model server"""
+        if version:
+            self.reported_version = version
+    
+    def current_version(self) -> Optional[str]:
+        """
+        Last model_version the server reported. Never probes on the request path;
+        the health monitor's periodic /health probes keep it current.
+        """
+        return self.reported_version
     
-    def __init__(self):
-        api_url = os.environ.get('CHEMBERTA_API_URL', 'http://localhost:5003/api/text2mol')
-        super().__init__(api_url, 'chemberta')
+    async def parse_results(self, items: List[Dict], num_candidates: int) -> List[ModelResult]:
+        """
+        Build ModelResults from successful API response payloads, canonicalizing
+        the candidates of all of them in one chem pool task
+        """
+        smiles_lists = [item.get('smiles') or [] for item in items]
+        flat = await canonicalize([smiles for smiles_list in smiles_lists for smiles in smiles_list])
+        results = []
+        offset = 0
+        for result_data, smiles_list in zip(items, smiles_lists):
+            self.note_version(result_data.get('model_version'))
+            candidates = rank_candidates(
+                smiles_list,
+                flat[offset:offset + len(smiles_list)],
+                result_data.get('confidence') or [],
+                num_candidates
+            )
+            offset += len(smiles_list)
+            if not candidates:
+                candidates = [{'smiles': 'C', 'canonical_smiles': 'C', 'confidence': 0.9, 'is_valid': True}]
+            top = candidates[0]
+            results.append(ModelResult(
+                smiles=top['smiles'],
+                confidence=top['confidence'],
+                model_name=self.model_name,
+                model_version=result_data.get('model_version', self.default_version),
+                execution_time_ms=result_data.get('execution_time_ms', 0),
+                is_valid=top['is_valid'],
+                candidates=candidates
+            ))
+        return results
     
-    async def generate(self, text: str, options: Optional[Dict] = None) -> ModelResult:
-        """Generate molecule using ChemBERTa"""
+    async def generate(self, text: str, options: Optional[Dict] = None,
+                       num_candidates: int = 1, api_url: Optional[str] = None) -> ModelResult:
+        """Generate top-N candidate molecules from text (optionally on a given replica)"""
         try:
-            async with aiohttp.ClientSession() as session:
-                payload = {
-                    'text': text,
-                    'options': options or {'top_k': 50, 'top_p': 0.9, 'temperature': 0.8}
-                }
-                
-                async with session.post(
-                    self.api_url,
-                    json=payload,
-                    timeout=self.timeout
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if data.get('success'):
-                            result_data = data['data']
-                            smiles = result_data['smiles'][0] if result_data['smiles'] else 'C'
-                            return ModelResult(
-                                smiles=smiles,
-                                confidence=result_data.get('confidence', [0.9])[0],
-                                model_name=self.model_name,
-                                model_version=result_data.get('model_version', '77M-MTR'),
-                                execution_time_ms=result_data.get('execution_time_ms', 0),
-                                is_valid=self.validate_smiles(smiles)
-                            )
-                    
-                    return await self._mock_generate(text)
-                    
+            result_data = await self.request_generation(text, options, num_candidates, api_url)
+            if result_data is not None:
+                return (await self.parse_results([result_data], num_candidates))[0]
+            
+            # Fallback to mock if API fails
+            return await self._mock_generate(text, num_candidates)
+            
+        except CircuitOpenError:
+            # Fail fast: no simulated mock latency while the breaker is open
+            return await self._mock_generate(text, num_candidates, delay=False)
         except Exception as e:
-            logger.warning(f"ChemBERTa API error: {e}, using mock")
-            return await self._mock_generate(text)
+            logger.warning(f"{self.spec.display_name} API error: {e}, using mock")
+            return await self._mock_generate(text, num_candidates)
     
-    async def _mock_generate(self, text: str) -> ModelResult:
-        """Mock generation for ChemBERTa"""
-        await asyncio.sleep(random.uniform(0.3, 1.0))
+    async def _mock_generate(self, text: str, num_candidates: int = 1, delay: bool = True) -> ModelResult:
+        """
+        Keyword-based mock generation for testing when the model is not available.
+        With `delay`, sleeps for the mock's simulated model latency first.
+        """
+        mock = self.spec.mock
+        if delay:
+            await asyncio.sleep(random.uniform(*mock.delay_seconds))
         
+        # Every matching keyword yields a candidate
         text_lower = text.lower()
-        mock_data = {
-            'aspirin': 'CC(=O)OC1=CC=CC=C1C(O)=O',
-            'ibuprofen': 'CC(C)Cc1ccc(C(C)C(=O)O)cc1',
-            'anti-inflammatory': 'CC(C)CC1=CC=C(C=C1)C(C)C(=O)O',
-            'paracetamol': 'CC(=O)NC1=CC=C(O)C=C1',
-            'pain': 'CC(=O)Nc1ccc(O)cc1',
-            'aromatic': 'c1ccc(cc1)C(=O)O',
-        }
-        
-        smiles = 'CCC'  # Default: propane
-        for key, val in mock_data.items():
-            if key in text_lower:
-                smiles = val
-                break
+        matches = [val for key, val in mock.keywords.items() if key in text_lower] or [mock.default]
+        confidences = sorted((random.uniform(*mock.confidence) for _ in matches), reverse=True)
+        candidates = rank_candidates(matches, await canonicalize(matches), confidences, num_candidates)
         
         return ModelResult(
-            smiles=smiles,
-            confidence=random.uniform(0.80, 0.94),
+            smiles=candidates[0]['smiles'],
+            confidence=candidates[0]['confidence'],
             model_name=self.model_name,
-            model_version='77M-MTR-mock',
-            execution_time_ms=random.uniform(120, 350),
-            is_valid=True
+            model_version=mock.version,
+            execution_time_ms=random.uniform(*mock.execution_time_ms),
+            is_valid=True,
+            candidates=candidates,
+            is_mock=True
         )
+    
+    async def generate_batch(self, texts: List[str], options: Optional[Dict] = None,
+                             num_candidates: int = 1) -> List[ModelResult]:
+        """
+        Generate molecules for several prompts in one round trip via the model's
+        batch endpoint (`<replica url>/batch`). Falls back to concurrent single
+        calls when the model server does not expose one.
+        """
+        if self._batch_supported is not False and self.breaker.allow_request():
+            replica = self.pick_replica()
+            replica.outstanding += 1
+            replica.requests += 1
+            start = time.monotonic()
+            try:
+                session = await self.get_session()
+                payload = {
+                    'texts': texts,
+                    'options': self.build_options(options, num_candidates)
+                }
+                async with session.post(f"{replica.url}/batch", json=payload) as response:
+                    data = await response.json() if response.status == 200 else None
+                    elapsed = time.monotonic() - start
+                    items = (data or {}).get('data') or []
+                    if data and data.get('success') and len(items) == len(texts):
+                        self._batch_supported = True
+                        self.breaker.record_success(elapsed)
+                        return await self.parse_results(items, num_candidates)
+                    if response.status >= 500 or data is not None:
+                        replica.failures += 1
+                        self.breaker.record_failure(elapsed)
+                    else:
+                        # 4xx: the server answered; 404/405 means it has no batch endpoint
+                        if response.status in (404, 405):
+                            self._batch_supported = False
+                        self.breaker.record_success(elapsed)
+            except asyncio.CancelledError:
+                self.breaker.record_cancelled()
+                raise
+            except Exception as e:
+                replica.failures += 1
+                self.breaker.record_failure(time.monotonic() - start)
+                logger.warning(f"{self.model_name} batch API error: {e}, using single calls")
+            finally:
+                replica.outstanding -= 1
+        
+        return list(await asyncio.gather(
+            *(self.generate(text, options, num_candidates) for text in texts)
+        ))
+    
+    async def _probe_replica(self, replica: Replica) -> bool:
+        try:
+            session = await self.get_session()
+            async with session.get(
+                replica.health_url,
+                timeout=aiohttp.ClientTimeout(total=HEALTH_CHECK_TIMEOUT)
+            ) as response:
+                if response.status != 200:
+                    replica.healthy = False
+                    return False
+                try:
+                    data = await response.json()
+                    self.note_version(data.get('model_version'))
+                except Exception:
+                    pass
+                replica.healthy = True
+                return True
+        except Exception:
+            replica.healthy = False
+            return False
+    
+    async def health_check(self) -> bool:
+        """Probe every replica; the model is available while any replica is healthy"""
+        results = await asyncio.gather(*(self._probe_replica(r) for r in self.replicas))
+        if not any(results):
+            self.note_version(None)
+        return any(results)
+    
+    def replica_stats(self) -> List[Dict[str, Any]]:
+        return [replica.stats() for replica in self.replicas]
+
+
+# Model registry (process-wide client singletons, one pooled session each).
+# Filled by load_model_clients() at app startup, once backend/.env is loaded.
+MODEL_CLIENTS: Dict[str, ModelClient] = {}
+
+
+def load_model_clients() -> Dict[str, ModelClient]:
+    """Resolve the model registry into MODEL_CLIENTS (in place, so shared references stay valid)"""
+    clients = {spec.name: ModelClient(spec) for spec in load_model_specs()}
+    MODEL_CLIENTS.clear()
+    MODEL_CLIENTS.update(clients)
+    return MODEL_CLIENTS
+
+
+def get_model_clients() -> Dict[str, ModelClient]:
+    """Registered model clients; the registry is resolved on first use outside the app lifecycle"""
+    if not MODEL_CLIENTS:
+        load_model_clients()
+    return MODEL_CLIENTS
+
+
+async def start_model_clients() -> None:
+    """Resolve the model registry and open pooled sessions for all models (app startup)"""
+    stale = list(MODEL_CLIENTS.values())
+    load_model_clients()
+    await asyncio.gather(*(client.close() for client in stale), return_exceptions=True)
+    for client in MODEL_CLIENTS.values():
+        await client.start()
 
 
-# Model registry
-MODEL_CLIENTS = {
-    'your_model': YourModelClient,
-    'molt5': MolT5Client,
-    'chemberta': ChemBERTaClient,
-}
+async def close_model_clients() -> None:
+    """Close pooled sessions for all registered models (app shutdown)"""
+    await asyncio.gather(
+        *(client.close() for client in MODEL_CLIENTS.values()),
+        return_exceptions=True
+    )
 
 
-async def get_model_client(model_name: str) -> BaseModelClient:
-    """Factory function to get model client by name"""
-    if model_name not in MODEL_CLIENTS:
-        raise ValueError(f"Unknown model: {model_name}. Available: {list(MODEL_CLIENTS.keys())}")
-    return MODEL_CLIENTS[model_name]()
+async def get_model_client(model_name: str) -> ModelClient:
+    """Look up the shared model client by name"""
+    clients = get_model_clients()
+    if model_name not in clients:
+        raise ValueError(f"Unknown model: {model_name}. Available: {list(clients.keys())}")
+    return clients[model_name]
 
 
 async def check_all_models_health() -> Dict[str, bool]:
-    """Check health of all registered models"""
-    results = {}
-    for name, client_class in MODEL_CLIENTS.items():
-        client = client_class()
-        results[name] = await client.health_check()
-    return results
+    """Check health of all registered models concurrently"""
+    clients = get_model_clients()
+    names = list(clients.keys())
+    results = await asyncio.gather(*(clients[name].health_check() for name in names))
+    return dict(zip(names, results))
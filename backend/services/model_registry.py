@@ -0,0 +1,214 @@
+"""
+Model Registry
+
+Declarative definition of the text-to-molecule models the backend can call.
+Each entry describes one model: its replica URLs, default generation options,
+how the candidate count is passed, when its output is deterministic (cacheable)
+and the keyword table used for mock responses while it is unreachable.
+
+The registry is read when the model clients are loaded at app startup
+(services/model_clients.load_model_clients, after backend/.env), from, in order:
+1. MODEL_REGISTRY_PATH (path to a JSON file)
+2. MODEL_REGISTRY_JSON (the JSON document itself)
+3. DEFAULT_REGISTRY below (Your Model, MolT5, ChemBERTa)
+
+Document shape:
+    {"models": [{"name": "molt5", "urls": ["http://host:5002/api/text2mol"], ...}]}
+
+Replica URLs: if an entry sets `url_env` (e.g. "MOLT5_API_URL"), the
+comma-separated `<url_env>S` variable, then `<url_env>` itself, override `urls`.
+MODEL_LOAD_BALANCING sets the default replica selection strategy
+("least_outstanding" or "p2c"); entries may override it with `load_balancing`.
+"""
+
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LOAD_BALANCING_STRATEGIES = ('least_outstanding', 'p2c')
+
+
+def default_load_balancing() -> str:
+    """Replica selection strategy for entries that do not set one (MODEL_LOAD_BALANCING)"""
+    return os.environ.get('MODEL_LOAD_BALANCING', 'least_outstanding')
+
+DEFAULT_REGISTRY: Dict[str, Any] = {
+    'models': [
+        {
+            'name': 'your_model',
+            'description': 'Custom Text-to-Molecule model trained on your dataset',
+            'aliases': ['model_a'],
+            'url_env': 'YOUR_MODEL_API_URL',
+            'urls': ['http://localhost:5001/api/text2mol'],
+            'default_options': {'num_samples': 1, 'temperature': 0.7},
+            'default_version': '1.0.0',
+            'mock': {
+                'keywords': {
+                    'aspirin': 'CC(=O)OC1=CC=CC=C1C(=O)O',
+                    'ethanol': 'CCO',
+                    'caffeine': 'CN1C=NC2=C1C(=O)N(C(=O)N2C)C',
+                    'benzene': 'c1ccccc1',
+                    'aromatic': 'c1ccccc1CO',
+                    'alcohol': 'CCO',
+                    'hydroxyl': 'CC(O)C',
+                    'ring': 'C1CCCCC1',
+                    'anti-inflammatory': 'CC(C)Cc1ccc(C(C)C(=O)O)cc1',
+                    'painkiller': 'CC(=O)Nc1ccc(O)cc1',
+                },
+                'default': 'C',
+                'confidence': [0.85, 0.98],
+                'delay_seconds': [0.3, 1.0],
+                'execution_time_ms': [100, 300],
+                'version': '1.0.0-mock',
+            },
+        },
+        {
+            'name': 'molt5',
+            'description': 'MolT5 - Transformer model for molecular language understanding',
+            'aliases': ['model_b'],
+            'url_env': 'MOLT5_API_URL',
+            'urls': ['http://localhost:5002/api/text2mol'],
+            'count_option': 'num_return_sequences',
+            # Beam search cannot return more sequences than it keeps beams
+            'count_floor_options': ['num_beams'],
+            'default_options': {'num_beams': 5, 'num_return_sequences': 1},
+            # Beam search is deterministic unless sampling is switched on
+            'deterministic_when': {'do_sample': False},
+            'default_version': 'large',
+            'mock': {
+                'keywords': {
+                    'aspirin': 'CC(=O)Oc1ccccc1C(=O)O',  # Slightly different representation
+                    'ethanol': 'C(C)O',
+                    'caffeine': 'Cn1cnc2c1c(=O)n(c(=O)n2C)C',
+                    'benzene': 'c1ccccc1',
+                    'purine': 'c1ncc2[nH]cnc2n1',
+                    'antiviral': 'Nc1ncnc2c1ncn2C3OC(CO)C(O)C3O',
+                    'aromatic': 'c1ccc2ccccc2c1',
+                },
+                'default': 'CC',
+                'confidence': [0.82, 0.96],
+                'delay_seconds': [0.4, 1.2],
+                'execution_time_ms': [150, 400],
+                'version': 'large-mock',
+            },
+        },
+        {
+            'name': 'chemberta',
+            'description': 'ChemBERTa - BERT-based model pretrained on SMILES',
+            'aliases': ['model_c'],
+            'url_env': 'CHEMBERTA_API_URL',
+            'urls': ['http://localhost:5003/api/text2mol'],
+            'default_options': {'top_k': 50, 'top_p': 0.9, 'temperature': 0.8},
+            'default_version': '77M-MTR',
+            'mock': {
+                'keywords': {
+                    'aspirin': 'CC(=O)OC1=CC=CC=C1C(O)=O',
+                    'ibuprofen': 'CC(C)Cc1ccc(C(C)C(=O)O)cc1',
+                    'anti-inflammatory': 'CC(C)CC1=CC=C(C=C1)C(C)C(=O)O',
+                    'paracetamol': 'CC(=O)NC1=CC=C(O)C=C1',
+                    'pain': 'CC(=O)Nc1ccc(O)cc1',
+                    'aromatic': 'c1ccc(cc1)C(=O)O',
+                },
+                'default': 'CCC',
+                'confidence': [0.80, 0.94],
+                'delay_seconds': [0.3, 1.0],
+                'execution_time_ms': [120, 350],
+                'version': '77M-MTR-mock',
+            },
+        },
+    ]
+}
+
+
+@dataclass
+class MockSpec:
+    """Keyword table and timing used to fake a model's output while it is down"""
+    keywords: Dict[str, str] = field(default_factory=dict)
+    default: str = 'C'
+    confidence: Tuple[float, float] = (0.8, 0.95)
+    delay_seconds: Tuple[float, float] = (0.3, 1.0)
+    execution_time_ms: Tuple[float, float] = (100, 300)
+    version: Optional[str] = None
+
+
+@dataclass
+class ModelSpec:
+    """One registry entry"""
+    name: str
+    urls: List[str]
+    display_name: Optional[str] = None
+    description: str = 'AI model for molecule generation'
+    aliases: List[str] = field(default_factory=list)
+    timeout: float = 30
+    load_balancing: str = field(default_factory=default_load_balancing)
+    count_option: str = 'num_samples'  # Option key the model API uses for the number of returned SMILES
+    count_floor_options: List[str] = field(default_factory=list)  # Options raised to at least that count
+    default_options: Dict[str, Any] = field(default_factory=dict)
+    deterministic_when: Dict[str, Any] = field(default_factory=lambda: {'temperature': 0})
+    default_version: str = 'unknown'
+    mock: MockSpec = field(default_factory=MockSpec)
+
+    def __post_init__(self):
+        if not self.display_name:
+            self.display_name = self.name.replace('_', ' ').title()
+        if self.load_balancing not in LOAD_BALANCING_STRATEGIES:
+            raise ValueError(
+                f"Model {self.name}: unknown load_balancing '{self.load_balancing}' "
+                f"(expected one of {LOAD_BALANCING_STRATEGIES})"
+            )
+
+    @classmethod
+    def from_dict(cls, entry: Dict[str, Any]) -> 'ModelSpec':
+        entry = dict(entry)
+        name = entry.get('name')
+        if not name:
+            raise ValueError(f"Model registry entry without a name: {entry}")
+        urls = _resolve_urls(entry.pop('url_env', None), entry.pop('urls', None) or [])
+        if not urls:
+            raise ValueError(f"Model {name}: no replica URLs configured")
+        mock = entry.pop('mock', None) or {}
+        mock_spec = MockSpec(**{
+            **mock,
+            **{k: tuple(mock[k]) for k in ('confidence', 'delay_seconds', 'execution_time_ms') if k in mock},
+        })
+        if mock_spec.version is None:
+            mock_spec.version = f"{entry.get('default_version', 'unknown')}-mock"
+        return cls(urls=urls, mock=mock_spec, **entry)
+
+
+def _resolve_urls(url_env: Optional[str], urls: List[str]) -> List[str]:
+    """Replica URLs from `<url_env>S` (comma-separated), else `<url_env>`, else `urls`"""
+    if url_env:
+        listed = [u.strip() for u in os.environ.get(f"{url_env}S", '').split(',') if u.strip()]
+        if listed:
+            return listed
+        if os.environ.get(url_env):
+            return [os.environ[url_env]]
+    return list(urls)
+
+
+def load_model_specs() -> List[ModelSpec]:
+    """Read the registry document from MODEL_REGISTRY_PATH / MODEL_REGISTRY_JSON / defaults"""
+    path = os.environ.get('MODEL_REGISTRY_PATH')
+    raw = os.environ.get('MODEL_REGISTRY_JSON')
+    if path:
+        with open(path) as f:
+            document = json.load(f)
+        logger.info(f"Model registry loaded from {path}")
+    elif raw:
+        document = json.loads(raw)
+        logger.info("Model registry loaded from MODEL_REGISTRY_JSON")
+    else:
+        document = DEFAULT_REGISTRY
+
+    specs = [ModelSpec.from_dict(entry) for entry in document.get('models', [])]
+    if not specs:
+        raise ValueError("Model registry defines no models")
+    names = [spec.name for spec in specs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Model registry has duplicate model names: {names}")
+    return specs
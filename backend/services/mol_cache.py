@@ -0,0 +1,83 @@
+"""
+Parsed Molecule Cache
+
+Process-wide LRU of sanitized RDKit molecules and their canonical SMILES,
+keyed by the input SMILES string, so a molecule that passes through ranking,
+validation, conformer lookup and docking is parsed once. Unparseable SMILES
+are cached too (as None). Each chem pool worker process has its own cache.
+
+Cached Mol objects are shared: callers must not modify them in place (RDKit
+calls such as Chem.AddHs return a new molecule and are safe).
+
+Configuration (environment):
+- MOL_CACHE_SIZE (entries, default 10000)
+"""
+
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from rdkit import Chem
+
+MOL_CACHE_SIZE = int(os.environ.get('MOL_CACHE_SIZE', '10000'))
+
+
+class MolCache:
+    """LRU of SMILES -> (sanitized Mol, canonical SMILES), with hit/miss counters"""
+
+    def __init__(self, max_entries: int = MOL_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lru: "OrderedDict[str, Tuple[Optional[Chem.Mol], Optional[str]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _entry(self, smiles: str) -> Tuple[Optional[Chem.Mol], Optional[str]]:
+        entry = self._lru.get(smiles)
+        if entry is not None:
+            self._lru.move_to_end(smiles)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        mol = Chem.MolFromSmiles(smiles) if smiles else None
+        entry = (mol, Chem.MolToSmiles(mol) if mol is not None else None)
+        self._lru[smiles] = entry
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+            self.evictions += 1
+        return entry
+
+    def get_mol(self, smiles: str) -> Optional[Chem.Mol]:
+        """Sanitized molecule for `smiles` (shared, do not modify); None if invalid"""
+        return self._entry(smiles)[0]
+
+    def canonical(self, smiles: str) -> Optional[str]:
+        """RDKit canonical SMILES for `smiles`; None if invalid"""
+        return self._entry(smiles)[1]
+
+    def clear(self) -> None:
+        self._lru.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self._lru),
+            'max_entries': self.max_entries,
+        }
+
+
+# Shared cache for this process
+mol_cache = MolCache()
+
+
+def get_mol(smiles: str) -> Optional[Chem.Mol]:
+    return mol_cache.get_mol(smiles)
+
+
+def canonical_smiles(smiles: str) -> Optional[str]:
+    return mol_cache.canonical(smiles)
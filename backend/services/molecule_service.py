@@ -2,50 +2,164 @@
 Molecule Generation Service
 
 This service orchestrates molecule generation from multiple AI models.
-Supports: Your Model (custom), MolT5, ChemBERTa
+Supports the models declared in the model registry (services/model_registry.py);
+by default Your Model (custom), MolT5 and ChemBERTa.
 
 When models are not available (API down), mock responses are used for testing.
 """
 
 import asyncio
 import logging
-from typing import List, Dict, Optional
+import os
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 from models import SingleModelResult
 from services.model_clients import (
     get_model_client, 
-    check_all_models_health,
-    MODEL_CLIENTS
+    get_model_clients,
+    ModelClient,
+    ModelResult
 )
+from services.micro_batcher import get_micro_batcher
+from services.single_flight import SingleFlight, make_flight_key
+from services.generation_cache import generation_cache
+from services.health_monitor import health_monitor
+from services import chem_tasks
+from services.chem_executor import chem_executor, ChemTaskError
 
 logger = logging.getLogger(__name__)
 
-# Model name mapping (frontend names -> backend names)
-MODEL_NAME_MAP = {
-    'your_model': 'your_model',
-    'molt5': 'molt5', 
-    'chemberta': 'chemberta',
-    # Legacy mappings for backward compatibility
-    'model_a': 'your_model',
-    'model_b': 'molt5',
-    'model_c': 'chemberta',
-}
+# Coalesces identical in-flight model calls (same prompt, model and options)
+generation_flight = SingleFlight()
+
+# Hedge delay when a model has too few latency samples for a p95, and its floor
+HEDGE_DEFAULT_DELAY_MS = float(os.environ.get('HEDGE_DEFAULT_DELAY_MS', '1000'))
+HEDGE_MIN_DELAY_MS = float(os.environ.get('HEDGE_MIN_DELAY_MS', '50'))
 
 
 def normalize_model_name(name: str) -> str:
-    """Normalize model name to backend format"""
-    return MODEL_NAME_MAP.get(name.lower(), name.lower())
+    """Normalize model name (frontend names and registry aliases) to backend format"""
+    name = name.lower()
+    for model_name, client in get_model_clients().items():
+        if name == model_name or name in (alias.lower() for alias in client.spec.aliases):
+            return model_name
+    return name
+
+
+def _fallback_result(model_name: str, status: str, execution_time: float = 0.0) -> SingleModelResult:
+    """Placeholder result for a model call that errored or ran out of latency budget"""
+    return SingleModelResult(
+        model_name=model_name,
+        smiles="C",  # Methane as fallback
+        confidence=0.0,
+        execution_time=execution_time,
+        model_version=status,
+        is_valid=False,
+        status=status
+    )
+
+
+async def _hedged_generate(client: ModelClient, prompt: str, num_candidates: int) -> ModelResult:
+    """
+    Send the request to the primary replica; if it is still running after the
+    model's observed p95 latency, send a duplicate to another replica and use
+    whichever real (non-mock) result arrives first. The loser is cancelled.
+    """
+    primary_url = client.pick_replica().url
+    p95 = client.latency_quantile(0.95)
+    delay = max(p95 if p95 is not None else HEDGE_DEFAULT_DELAY_MS / 1000, HEDGE_MIN_DELAY_MS / 1000)
+    
+    primary = asyncio.create_task(
+        client.generate(prompt, num_candidates=num_candidates, api_url=primary_url)
+    )
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done:
+        return primary.result()
+    
+    hedge = asyncio.create_task(
+        client.generate(prompt, num_candidates=num_candidates, api_url=client.pick_replica(exclude=primary_url).url)
+    )
+    pending = {primary, hedge}
+    fallback = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                fallback = task.result()
+                if not fallback.is_mock:
+                    break
+            if fallback is not None and not fallback.is_mock:
+                break
+        fallback.hedged = True
+        return fallback
+    finally:
+        primary.cancel()
+        hedge.cancel()
 
 
-async def call_external_model(model_name: str, prompt: str) -> SingleModelResult:
+async def _request_model(client: ModelClient, prompt: str, options: Dict,
+                         num_candidates: int, batched: bool, hedge: bool = False) -> ModelResult:
+    """
+    Send one generation request upstream (directly, hedged across replicas, or
+    via the model's micro-batcher) and store deterministic results in the
+    generation cache.
     """
-    Call a single external model to generate molecule from text.
+    if batched:
+        batcher = await get_micro_batcher(client.model_name)
+        result = await batcher.submit(prompt, num_candidates)
+    elif hedge and len(client.replica_urls) > 1:
+        result = await _hedged_generate(client, prompt, num_candidates)
+    else:
+        result = await client.generate(prompt, num_candidates=num_candidates)
+    if client.is_deterministic(options):
+        # Keyed by the version lookups use (see ModelClient.current_version)
+        await generation_cache.put(prompt, client.model_name, options, result, client.reported_version)
+    return result
+
+
+async def call_external_model(model_name: str, prompt: str, num_candidates: int = 1,
+                              batched: bool = False, use_cache: bool = True,
+                              deadline: Optional[float] = None, hedge: bool = False) -> SingleModelResult:
+    """
+    Call a single external model to generate molecule(s) from text.
+    Returns up to `num_candidates` de-duplicated candidates from one round trip.
+    With `batched`, the call joins the model's micro-batch instead of its own request.
+    Deterministic settings are served from the generation cache unless `use_cache`
+    is False; concurrent identical misses share one upstream request (single-flight).
+    `deadline` (event loop time) bounds the call: past it, the result is reported
+    as timed_out (or cancelled if it never started). With `hedge`, a duplicate is
+    sent to a second replica once the primary exceeds the model's p95 latency.
     Falls back to mock if model is unavailable.
     """
     normalized_name = normalize_model_name(model_name)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
     
     try:
         client = await get_model_client(normalized_name)
-        result = await client.generate(prompt)
+        options = client.build_options(None, num_candidates)
+        
+        result = None
+        if use_cache and client.is_deterministic(options):
+            version = client.current_version()
+            result = await generation_cache.get(prompt, normalized_name, options, version)
+        cached = result is not None
+        
+        if result is None:
+            key = make_flight_key(prompt, normalized_name, options, hedge=hedge, batched=batched)
+            call = generation_flight.do(
+                key, lambda: _request_model(client, prompt, options, num_candidates, batched, hedge)
+            )
+            if deadline is None:
+                result = await call
+            else:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    call.close()  # Budget spent before dispatch; never started
+                    return _fallback_result(model_name, 'cancelled')
+                try:
+                    result = await asyncio.wait_for(call, remaining)
+                except asyncio.TimeoutError:
+                    return _fallback_result(model_name, 'timed_out', loop.time() - started)
         
         return SingleModelResult(
             model_name=model_name,  # Keep original name for frontend
@@ -53,108 +167,132 @@ async def call_external_model(model_name: str, prompt: str) -> SingleModelResult
             confidence=result.confidence,
             execution_time=result.execution_time_ms / 1000,  # Convert to seconds
             model_version=result.model_version,
-            is_valid=result.is_valid
+            is_valid=result.is_valid,
+            candidates=result.candidates,
+            cached=cached,
+            hedged=result.hedged and not cached,
+            status='fallback' if result.is_mock else 'ok'
         )
     except Exception as e:
         logger.error(f"Error calling model {model_name}: {e}")
-        # Return a fallback result
-        return SingleModelResult(
-            model_name=model_name,
-            smiles="C",  # Methane as fallback
-            confidence=0.0,
-            execution_time=0.0,
-            model_version="error",
-            is_valid=False
-        )
+        return _fallback_result(model_name, 'error')
+
+
+async def stream_molecules(prompt: str, models: List[str], num_candidates: int = 1,
+                           batched: bool = False, use_cache: bool = True,
+                           latency_budget_ms: Optional[int] = None, hedge: bool = False
+                           ) -> AsyncIterator[Tuple[int, SingleModelResult]]:
+    """
+    Run all models in parallel and yield (model index, result) as each finishes,
+    fastest model first. Arguments are as for generate_molecules.
+    """
+    if not models:
+        models = ['your_model']  # Default model
+    
+    deadline = None
+    if latency_budget_ms is not None:
+        deadline = asyncio.get_running_loop().time() + latency_budget_ms / 1000
+    
+    async def run(index: int, model: str) -> Tuple[int, SingleModelResult]:
+        try:
+            return index, await call_external_model(
+                model, prompt, num_candidates, batched, use_cache, deadline, hedge
+            )
+        except Exception as e:
+            logger.error(f"Model {model} failed: {e}")
+            return index, _fallback_result(model, 'error')
+    
+    tasks = [asyncio.create_task(run(i, model)) for i, model in enumerate(models)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Consumer stopped early (e.g. client disconnected): drop remaining calls
+        for task in tasks:
+            task.cancel()
 
 
-async def generate_molecules(prompt: str, models: List[str]) -> List[SingleModelResult]:
+async def generate_molecules(prompt: str, models: List[str], num_candidates: int = 1,
+                             batched: bool = False, use_cache: bool = True,
+                             latency_budget_ms: Optional[int] = None,
+                             hedge: bool = False) -> List[SingleModelResult]:
     """
     Generate molecules from multiple models in parallel.
     
     Args:
         prompt: Natural language description of the molecule
         models: List of model names to use
+        num_candidates: Number of ranked candidates to request from each model
+        batched: Route model calls through the per-model micro-batchers, so that
+            concurrent calls (e.g. from the batch endpoint) share upstream requests
+        use_cache: Read deterministic results from the generation cache
+        latency_budget_ms: End-to-end deadline for all model calls; models still
+            running when it expires are reported with status 'timed_out'
+        hedge: Send a duplicate request to a second replica of a model once
+            the first exceeds that model's observed p95 latency
         
     Returns:
-        List of results from each model
+        List of results from each model, in the order of `models`
     """
-    if not models:
-        models = ['your_model']  # Default model
-    
-    # Run all models in parallel
-    tasks = [call_external_model(model, prompt) for model in models]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-    
-    # Filter out exceptions and convert to results
-    valid_results = []
-    for i, result in enumerate(results):
-        if isinstance(result, Exception):
-            logger.error(f"Model {models[i]} failed: {result}")
-            valid_results.append(SingleModelResult(
-                model_name=models[i],
-                smiles="C",
-                confidence=0.0,
-                execution_time=0.0,
-                model_version="error",
-                is_valid=False
-            ))
-        else:
-            valid_results.append(result)
-    
-    return valid_results
+    results: Dict[int, SingleModelResult] = {}
+    async for index, result in stream_molecules(
+        prompt, models, num_candidates, batched, use_cache, latency_budget_ms, hedge
+    ):
+        results[index] = result
+    return [results[i] for i in sorted(results)]
 
 
 async def get_available_models() -> Dict[str, Dict]:
     """
     Get list of available models and their health status.
+    Served from the background health monitor and circuit breakers; this does
+    not call the model servers.
     """
-    health_status = await check_all_models_health()
-    
     models_info = {}
-    for name in MODEL_CLIENTS.keys():
+    for name, client in get_model_clients().items():
+        health = health_monitor.snapshot(name)
         models_info[name] = {
             'name': name,
-            'display_name': name.replace('_', ' ').title(),
-            'is_available': health_status.get(name, False),
+            'display_name': client.spec.display_name,
+            'is_available': bool(health['healthy']) and not client.breaker.is_open,
+            'health': health,
+            'circuit': client.breaker.stats(),
+            'replicas': client.replica_stats(),
             'description': get_model_description(name)
         }
     
     return models_info
 
 
-def get_model_description(model_name: str) -> str:
-    """Get human-readable description for each model"""
-    descriptions = {
-        'your_model': 'Custom Text-to-Molecule model trained on your dataset',
-        'molt5': 'MolT5 - Transformer model for molecular language understanding',
-        'chemberta': 'ChemBERTa - BERT-based model pretrained on SMILES'
+def get_models_health(include_history: bool = True) -> Dict[str, Dict]:
+    """Health monitor state (probe history, latency EWMA) for every model"""
+    return {
+        name: health_monitor.snapshot(name, include_history)
+        for name in get_model_clients()
     }
-    return descriptions.get(model_name, 'AI model for molecule generation')
+
+
+def get_generation_stats() -> Dict[str, Dict]:
+    """Counters for the generation pipeline (request coalescing, result cache)"""
+    return {
+        'single_flight': generation_flight.stats(),
+        'cache': generation_cache.stats(),
+    }
+
+
+def get_model_description(model_name: str) -> str:
+    """Get human-readable description for each model (from the model registry)"""
+    client = get_model_clients().get(model_name)
+    return client.spec.description if client else 'AI model for molecule generation'
+
 
 
 async def validate_smiles(smiles: str) -> Dict:
     """
-    Validate a SMILES string and return information about it.
+    Validate a SMILES string and return information about it (computed in the
+    chem process pool).
     """
-    from rdkit import Chem
-    from rdkit.Chem import Descriptors, rdMolDescriptors
-    
     try:
-        mol = Chem.MolFromSmiles(smiles)
-        if mol is None:
-            return {'valid': False, 'error': 'Invalid SMILES string'}
-        
-        return {
-            'valid': True,
-            'smiles': smiles,
-            'canonical_smiles': Chem.MolToSmiles(mol),
-            'molecular_formula': rdMolDescriptors.CalcMolFormula(mol),
-            'molecular_weight': round(Descriptors.MolWt(mol), 2),
-            'num_atoms': mol.GetNumAtoms(),
-            'num_heavy_atoms': mol.GetNumHeavyAtoms(),
-            'num_rings': rdMolDescriptors.CalcNumRings(mol),
-            'num_rotatable_bonds': rdMolDescriptors.CalcNumRotatableBonds(mol)
-        }
-    except Exception as e:
+        return await chem_executor.run(chem_tasks.smiles_info, smiles)
+    except ChemTaskError as e:
         return {'valid': False, 'error': str(e)}
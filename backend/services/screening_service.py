@@ -0,0 +1,234 @@
+"""
+Virtual Screening Jobs
+
+Docks a ligand library (SMILES list or every molecule of an experiment)
+against one target in the background. Ligands are split into chunks that run
+across the chem process pool (chem_tasks.dock_ligands); every worker
+memory-maps the target's prepared grid maps once (services/target_store.py),
+so the target data is loaded a single time and shared. Each finished chunk is
+written to MongoDB right away, so progress and ranked partial results can be
+read while the job runs.
+
+Collections:
+- screening_jobs: one document per job (target, ligands, status, counters)
+- screening_results: one document per ligand {job_id, index, smiles,
+  affinity, score_breakdown, ...} or {..., error}; ranked by affinity
+
+Jobs left queued or running by a shutdown are resumed on the next startup,
+skipping ligands that already have a result; the job's counters are recomputed
+from screening_results first, since a crash between a chunk's results insert
+and its counter update would otherwise leave them behind for good. Docked poses are not stored; a
+hit can be re-docked with POST /api/simulation/docking/run (same result, as
+docking is deterministic).
+
+Configuration (environment):
+- SCREENING_CHUNK_SIZE (ligands per pool task, default 8)
+- SCREENING_MAX_JOBS (jobs running at the same time, default 2)
+- SCREENING_TASK_TIMEOUT_SECONDS (per chunk, default 300)
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from services import chem_tasks
+from services.chem_executor import chem_executor, ChemTaskError
+from services.docking_service import docking_engine
+from services.target_store import target_store
+
+logger = logging.getLogger(__name__)
+
+SCREENING_CHUNK_SIZE = int(os.environ.get('SCREENING_CHUNK_SIZE', '8'))
+SCREENING_MAX_JOBS = int(os.environ.get('SCREENING_MAX_JOBS', '2'))
+SCREENING_TASK_TIMEOUT_SECONDS = float(os.environ.get('SCREENING_TASK_TIMEOUT_SECONDS', '300'))
+
+ACTIVE_STATUSES = ('queued', 'running')
+JOB_PROJECTION = {'_id': 0, 'ligands': 0}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class ScreeningJobs:
+    """Background screening jobs with results persisted incrementally"""
+
+    def __init__(self, chunk_size: int = SCREENING_CHUNK_SIZE, max_jobs: int = SCREENING_MAX_JOBS):
+        self.chunk_size = chunk_size
+        self._db = None
+        self._slots = asyncio.Semaphore(max_jobs)
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._cancelled = set()
+
+    async def start(self, db) -> None:
+        """Resume jobs interrupted by the last shutdown (indexes: services/db_indexes.py)"""
+        self._db = db
+        async for job in db.screening_jobs.find({'status': {'$in': list(ACTIVE_STATUSES)}}, {'id': 1}):
+            self._launch(job['id'])
+
+    async def stop(self) -> None:
+        """Stop running jobs; they stay active in MongoDB and resume on the next start"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def submit(self, target_id: str, ligands: List[str], experiment_id: Optional[str] = None) -> Dict[str, Any]:
+        """Queue a job docking `ligands` (de-duplicated) into `target_id`"""
+        ligands = list(dict.fromkeys(ligands))
+        job = {
+            'id': str(uuid.uuid4()),
+            'target_id': target_id,
+            'experiment_id': experiment_id,
+            'status': 'queued',
+            'total': len(ligands),
+            'completed': 0,
+            'failed': 0,
+            'search': docking_engine.search,
+            'created_at': _now(),
+            'started_at': None,
+            'finished_at': None,
+            'error': None,
+            'ligands': ligands,
+        }
+        await self._db.screening_jobs.insert_one(job)
+        self._launch(job['id'])
+        return {**{key: value for key, value in job.items() if key not in ('_id', 'ligands')}, 'best_affinity': None}
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job; False if it is unknown or already finished"""
+        result = await self._db.screening_jobs.update_one(
+            {'id': job_id, 'status': {'$in': list(ACTIVE_STATUSES)}},
+            {'$set': {'status': 'cancelled', 'finished_at': _now()}}
+        )
+        if result.matched_count == 0:
+            return False
+        task = self._tasks.get(job_id)
+        if task is not None:
+            self._cancelled.add(job_id)
+            task.cancel()
+        return True
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job document with progress: fraction done, throughput and estimated time left"""
+        job = await self._db.screening_jobs.find_one({'id': job_id}, JOB_PROJECTION)
+        if job is None:
+            return None
+        job.setdefault('best_affinity', None)  # Set by the first docked chunk ($min)
+        done = job['completed'] + job['failed']
+        job['progress'] = round(done / job['total'], 4) if job['total'] else 1.0
+        job['ligands_per_second'] = None
+        job['eta_seconds'] = None
+        if job.get('started_at'):
+            elapsed = ((job.get('finished_at') or _now()) - job['started_at']).total_seconds()
+            if elapsed > 0 and done:
+                rate = done / elapsed
+                job['ligands_per_second'] = round(rate, 2)
+                if job['status'] == 'running':
+                    job['eta_seconds'] = round((job['total'] - done) / rate, 1)
+        return job
+
+    async def results(self, job_id: str, limit: int = 100, offset: int = 0,
+                      failed: bool = False) -> List[Dict[str, Any]]:
+        """Docked ligands stored so far, best (lowest) affinity first; or the failed ones, in input order"""
+        if failed:
+            query, sort = {'job_id': job_id, 'error': {'$ne': None}}, [('index', 1)]
+        else:
+            query, sort = {'job_id': job_id, 'error': None}, [('affinity', 1), ('index', 1)]
+        cursor = self._db.screening_results.find(query, {'_id': 0, 'job_id': 0}).sort(sort).skip(offset).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    def _launch(self, job_id: str) -> None:
+        task = asyncio.create_task(self._run(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def _run(self, job_id: str) -> None:
+        try:
+            async with self._slots:
+                job = await self._db.screening_jobs.find_one({'id': job_id})
+                if job is None or job['status'] not in ACTIVE_STATUSES:
+                    return
+                await self._db.screening_jobs.update_one(
+                    {'id': job_id}, {'$set': {'status': 'running', 'started_at': job.get('started_at') or _now()}}
+                )
+                await self._screen(job)
+                await self._db.screening_jobs.update_one(
+                    {'id': job_id, 'status': 'running'},
+                    {'$set': {'status': 'completed', 'finished_at': _now()}}
+                )
+        except asyncio.CancelledError:
+            if job_id in self._cancelled:
+                self._cancelled.discard(job_id)
+                return  # Marked cancelled by cancel(); shutdown leaves the job active for resuming
+            raise
+        except Exception as e:
+            logger.warning(f"Screening job {job_id} failed: {e}")
+            await self._db.screening_jobs.update_one(
+                {'id': job_id}, {'$set': {'status': 'failed', 'error': str(e), 'finished_at': _now()}}
+            )
+
+    async def _screen(self, job: Dict) -> None:
+        target = target_store.targets[job['target_id']]
+        await target_store.get_grids(target.target_id)
+        grid_dir = target_store.grid_dir(target.target_id)
+
+        done = set(await self._db.screening_results.distinct('index', {'job_id': job['id']}))
+        if done:
+            await self._recount(job['id'])
+        pending = [(i, smiles) for i, smiles in enumerate(job['ligands']) if i not in done]
+        chunks = [pending[i:i + self.chunk_size] for i in range(0, len(pending), self.chunk_size)]
+        chunks.reverse()
+
+        async def worker():
+            while chunks:
+                chunk = chunks.pop()
+                try:
+                    results = await chem_executor.run(
+                        chem_tasks.dock_ligands, [smiles for _, smiles in chunk], grid_dir, target.center,
+                        job['search'], timeout=SCREENING_TASK_TIMEOUT_SECONDS
+                    )
+                except ChemTaskError as e:
+                    results = [{'smiles': smiles, 'error': str(e)} for _, smiles in chunk]
+                await self._store(job['id'], chunk, results)
+
+        # One chunk in flight per pool worker
+        await asyncio.gather(*(worker() for _ in range(chem_executor.max_workers)))
+
+    async def _recount(self, job_id: str) -> None:
+        """Reset a job's completed/failed/best_affinity from the results it has stored"""
+        results = self._db.screening_results
+        completed, failed, best = await asyncio.gather(
+            results.count_documents({'job_id': job_id, 'error': None}),
+            results.count_documents({'job_id': job_id, 'error': {'$ne': None}}),
+            results.find_one({'job_id': job_id, 'error': None}, {'_id': 0, 'affinity': 1},
+                             sort=[('affinity', 1), ('index', 1)]),
+        )
+        await self._db.screening_jobs.update_one(
+            {'id': job_id},
+            {'$set': {'completed': completed, 'failed': failed, 'best_affinity': best['affinity'] if best else None}}
+        )
+
+    async def _store(self, job_id: str, chunk: List, results: List[Dict]) -> None:
+        docs = [
+            {'job_id': job_id, 'index': index, 'affinity': None, 'error': None, **result}
+            for (index, _), result in zip(chunk, results)
+        ]
+        for doc in docs:
+            if doc['affinity'] is not None:
+                doc['affinity'] = round(doc['affinity'], 3)
+                doc['score_breakdown'] = {k: round(v, 3) for k, v in doc['score_breakdown'].items()}
+        await self._db.screening_results.insert_many(docs, ordered=False)
+
+        docked = [doc['affinity'] for doc in docs if doc['error'] is None]
+        update: Dict[str, Any] = {'$inc': {'completed': len(docked), 'failed': len(docs) - len(docked)}}
+        if docked:
+            update['$min'] = {'best_affinity': min(docked)}
+        await self._db.screening_jobs.update_one({'id': job_id}, update)
+
+
+# Shared job runner (started from server.py)
+screening_jobs = ScreeningJobs()
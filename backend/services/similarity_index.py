@@ -0,0 +1,88 @@
+"""
+Fingerprint Similarity Index
+
+In-memory index of Morgan fingerprints for every valid SMILES in
+`generation_history`, stored as one packed uint64 bit matrix
+(services/fingerprint_index.py). Top-k Tanimoto queries are answered with
+vectorized popcounts (np.bitwise_count) over the whole matrix, in blocks, off
+the event loop.
+
+Configuration (environment):
+- SIMILARITY_FP_BITS (fingerprint length, multiple of 64, default 2048)
+- SIMILARITY_FP_RADIUS (Morgan radius, default 2)
+"""
+
+import asyncio
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from services import chem_tasks
+from services.chem_executor import chem_executor
+from services.fingerprint_index import FingerprintIndex, INDEX_BLOCK_ROWS
+
+SIMILARITY_FP_BITS = int(os.environ.get('SIMILARITY_FP_BITS', '2048'))
+SIMILARITY_FP_RADIUS = int(os.environ.get('SIMILARITY_FP_RADIUS', '2'))
+
+
+def tanimoto(fps: np.ndarray, counts: np.ndarray, query: np.ndarray,
+             block_rows: int = INDEX_BLOCK_ROWS) -> np.ndarray:
+    """Tanimoto similarity of `query` (packed uint64 row) to every row of `fps`"""
+    query_count = int(np.bitwise_count(query).sum())
+    scores = np.empty(len(fps), dtype=np.float32)
+    for start in range(0, len(fps), block_rows):
+        block = fps[start:start + block_rows]
+        common = np.bitwise_count(block & query).sum(axis=1, dtype=np.int32)
+        union = counts[start:start + block_rows] + query_count - common
+        np.divide(common, union, out=scores[start:start + block_rows], where=union > 0)
+        scores[start:start + block_rows][union == 0] = 0.0
+    return scores
+
+
+class SimilarityIndex(FingerprintIndex):
+    """Packed Morgan fingerprint matrix answering top-k Tanimoto queries"""
+
+    label = 'Similarity index'
+
+    def __init__(self, n_bits: int = SIMILARITY_FP_BITS, radius: int = SIMILARITY_FP_RADIUS):
+        super().__init__(n_bits, chem_tasks.morgan_fingerprints, radius=radius)
+        self.radius = radius
+
+    async def search(self, smiles: str, k: int = 10, threshold: float = 0.0,
+                     experiment_id: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Top-k most similar indexed molecules to `smiles` (Tanimoto >= threshold),
+        optionally within one experiment. None if `smiles` is invalid.
+        """
+        packed, valid = await chem_executor.run(self.fingerprint_task, [smiles], **self.fingerprint_options)
+        if not valid[0]:
+            return None
+        query = np.frombuffer(packed, dtype=np.uint64)
+
+        size = self._size
+        fps, counts, experiments = self._fps[:size], self._counts[:size], self._experiments[:size]
+        scores = await asyncio.get_running_loop().run_in_executor(None, tanimoto, fps, counts, query)
+
+        if experiment_id is not None:
+            code = self._experiment_codes.get(experiment_id)
+            if code is None:
+                return []
+            scores[experiments != code] = -1.0
+        candidates = np.flatnonzero(scores >= max(threshold, 0.0))
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(scores[candidates], -k)[-k:]]
+        candidates = candidates[np.argsort(scores[candidates])[::-1]]
+
+        experiment_names = self._experiment_names()
+        return [
+            {**self._row(i, experiment_names), 'similarity': round(float(scores[i]), 4)}
+            for i in candidates
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), 'radius': self.radius}
+
+
+# Shared index (built and kept current from server.py startup)
+similarity_index = SimilarityIndex()
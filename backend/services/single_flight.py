@@ -0,0 +1,89 @@
+"""
+Single-Flight Request Coalescing
+
+Concurrent calls that share a key are collapsed onto one upstream future:
+the first caller runs the work, later callers await the same result until
+it completes. Nothing is cached once the call has finished. When every
+waiter has gone (cancelled, or cut off by a latency budget), the shared
+upstream call is cancelled too.
+"""
+
+import asyncio
+import json
+import unicodedata
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalize a prompt for keying: Unicode NFC and collapsed whitespace"""
+    return ' '.join(unicodedata.normalize('NFC', prompt).split())
+
+
+def make_flight_key(prompt: str, model_name: str, options: Optional[Dict[str, Any]] = None,
+                    **call_mode: Any) -> str:
+    """
+    Build a stable key from normalized prompt, model and generation options,
+    plus anything that changes how the call is made (e.g. hedge, batched), so
+    calls only share a flight when they would send the same requests.
+    """
+    return json.dumps(
+        [normalize_prompt(prompt), model_name, options or {}, call_mode],
+        sort_keys=True,
+        default=str
+    )
+
+
+class SingleFlight:
+    """Shares one in-flight future between concurrent callers with the same key"""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._waiters: Dict[asyncio.Future, int] = {}
+        self.calls = 0
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run `fn` for `key`, or join the call already in flight for it"""
+        self.calls += 1
+        future = self._inflight.get(key)
+        if future is not None and future.cancelled():
+            future = None  # Abandoned by its last waiter; start a fresh call
+        if future is not None:
+            self.coalesced += 1
+        else:
+            self.executed += 1
+            future = asyncio.ensure_future(fn())
+            self._inflight[key] = future
+            future.add_done_callback(lambda f, k=key: self._forget(k, f))
+        # Shield: one caller cancelling must not cancel the shared upstream call
+        self._waiters[future] = self._waiters.get(future, 0) + 1
+        try:
+            return await asyncio.shield(future)
+        finally:
+            self._waiters[future] -= 1
+            if self._waiters[future] == 0:
+                del self._waiters[future]
+                if not future.done():
+                    # Nobody is waiting for it any more. A cancelled task only finishes on a
+                    # later loop iteration, so drop the key now: new callers start afresh
+                    # instead of joining a call that is being cancelled.
+                    if self._inflight.get(key) is future:
+                        del self._inflight[key]
+                    future.cancel()
+
+    def _forget(self, key: str, future: asyncio.Future) -> None:
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled():
+            future.exception()  # Mark retrieved; every waiter re-raises it
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'calls': self.calls,
+            'executed': self.executed,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._inflight),
+        }
@@ -0,0 +1,77 @@
+"""
+Streaming Generation Responses
+
+Formats per-model generation results as Server-Sent Events or NDJSON while
+the models are still running, so clients see the fastest model's molecule
+without waiting for the slowest one.
+
+Event sequence:
+- `result` {"index", "result": SingleModelResult} once per model, as it completes
+- `record` GenerationRecord, after the record has been saved (or queued, with
+  write-behind persistence)
+
+If the client disconnects mid-stream, the results that already arrived are
+still saved as a record; the remaining model calls are cancelled.
+"""
+
+import asyncio
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional
+
+from models import GenerationRecord, SingleModelResult
+from services.molecule_service import stream_molecules
+
+STREAM_FORMATS = ('sse', 'ndjson')
+
+STREAM_MEDIA_TYPES = {
+    'sse': 'text/event-stream',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Keep proxies from buffering the stream
+STREAM_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',
+}
+
+
+def format_event(event: str, payload: Any, fmt: str) -> str:
+    """Serialize one stream event as an SSE frame or an NDJSON line"""
+    if fmt == 'sse':
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+    return json.dumps({'type': event, 'data': payload}) + "\n"
+
+
+async def stream_generation_events(
+    prompt: str,
+    models: List[str],
+    fmt: str,
+    persist: Callable[[List[SingleModelResult]], Awaitable[GenerationRecord]],
+    num_candidates: int = 1,
+    use_cache: bool = True,
+    latency_budget_ms: Optional[int] = None,
+    hedge: bool = False,
+) -> AsyncIterator[str]:
+    """
+    Emit a `result` event per model as it completes, then hand the ordered
+    results to `persist` and emit the saved record as the final `record` event.
+    """
+    results = {}
+    persisted = False
+    model_results = stream_molecules(
+        prompt, models, num_candidates, use_cache=use_cache,
+        latency_budget_ms=latency_budget_ms, hedge=hedge
+    )
+    try:
+        async for index, result in model_results:
+            results[index] = result
+            yield format_event('result', {'index': index, 'result': result.model_dump(mode='json')}, fmt)
+
+        persisted = True
+        record = await persist([results[i] for i in sorted(results)])
+        yield format_event('record', record.model_dump(mode='json'), fmt)
+    finally:
+        await model_results.aclose()
+        if not persisted and results:
+            # Client went away mid-stream: save what arrived, even while being cancelled
+            await asyncio.shield(persist([results[i] for i in sorted(results)]))
@@ -0,0 +1,113 @@
+"""
+Substructure Search Index
+
+In-memory index of RDKit pattern fingerprints for every valid SMILES in
+`generation_history` (services/fingerprint_index.py). A SMARTS query is
+answered in two stages:
+
+1. Screen: the query's own pattern fingerprint is compared against the packed
+   matrix with vectorized bitwise ANDs; only molecules that have every query
+   bit set can contain the substructure.
+2. Match: exact HasSubstructMatch on the surviving molecules, in chunks spread
+   across the chem process pool, until a page of hits is filled.
+
+Hits come back most recently indexed first. Paging uses a row cursor: pass a
+page's `next_cursor` to continue below it (cursors stay valid for the life of
+the index; it is rebuilt from MongoDB on restart).
+
+Configuration (environment):
+- SUBSTRUCTURE_FP_BITS (pattern fingerprint length, multiple of 64, default 2048)
+"""
+
+import asyncio
+import os
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from services import chem_tasks
+from services.chem_executor import chem_executor
+from services.fingerprint_index import FingerprintIndex, INDEX_BLOCK_ROWS
+
+SUBSTRUCTURE_FP_BITS = int(os.environ.get('SUBSTRUCTURE_FP_BITS', '2048'))
+# SMILES per exact-match task
+SUBSTRUCTURE_MATCH_CHUNK = 500
+
+
+def screen(fps: np.ndarray, experiments: np.ndarray, query: np.ndarray,
+           experiment_code: Optional[int] = None, block_rows: int = INDEX_BLOCK_ROWS) -> np.ndarray:
+    """Rows of `fps` that have every bit of `query` set (optionally one experiment), last row first"""
+    words = np.flatnonzero(query)
+    query_words = query[words]
+    rows = []
+    for start in range(0, len(fps), block_rows):
+        block = fps[start:start + block_rows][:, words]
+        mask = ((block & query_words) == query_words).all(axis=1)
+        if experiment_code is not None:
+            mask &= experiments[start:start + block_rows] == experiment_code
+        rows.append(np.flatnonzero(mask) + start)
+    if not rows:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate(rows)[::-1]
+
+
+class SubstructureIndex(FingerprintIndex):
+    """Packed pattern fingerprint matrix answering SMARTS substructure queries"""
+
+    label = 'Substructure index'
+
+    def __init__(self, n_bits: int = SUBSTRUCTURE_FP_BITS):
+        super().__init__(n_bits, chem_tasks.pattern_fingerprints)
+
+    async def search(self, smarts: str, limit: int = 50, cursor: Optional[int] = None,
+                     experiment_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        One page of indexed molecules containing `smarts`, optionally within one
+        experiment, starting below row `cursor`. Returns {"hits", "screened",
+        "next_cursor"} (next_cursor None on the last page); None if `smarts` is invalid.
+        """
+        packed = await chem_executor.run(chem_tasks.query_pattern_fingerprint, smarts, n_bits=self.n_bits)
+        if packed is None:
+            return None
+        query = np.frombuffer(packed, dtype=np.uint64)
+
+        experiment_code = None
+        if experiment_id is not None:
+            experiment_code = self._experiment_codes.get(experiment_id)
+            if experiment_code is None:
+                return {'hits': [], 'screened': 0, 'next_cursor': None}
+        size = self._size if cursor is None else min(cursor, self._size)
+        candidates = await asyncio.get_running_loop().run_in_executor(
+            None, screen, self._fps[:size], self._experiments[:size], query, experiment_code
+        )
+
+        hits = []
+        position = 0
+        round_size = SUBSTRUCTURE_MATCH_CHUNK * chem_executor.max_workers
+        while position < len(candidates) and len(hits) < limit:
+            rows = candidates[position:position + round_size]
+            # Same molecule generated in several records: match it once
+            unique = list(dict.fromkeys(self.smiles[i] for i in rows))
+            chunk_size = max(1, -(-len(unique) // chem_executor.max_workers))
+            chunks = [unique[i:i + chunk_size] for i in range(0, len(unique), chunk_size)]
+            results = await chem_executor.map(chem_tasks.substructure_matches, chunks, smarts=smarts)
+            matched = {
+                smiles for chunk, flags in zip(chunks, results) for smiles, ok in zip(chunk, flags) if ok
+            }
+            for i in rows:
+                position += 1
+                if self.smiles[i] in matched:
+                    hits.append(int(i))
+                    if len(hits) == limit:
+                        break
+
+        experiment_names = self._experiment_names()
+        return {
+            'hits': [self._row(i, experiment_names) for i in hits],
+            'screened': len(candidates),
+            'next_cursor': hits[-1] if hits and position < len(candidates) else None,
+        }
+
+
+# Shared index (built and kept current from server.py startup)
+substructure_index = SubstructureIndex()
@@ -0,0 +1,369 @@
+"""
+Docking Target Store
+
+Receptor structures served from a local directory instead of downloading from
+RCSB on every request:
+
+    TARGET_STORE_DIR/
+        targets.json              registered targets {target_id: {name, center, pdb_id}}
+        <target_id>.pdb           receptor structure (or <PDB_ID>.pdb)
+        cache/<target_id>-<ver>/  parsed atoms and docking grid maps as .npy files
+
+Each PDB file is parsed once, in the chem process pool, into compact NumPy
+arrays (coords, elements, charges) plus its grid maps (services/docking_grid.py);
+both are memory-mapped read-only from the cache, so every process docking
+against a target shares the same pages. The cache version covers the file's
+mtime/size, the active-site center and the grid parameters, so editing a file
+or a center re-prepares the target; older cache directories of the target are
+removed once the new version is loaded.
+
+The store warms on startup and re-scans the directory every
+TARGET_STORE_REFRESH_SECONDS in the background. Targets are the built-in
+DEFAULT_TARGETS plus targets.json; new ones are added with register() (POST
+/api/simulation/targets). A target without a structure file is downloaded in
+the background from TARGET_FETCH_URL when set, never on the request path, and
+until it has one it is docked against MOCK_PROTEIN_PDB placed beside the
+target's active-site center (status "mock").
+
+Configuration (environment):
+- TARGET_STORE_DIR (default backend/data/targets)
+- TARGET_STORE_REFRESH_SECONDS (directory re-scan interval, default 300)
+- TARGET_FETCH_URL (URL template with {pdb_id}, default RCSB; empty disables)
+- DOCKING_GRID_SIZE (edge of the grid box in Angstrom, default 24)
+- DOCKING_GRID_SPACING (Angstrom, default 0.4)
+- DOCKING_GRID_TIMEOUT_SECONDS (preparation per target, default 300)
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+import numpy as np
+
+from services import chem_tasks, docking_grid
+from services.chem_executor import chem_executor
+from services.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+TARGET_STORE_DIR = os.environ.get('TARGET_STORE_DIR', str(Path(__file__).resolve().parent.parent / 'data' / 'targets'))
+TARGET_STORE_REFRESH_SECONDS = float(os.environ.get('TARGET_STORE_REFRESH_SECONDS', '300'))
+TARGET_FETCH_URL = os.environ.get('TARGET_FETCH_URL', 'https://files.rcsb.org/download/{pdb_id}.pdb')
+DOCKING_GRID_SIZE = float(os.environ.get('DOCKING_GRID_SIZE', '24'))
+DOCKING_GRID_SPACING = float(os.environ.get('DOCKING_GRID_SPACING', '0.4'))
+DOCKING_GRID_TIMEOUT_SECONDS = float(os.environ.get('DOCKING_GRID_TIMEOUT_SECONDS', '300'))
+
+# Preset Targets with PDB IDs and approx active site centers (x,y,z)
+DEFAULT_TARGETS = {
+    "covid_protease": {"pdb_id": "6LU7", "name": "SARS-CoV-2 Main Protease", "center": (-10.7, 12.4, 68.8)},
+    "hiv_protease": {"pdb_id": "1HSG", "name": "HIV-1 Protease", "center": (16.0, 26.0, 5.0)},
+    "breast_cancer": {"pdb_id": "3ERT", "name": "Estrogen Receptor Alpha", "center": (30.0, -2.0, 25.0)},
+}
+
+
+# Fallback structure (small part of a helix) for targets without a structure file
+MOCK_PROTEIN_PDB = """ATOM      1  N   ALA A   1       0.000   0.000   0.000  1.00  0.00           N
+ATOM      2  CA  ALA A   1       1.458   0.000   0.000  1.00  0.00           C
+ATOM      3  C   ALA A   1       2.009   1.396   0.000  1.00  0.00           C
+ATOM      4  O   ALA A   1       1.272   2.432   0.000  1.00  0.00           O
+ATOM      5  CB  ALA A   1       2.000  -0.767   1.217  1.00  0.00           C
+"""
+# Distance (Angstrom) of the mock structure's centroid below a target's center,
+# so ligands docked at the center pack against it rather than overlap it
+MOCK_SITE_DISTANCE = 4.5
+
+
+def mock_pdb(center: Tuple[float, float, float]) -> str:
+    """MOCK_PROTEIN_PDB moved next to an active-site center"""
+    lines = MOCK_PROTEIN_PDB.splitlines()
+    coords = np.array([(float(line[30:38]), float(line[38:46]), float(line[46:54])) for line in lines])
+    coords += np.asarray(center) - (0.0, 0.0, MOCK_SITE_DISTANCE) - coords.mean(axis=0)
+    return ''.join(
+        f"{line[:30]}{x:8.3f}{y:8.3f}{z:8.3f}{line[54:]}\n" for line, (x, y, z) in zip(lines, coords)
+    )
+
+
+class TargetUnavailable(Exception):
+    """The target is unknown or has no usable structure (not prepared yet or failed preparation)"""
+
+
+@dataclass
+class Target:
+    target_id: str
+    name: str
+    center: Tuple[float, float, float]
+    pdb_id: Optional[str] = None
+
+
+class TargetStore:
+    """Local receptor structures with parsed atoms and grid maps memory-mapped from disk"""
+
+    def __init__(self, directory: str = TARGET_STORE_DIR, grid_size: float = DOCKING_GRID_SIZE,
+                 grid_spacing: float = DOCKING_GRID_SPACING, fetch_url: str = TARGET_FETCH_URL):
+        self.directory = Path(directory)
+        self.cache_root = self.directory / 'cache'
+        self.grid_size = grid_size
+        self.grid_spacing = grid_spacing
+        self.fetch_url = fetch_url
+        self.targets: Dict[str, Target] = {}
+        self._registered: Dict[str, Dict] = {}
+        self._loaded: Dict[str, Tuple[str, docking_grid.GridMaps, Dict[str, np.ndarray]]] = {}
+        self._paths: Dict[str, Path] = {}  # Structure file each loaded target was prepared from
+        self._pdb_text: Dict[str, Tuple[str, str]] = {}
+        self._status: Dict[str, str] = {}
+        self._flight = SingleFlight()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._load_manifest()
+
+    def _load_manifest(self) -> None:
+        manifest = self.directory / 'targets.json'
+        self._registered = {}
+        if manifest.exists():
+            try:
+                self._registered = json.loads(manifest.read_text())
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read {manifest}: {e}")
+        self.targets = {
+            target_id: Target(target_id, spec['name'], tuple(spec['center']), spec.get('pdb_id'))
+            for target_id, spec in {**DEFAULT_TARGETS, **self._registered}.items()
+        }
+
+    def _write_manifest(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        staging = self.directory / 'targets.json.tmp'
+        staging.write_text(json.dumps(self._registered, indent=2))
+        os.replace(staging, self.directory / 'targets.json')
+
+    # Files and versions
+
+    def pdb_path(self, target: Target) -> Optional[Path]:
+        for name in (target.target_id, target.pdb_id):
+            if name and (self.directory / f"{name}.pdb").exists():
+                return self.directory / f"{name}.pdb"
+        return None
+
+    def _version(self, target: Target, path: Path) -> str:
+        stat = path.stat()
+        raw = json.dumps([path.name, stat.st_mtime_ns, stat.st_size, list(target.center),
+                          self.grid_size, self.grid_spacing])
+        return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+    def _cache_dir(self, target_id: str, version: str) -> Path:
+        return self.cache_root / f"{target_id}-{version}"
+
+    def mock_path(self, target_id: str) -> Path:
+        return self.cache_root / f"{target_id}-mock.pdb"
+
+    def _write_mock_pdb(self, target: Target) -> Path:
+        path = self.mock_path(target.target_id)
+        pdb_text = mock_pdb(target.center)
+        if not path.exists() or path.read_text() != pdb_text:
+            self.cache_root.mkdir(parents=True, exist_ok=True)
+            staging = path.with_suffix('.pdb.tmp')
+            staging.write_text(pdb_text)
+            os.replace(staging, path)
+        return path
+
+    def _remove_stale_caches(self, target_id: str, keep_version: Optional[str] = None) -> None:
+        """Delete a target's cache directories other than `keep_version` (from earlier runs too)"""
+        if not self.cache_root.exists():
+            return
+        pattern = re.compile(rf"{re.escape(target_id)}-([0-9a-f]{{16}})")
+        for entry in self.cache_root.iterdir():
+            match = pattern.fullmatch(entry.name)
+            if match and match.group(1) != keep_version:
+                shutil.rmtree(entry, ignore_errors=True)
+
+    def _unload(self, target_id: str) -> None:
+        self._loaded.pop(target_id, None)
+        self._paths.pop(target_id, None)
+        self._pdb_text.pop(target_id, None)
+        self.mock_path(target_id).unlink(missing_ok=True)
+        self._remove_stale_caches(target_id)
+
+    def grid_dir(self, target_id: str) -> str:
+        """Cache directory of a ready target (workers memory-map its grids from there)"""
+        if target_id not in self._loaded:
+            raise TargetUnavailable(self._status.get(target_id, 'not prepared'))
+        return str(self._cache_dir(target_id, self._loaded[target_id][0]))
+
+    # Lifecycle
+
+    def start(self) -> None:
+        """Prepare every target, then re-scan the directory periodically, in the background"""
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Target store refresh failed: {e}")
+            await asyncio.sleep(TARGET_STORE_REFRESH_SECONDS)
+
+    async def refresh(self) -> None:
+        """Re-read the manifest and bring every target's cache up to date with its file"""
+        self._load_manifest()
+        for target_id in list(self._loaded):
+            if target_id not in self.targets:
+                await asyncio.to_thread(self._unload, target_id)
+        for target_id in self.targets:
+            try:
+                await self.prepare(target_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Target {target_id} unavailable: {e}")
+
+    async def prepare(self, target_id: str, fetch: bool = True) -> None:
+        """
+        Load the current version of a target, parsing it first if needed (and
+        downloading a missing structure when `fetch`, else using the mock
+        structure); KeyError if unknown.
+        """
+        target = self.targets[target_id]
+        path = self.pdb_path(target)
+        if path is None and fetch and self.fetch_url and target.pdb_id:
+            path = await self._fetch(target)
+        if path is None:
+            path = await asyncio.to_thread(self._write_mock_pdb, target)
+
+        version = self._version(target, path)
+        if self._loaded.get(target_id, (None,))[0] == version:
+            return
+        await self._flight.do(f"{target_id}:{version}", lambda: self._prepare(target, path, version))
+
+    async def _prepare(self, target: Target, path: Path, version: str) -> None:
+        cache_dir = self._cache_dir(target.target_id, version)
+        if not cache_dir.exists():
+            self._status[target.target_id] = 'preparing'
+            try:
+                summary = await chem_executor.run(
+                    chem_tasks.prepare_target, str(path), str(cache_dir), target.center,
+                    self.grid_size, self.grid_spacing, timeout=DOCKING_GRID_TIMEOUT_SECONDS
+                )
+            except Exception as e:
+                self._status[target.target_id] = f'failed: {e}'
+                raise
+            logger.info(f"Prepared target {target.target_id} from {path.name}: {summary}")
+
+        grids = await asyncio.to_thread(docking_grid.GridMaps.load, str(cache_dir))
+        atoms = {
+            name: np.load(cache_dir / f'{name}.npy', mmap_mode='r')
+            for name in ('coords', 'elements', 'charges')
+        }
+        self._loaded[target.target_id] = (version, grids, atoms)
+        self._paths[target.target_id] = path
+        self._status[target.target_id] = 'mock' if path == self.mock_path(target.target_id) else 'ready'
+        await asyncio.to_thread(self._remove_stale_caches, target.target_id, version)
+
+    async def _fetch(self, target: Target) -> Optional[Path]:
+        url = self.fetch_url.format(pdb_id=target.pdb_id)
+        try:
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60)) as session:
+                async with session.get(url) as response:
+                    if response.status != 200:
+                        logger.warning(f"Fetching {url} for {target.target_id} returned {response.status}")
+                        return None
+                    text = await response.text()
+        except Exception as e:
+            logger.warning(f"Fetching {url} for {target.target_id} failed: {e}")
+            return None
+        return await asyncio.to_thread(self._write_pdb, target.target_id, text)
+
+    def _write_pdb(self, target_id: str, pdb_text: str) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{target_id}.pdb"
+        if path.exists() and path.read_text() == pdb_text:
+            return path  # Unchanged: keeps its version, so the prepared cache is reused
+        staging = path.with_suffix('.pdb.tmp')
+        staging.write_text(pdb_text)
+        os.replace(staging, path)
+        return path
+
+    # Access
+
+    async def get_grids(self, target_id: str) -> docking_grid.GridMaps:
+        """Grid maps of a target (KeyError if unknown, TargetUnavailable if its preparation failed)"""
+        if target_id not in self._loaded:
+            await self.prepare(target_id, fetch=False)
+        return self._loaded[target_id][1]
+
+    def get_atoms(self, target_id: str) -> Dict[str, np.ndarray]:
+        """Memory-mapped receptor atoms of a ready target: coords (N, 3), elements, charges"""
+        if target_id not in self._loaded:
+            raise TargetUnavailable(self._status.get(target_id, 'not prepared'))
+        return self._loaded[target_id][2]
+
+    async def get_pdb_text(self, target_id: str) -> str:
+        """Receptor structure a ready target was prepared from (TargetUnavailable if unknown or not ready)"""
+        if target_id not in self._loaded:
+            raise TargetUnavailable(self._status.get(target_id, 'not prepared'))
+        version = self._loaded[target_id][0]
+        cached = self._pdb_text.get(target_id)
+        if cached is None or cached[0] != version:
+            cached = (version, await asyncio.to_thread(self._paths[target_id].read_text))
+            self._pdb_text[target_id] = cached
+        return cached[1]
+
+    async def register(self, target_id: str, name: str, center: Tuple[float, float, float],
+                       pdb_id: Optional[str] = None, pdb_text: Optional[str] = None) -> Target:
+        """
+        Add (or update) a target in targets.json, store its structure when given
+        and prepare it. Without `pdb_text`, the structure is taken from the
+        directory or fetched by `pdb_id`.
+        """
+        if pdb_text is not None:
+            await asyncio.to_thread(self._write_pdb, target_id, pdb_text)
+        self._registered[target_id] = {'name': name, 'center': list(center), 'pdb_id': pdb_id}
+        await asyncio.to_thread(self._write_manifest)
+        self._load_manifest()
+        try:
+            await self.prepare(target_id)
+        except Exception:
+            await asyncio.to_thread(self._unload, target_id)  # Never keep serving the previous structure
+            raise
+        return self.targets[target_id]
+
+    def list_targets(self) -> List[Dict[str, Any]]:
+        entries = []
+        for target_id, target in self.targets.items():
+            loaded = self._loaded.get(target_id)
+            entries.append({
+                **asdict(target),
+                'status': self._status.get(target_id, 'pending'),
+                'atoms': len(loaded[2]['coords']) if loaded else None,
+                'grid_shape': list(loaded[1].shape) if loaded else None,
+            })
+        return entries
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'directory': str(self.directory),
+            'targets': len(self.targets),
+            'ready': sorted(self._loaded),
+            'grid_mb': round(sum(grids.nbytes for _, grids, _ in self._loaded.values()) / 2**20, 1),
+        }
+
+
+# Shared store (warmed and refreshed from server.py startup)
+target_store = TargetStore()
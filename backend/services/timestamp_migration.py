@@ -0,0 +1,110 @@
+"""
+Timestamp Migration
+
+Converts timestamps stored as ISO-8601 strings (written before storage moved
+to BSON dates) into BSON dates, so they sort chronologically, compare in
+range queries and can back TTL or date-range indexes.
+
+Each collection is walked in `_id` order, a batch at a time. Only documents
+that still hold a string in one of the collection's timestamp fields are
+converted, with one unordered bulk write per batch. After every batch the last
+`_id` is checkpointed in `migrations` (document `bson_datetimes`), so an
+interrupted run resumes where it stopped and a finished collection is skipped.
+An update only applies if the document still holds the string that was read,
+so a concurrent writer is never overwritten. Strings that do not parse are
+left as they are and counted.
+"""
+
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_ID = 'bson_datetimes'
+MIGRATION_BATCH_SIZE = 1000
+
+# Timestamp fields per collection (dotted paths for embedded documents)
+TIMESTAMP_FIELDS: Dict[str, List[str]] = {
+    'generation_history': ['created_at', 'updated_at'],
+    'experiments': ['created_at', 'updated_at', 'last_run.created_at'],
+    'chat_history': ['created_at'],
+    'screening_jobs': ['created_at', 'started_at', 'finished_at'],
+}
+
+
+def parse_timestamp(value: str) -> Optional[datetime]:
+    """UTC datetime of an ISO-8601 string (naive values are taken as UTC); None if it does not parse"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _field(doc: Dict, path: str) -> Any:
+    for key in path.split('.'):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(key)
+    return doc
+
+
+async def _migrate_collection(db, collection: str, fields: List[str], progress: Dict, batch_size: int) -> None:
+    while True:
+        query: Dict[str, Any] = {'$or': [{path: {'$type': 'string'}} for path in fields]}
+        if progress['last_id'] is not None:
+            query['_id'] = {'$gt': progress['last_id']}
+        projection = {path: 1 for path in fields}
+        batch = await db[collection].find(query, projection).sort('_id', 1).limit(batch_size).to_list(length=batch_size)
+        if not batch:
+            progress['done'] = True
+            return
+
+        updates = []
+        for doc in batch:
+            current, converted = {}, {}
+            for path in fields:
+                value = _field(doc, path)
+                if not isinstance(value, str):
+                    continue
+                parsed = parse_timestamp(value)
+                if parsed is None:
+                    progress['unparseable'] += 1
+                    continue
+                current[path], converted[path] = value, parsed
+            if converted:
+                updates.append(UpdateOne({'_id': doc['_id'], **current}, {'$set': converted}))
+        if updates:
+            result = await db[collection].bulk_write(updates, ordered=False)
+            progress['converted'] += result.modified_count
+        progress['last_id'] = batch[-1]['_id']
+        await db.migrations.update_one(
+            {'_id': MIGRATION_ID}, {'$set': {f'collections.{collection}': progress}}, upsert=True
+        )
+        logger.info(f"{collection}: {progress['converted']} documents converted")
+
+
+async def migrate_timestamps(db, batch_size: int = MIGRATION_BATCH_SIZE, restart: bool = False) -> Dict[str, Dict]:
+    """
+    Convert string timestamps in every TIMESTAMP_FIELDS collection, resuming
+    from the stored checkpoint unless `restart`. Returns per-collection
+    progress {converted, unparseable, done, last_id}.
+    """
+    if restart:
+        await db.migrations.delete_one({'_id': MIGRATION_ID})
+    state = await db.migrations.find_one({'_id': MIGRATION_ID}) or {}
+    summary = {}
+    for collection, fields in TIMESTAMP_FIELDS.items():
+        progress = state.get('collections', {}).get(collection) or {
+            'last_id': None, 'converted': 0, 'unparseable': 0, 'done': False,
+        }
+        if not progress['done']:
+            await _migrate_collection(db, collection, fields, progress, batch_size)
+            await db.migrations.update_one(
+                {'_id': MIGRATION_ID}, {'$set': {f'collections.{collection}': progress}}, upsert=True
+            )
+        summary[collection] = progress
+    return summary
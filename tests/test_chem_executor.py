@@ -0,0 +1,39 @@
+import asyncio
+import time
+
+import pytest
+
+from services.chem_executor import ChemExecutor, ChemTaskError
+
+
+def test_close_waits_for_running_tasks_and_rejects_the_rest():
+    async def scenario():
+        executor = ChemExecutor(max_workers=1, task_timeout=10, start_method='fork')
+        await executor.start()
+        running = asyncio.create_task(executor.run(time.sleep, 0.5))
+        await asyncio.sleep(0.1)
+        queued = asyncio.create_task(executor.run(time.sleep, 0))
+        await asyncio.sleep(0)
+        await executor.close()
+        assert running.done()  # close() returned only after the running task
+        with pytest.raises(ChemTaskError):
+            await executor.run(time.sleep, 0)
+        return await asyncio.gather(running, queued, return_exceptions=True)
+
+    running, queued = asyncio.run(scenario())
+    assert running is None
+    assert isinstance(queued, ChemTaskError)
+
+
+def test_start_after_close_reopens_the_pool():
+    async def scenario():
+        executor = ChemExecutor(max_workers=1, start_method='fork')
+        await executor.start()
+        await executor.close()
+        await executor.start()
+        try:
+            return await executor.run(abs, -3)
+        finally:
+            await executor.close()
+
+    assert asyncio.run(scenario()) == 3
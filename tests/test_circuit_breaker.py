@@ -0,0 +1,76 @@
+from services.circuit_breaker import CircuitBreaker, CircuitState
+
+
+def test_opens_after_failure_threshold_in_window():
+    breaker = CircuitBreaker('molt5', window=5, failure_threshold=3, slow_call_seconds=10)
+    breaker.record_failure(0.1)
+    breaker.record_success(0.1)
+    breaker.record_failure(0.1)
+    assert breaker.state == CircuitState.CLOSED and breaker.allow_request()
+    breaker.record_failure(0.1)
+    assert breaker.is_open
+    assert not breaker.allow_request() and breaker.rejected == 1
+
+
+def test_slow_success_counts_as_failure():
+    breaker = CircuitBreaker('molt5', window=5, failure_threshold=2, slow_call_seconds=1)
+    breaker.record_success(2.0)
+    breaker.record_success(2.0)
+    assert breaker.is_open
+
+
+def test_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker('molt5', window=5, failure_threshold=1)
+    breaker.record_failure()
+    breaker.record_probe(True)
+    assert breaker.state == CircuitState.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()  # Trial already in flight
+    breaker.record_success(0.1)
+    assert breaker.state == CircuitState.CLOSED and breaker.allow_request()
+
+
+def test_failed_trial_reopens():
+    breaker = CircuitBreaker('molt5', window=5, failure_threshold=1)
+    breaker.record_failure()
+    breaker.record_probe(True)
+    assert breaker.allow_request()
+    breaker.record_failure(0.1)
+    assert breaker.is_open and breaker.times_opened == 2
+
+
+def test_cancelled_trial_frees_the_slot():
+    breaker = CircuitBreaker('molt5', window=5, failure_threshold=1)
+    breaker.record_failure()
+    breaker.record_probe(True)
+    assert breaker.allow_request()
+    breaker.record_cancelled()
+    assert breaker.state == CircuitState.HALF_OPEN and breaker.allow_request()
+
+
+def test_probes_close_and_open():
+    breaker = CircuitBreaker('molt5', window=5, failure_threshold=1)
+    breaker.record_failure()
+    breaker.record_probe(True)
+    breaker.record_probe(True)
+    assert breaker.state == CircuitState.CLOSED
+    breaker.record_probe(False)
+    assert breaker.is_open
+
+
+def test_failed_probes_count_against_the_window_while_closed():
+    breaker = CircuitBreaker('molt5', window=5, failure_threshold=3)
+    breaker.record_probe(False)
+    breaker.record_probe(False)
+    assert breaker.state == CircuitState.CLOSED  # Transient probe timeouts
+    breaker.record_failure(0.1)
+    assert breaker.is_open
+
+
+def test_failed_probe_reopens_half_open():
+    breaker = CircuitBreaker('molt5', window=5, failure_threshold=3)
+    for _ in range(3):
+        breaker.record_failure()
+    breaker.record_probe(True)
+    breaker.record_probe(False)
+    assert breaker.is_open
@@ -0,0 +1,67 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import molecule_routes
+from services.chem_executor import ChemTaskError
+
+
+class ScriptedPool:
+    """Runs conformer tasks in-process; per-SMILES delays and failures"""
+
+    def __init__(self, delays=None, failures=()):
+        self.delays = delays or {}
+        self.failures = set(failures)
+        self.calls = []
+
+    async def run(self, fn, smiles, *args, timeout=None, **kwargs):
+        self.calls.append((smiles, args))
+        await asyncio.sleep(self.delays.get(smiles, 0))
+        if smiles in self.failures:
+            raise ChemTaskError(f"{fn.__name__}: worker died")
+        return fn(smiles, *args, **kwargs)
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(molecule_routes.router)
+    return TestClient(app)
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_results_stream_as_completed_with_their_index(client, monkeypatch):
+    pool = ScriptedPool(delays={'CCO': 0.2})
+    monkeypatch.setattr(molecule_routes, 'chem_executor', pool)
+
+    response = client.post('/molecules/3d/batch', json={
+        'smiles': ['CCO', 'c1ccccc1', 'CCN'], 'num_conformers': 3, 'return_all': True, 'seed': 7})
+    assert response.status_code == 200
+    lines = _lines(response)
+    assert lines[-1] == {'done': True, 'count': 3}
+    # The slow first molecule arrives last; each line says which input it answers
+    assert lines[-2]['index'] == 0 and lines[-2]['smiles'] == 'CCO'
+    assert sorted(line['index'] for line in lines[:-1]) == [0, 1, 2]
+    for line in lines[:-1]:
+        energies = [c['energy'] for c in line['conformers']]
+        assert energies == sorted(energies) and 1 <= len(energies) <= 3
+        assert all('molblock' in c for c in line['conformers'])
+    assert all(args[:2] == (3, 7) for _, args in pool.calls)
+
+
+def test_invalid_and_failed_molecules_do_not_fail_the_batch(client, monkeypatch):
+    monkeypatch.setattr(molecule_routes, 'chem_executor', ScriptedPool(failures={'CCN'}))
+
+    response = client.post('/molecules/3d/batch', json={
+        'smiles': ['CCO', 'not-a-smiles', 'CCN'], 'num_conformers': 2})
+    by_index = {line['index']: line for line in _lines(response) if 'index' in line}
+    assert by_index[0]['canonical_smiles'] == 'CCO' and len(by_index[0]['conformers']) == 1
+    assert by_index[1]['error'] == 'Invalid SMILES string'
+    assert 'worker died' in by_index[2]['error']
+    assert _lines(response)[-1] == {'done': True, 'count': 3}
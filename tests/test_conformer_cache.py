@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from services import conformer_cache as conformer_cache_module
+from services.conformer_cache import ConformerCache
+
+
+class InlinePool:
+    """Runs chem tasks in-process instead of the process pool, counting embeddings"""
+
+    def __init__(self):
+        self.embeds = 0
+        self.canonicalized = 0
+        self.gate = None  # When set, embeddings wait for it
+
+    async def run(self, fn, *args, timeout=None, **kwargs):
+        if fn.__name__ == 'embed_3d':
+            self.embeds += 1
+            if self.gate is not None:
+                await self.gate.wait()
+        else:
+            self.canonicalized += 1
+        return fn(*args, **kwargs)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = InlinePool()
+    monkeypatch.setattr(conformer_cache_module, 'chem_executor', pool)
+    return pool
+
+
+def test_key_covers_canonical_smiles_seed_and_rdkit_version(monkeypatch):
+    key = ConformerCache.make_key('CCO', 42)
+    assert ConformerCache.make_key('CCO', 42) == key
+    assert ConformerCache.make_key('CCO', 7) != key
+    assert ConformerCache.make_key('CCN', 42) != key
+    monkeypatch.setattr(conformer_cache_module.rdBase, 'rdkitVersion', '1999.01.1')
+    assert ConformerCache.make_key('CCO', 42) != key
+
+
+def test_spellings_of_one_molecule_share_an_entry(pool):
+    async def scenario():
+        cache = ConformerCache()
+        first = await cache.get_molblock('CCO')
+        return first, await cache.get_molblock('OCC'), await cache.get_molblock('OCC'), cache.stats()
+
+    first, other_spelling, again, stats = asyncio.run(scenario())
+    assert first == other_spelling == again
+    assert pool.embeds == 1
+    assert stats['memory_hits'] == 2 and stats['misses'] == 1
+    # The known spelling is mapped in-process; only new inputs go to the pool
+    assert pool.canonicalized == 2
+
+
+def test_other_seed_is_embedded_separately(pool):
+    async def scenario():
+        cache = ConformerCache()
+        await cache.get_molblock('CCO', seed=1)
+        await cache.get_molblock('CCO', seed=2)
+        return cache.stats()
+
+    assert asyncio.run(scenario())['misses'] == 2
+    assert pool.embeds == 2
+
+
+def test_invalid_smiles_is_not_embedded(pool):
+    async def scenario():
+        cache = ConformerCache()
+        return await cache.get_molblock('not-a-smiles'), cache.stats()
+
+    molblock, stats = asyncio.run(scenario())
+    assert molblock is None
+    assert pool.embeds == 0 and stats['misses'] == 0
+
+
+def test_memory_miss_falls_through_to_mongo(pool):
+    mongomock_motor = pytest.importorskip('mongomock_motor')
+
+    async def scenario():
+        db = mongomock_motor.AsyncMongoMockClient()['test']
+        writer = ConformerCache()
+        await writer.attach(db)
+        embedded = await writer.get_molblock('c1ccccc1O')
+
+        reader = ConformerCache()  # Fresh process: empty LRU, same collection
+        await reader.attach(db)
+        loaded = await reader.get_molblock('Oc1ccccc1')
+        again = await reader.get_molblock('Oc1ccccc1')
+        doc = await db.conformer_cache.find_one({})
+        return embedded, loaded, again, reader.stats(), doc
+
+    embedded, loaded, again, stats, doc = asyncio.run(scenario())
+    assert loaded == again == embedded
+    assert pool.embeds == 1
+    assert stats['persistent_hits'] == 1 and stats['memory_hits'] == 1 and stats['misses'] == 0
+    assert doc['canonical_smiles'] == 'Oc1ccccc1' and doc['seed'] == 42
+    assert doc['rdkit_version'] == conformer_cache_module.rdBase.rdkitVersion
+    assert doc['expires_at'] is not None
+
+
+def test_concurrent_misses_share_one_embedding(pool):
+    async def scenario():
+        cache = ConformerCache()
+        pool.gate = asyncio.Event()
+        waiters = [asyncio.create_task(cache.get_molblock(smiles)) for smiles in ('CCO', 'OCC', 'CCO')]
+        await asyncio.sleep(0.01)
+        pool.gate.set()
+        return await asyncio.gather(*waiters), cache.stats()
+
+    molblocks, stats = asyncio.run(scenario())
+    assert len(set(molblocks)) == 1 and molblocks[0]
+    assert pool.embeds == 1
+    assert stats['coalesced'] == 2
@@ -0,0 +1,157 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pymongo.errors import OperationFailure
+
+from routes import diagnostics_routes
+from services import db_indexes
+from services.db_indexes import QueryPlan, explain_query, explain_query_plans
+
+IXSCAN = {'stage': 'LIMIT', 'inputStage': {
+    'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN', 'indexName': 'created_at_-1_id_-1'}}}
+COLLSCAN_SORT = {'stage': 'SORT', 'sortPattern': {'updated_at': -1}, 'inputStage': {'stage': 'COLLSCAN'}}
+OR_MERGE = {'stage': 'SUBPLAN', 'inputStage': {'stage': 'LIMIT', 'inputStage': {'stage': 'FETCH', 'inputStage': {
+    'stage': 'SORT_MERGE', 'inputStages': [
+        {'stage': 'IXSCAN', 'indexName': 'created_at_-1_id_-1'},
+        {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN', 'indexName': 'id_1'}},
+    ]}}}}
+
+
+def _explained(winning_plan):
+    return {'queryPlanner': {'winningPlan': winning_plan}, 'ok': 1.0}
+
+
+class FakeCursor:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def sort(self, sort):
+        self.collection.calls[-1]['sort'] = sort
+        return self
+
+    def limit(self, limit):
+        self.collection.calls[-1]['limit'] = limit
+        return self
+
+    async def explain(self):
+        if isinstance(self.collection.explained, Exception):
+            raise self.collection.explained
+        return self.collection.explained
+
+
+class FakeCollection:
+    """Answers explain() with a canned document and records the query shape"""
+
+    def __init__(self, explained):
+        self.explained = explained
+        self.calls = []
+
+    def find(self, filter, projection=None):
+        self.calls.append({'filter': filter, 'projection': projection})
+        return FakeCursor(self)
+
+
+class FakeDb(dict):
+    def __missing__(self, name):
+        return self.setdefault(name, FakeCollection(_explained(IXSCAN)))
+
+
+def _explain(winning_plan, query=None):
+    db = FakeDb(things=FakeCollection(_explained(winning_plan)))
+    query = query or QueryPlan('things', 'things', {'a': 1})
+    return asyncio.run(explain_query(db, query)), db['things']
+
+
+def test_index_scan_is_clean():
+    plan, _ = _explain(IXSCAN)
+    assert plan['stages'] == ['LIMIT', 'FETCH', 'IXSCAN']
+    assert plan['indexes'] == ['created_at_-1_id_-1']
+    assert not plan['collscan'] and not plan['blocking_sort']
+
+
+def test_collection_scan_and_in_memory_sort_are_flagged():
+    plan, _ = _explain(COLLSCAN_SORT)
+    assert plan['stages'] == ['SORT', 'COLLSCAN']
+    assert plan['indexes'] == []
+    assert plan['collscan'] and plan['blocking_sort']
+
+
+def test_sort_on_an_index_scan_is_a_blocking_sort_only():
+    plan, _ = _explain({'stage': 'SORT', 'inputStage': {'stage': 'FETCH', 'inputStage': {
+        'stage': 'IXSCAN', 'indexName': 'status_1'}}})
+    assert plan['blocking_sort'] and not plan['collscan']
+
+
+def test_nested_input_stages_are_walked():
+    plan, _ = _explain(OR_MERGE)
+    assert plan['stages'] == ['SUBPLAN', 'LIMIT', 'FETCH', 'SORT_MERGE', 'IXSCAN', 'FETCH', 'IXSCAN']
+    assert plan['indexes'] == ['created_at_-1_id_-1', 'id_1']
+    assert not plan['collscan'] and not plan['blocking_sort']  # SORT_MERGE is not an in-memory sort
+
+
+def test_collection_scan_inside_an_or_branch_is_found():
+    plan, _ = _explain({'stage': 'OR', 'inputStages': [
+        {'stage': 'IXSCAN', 'indexName': 'id_1'}, {'stage': 'COLLSCAN'}]})
+    assert plan['collscan']
+
+
+def test_slot_based_plans_use_the_query_plan_tree():
+    plan, _ = _explain({'queryPlan': COLLSCAN_SORT, 'slotBasedPlan': {'slots': '...', 'stages': '[1] sort ...'}})
+    assert plan['stages'] == ['SORT', 'COLLSCAN']
+    assert plan['collscan'] and plan['blocking_sort']
+
+
+def test_every_shard_plan_is_walked():
+    plan, _ = _explain({'stage': 'SHARD_MERGE', 'shards': [
+        {'shardName': 's0', 'winningPlan': {'queryPlan': IXSCAN}},
+        {'shardName': 's1', 'winningPlan': {'stage': 'COLLSCAN'}},
+    ]})
+    assert plan['stages'] == ['SHARD_MERGE', 'LIMIT', 'FETCH', 'IXSCAN', 'COLLSCAN']
+    assert plan['collscan']
+
+
+def test_missing_collection_is_not_a_scan():
+    plan, _ = _explain({'stage': 'EOF'})
+    assert plan['stages'] == ['EOF'] and not plan['collscan']
+
+
+def test_query_shape_is_passed_to_find():
+    _, collection = _explain(IXSCAN, QueryPlan('things', 'things', {'a': 1}, [('b', -1)], 5))
+    assert collection.calls == [{'filter': {'a': 1}, 'projection': {'_id': 0}, 'sort': [('b', -1)], 'limit': 5}]
+
+
+def test_summary_flags_scans_sorts_and_errors(monkeypatch):
+    monkeypatch.setattr(db_indexes, 'QUERY_PLANS', [
+        QueryPlan('indexed', 'history', {}),
+        QueryPlan('scanned', 'experiments', {}),
+        QueryPlan('broken', 'jobs', {}),
+    ])
+    db = FakeDb(
+        history=FakeCollection(_explained(IXSCAN)),
+        experiments=FakeCollection(_explained(COLLSCAN_SORT)),
+        jobs=FakeCollection(OperationFailure('not authorized')),
+    )
+
+    summary = asyncio.run(explain_query_plans(db))
+    assert not summary['ok']
+    assert summary['collscans'] == ['scanned']
+    assert summary['blocking_sorts'] == ['scanned']
+    assert summary['plans'][2] == {'query': 'broken', 'collection': 'jobs', 'error': 'not authorized'}
+
+
+def test_summary_is_ok_when_every_query_uses_an_index():
+    summary = asyncio.run(explain_query_plans(FakeDb()))
+    assert summary['ok'] and summary['collscans'] == []
+    assert len(summary['plans']) == len(db_indexes.QUERY_PLANS)
+
+
+def test_query_plans_route():
+    app = FastAPI()
+    app.include_router(diagnostics_routes.router)
+    app.dependency_overrides[diagnostics_routes.get_db] = lambda: FakeDb(
+        experiments=FakeCollection(_explained(COLLSCAN_SORT)))
+
+    body = TestClient(app).get('/diagnostics/query-plans').json()
+    assert not body['ok']
+    assert body['collscans'] == ['GET /experiments', 'experiment by id']
@@ -0,0 +1,85 @@
+import asyncio
+import sys
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import molecule_routes
+from services import descriptor_service
+from services.descriptor_service import DESCRIPTOR_COLUMNS, compute_descriptors
+
+
+class InlinePool:
+    """Maps chem tasks in-process instead of the process pool, recording the chunks"""
+
+    def __init__(self):
+        self.chunks = []
+
+    async def map(self, fn, items, **kwargs):
+        self.chunks.extend(items)
+        return [fn(item, **kwargs) for item in items]
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = InlinePool()
+    monkeypatch.setattr(descriptor_service, 'chem_executor', pool)
+    return pool
+
+
+@pytest.fixture
+def client(pool):
+    app = FastAPI()
+    app.include_router(molecule_routes.router)
+    app.dependency_overrides[molecule_routes.get_db] = lambda: None
+    return TestClient(app)
+
+
+SMILES = ['CCO', 'c1ccccc1', 'not-a-smiles', 'CC(=O)Oc1ccccc1C(=O)O', 'CCN']
+
+
+def test_chunks_are_joined_back_in_input_order(pool):
+    table = asyncio.run(compute_descriptors(SMILES, chunk_size=2))
+    assert pool.chunks == [SMILES[0:2], SMILES[2:4], SMILES[4:]]
+    assert table['smiles'] == SMILES
+    assert table['canonical_smiles'][1] == 'c1ccccc1'
+    assert table['molecular_formula'][3] == 'C9H8O4'
+
+
+def test_table_is_columnar_and_aligned(pool):
+    table = asyncio.run(compute_descriptors(SMILES, chunk_size=3))
+    assert tuple(table) == DESCRIPTOR_COLUMNS
+    assert {len(values) for values in table.values()} == {len(SMILES)}
+
+
+def test_invalid_smiles_rows_are_marked_not_dropped(pool):
+    table = asyncio.run(compute_descriptors(SMILES))
+    assert table['valid'] == [True, True, False, True, True]
+    assert all(table[name][2] is None for name in DESCRIPTOR_COLUMNS[2:])
+    assert table['lipinski_violations'][3] == 0
+
+
+def test_json_response_shape(client):
+    response = client.post('/molecules/descriptors', json={'smiles': ['CCO', 'xyz']})
+    assert response.status_code == 200
+    body = response.json()
+    assert body['count'] == 2
+    assert body['columns']['valid'] == [True, False]
+    assert body['columns']['molecular_weight'][1] is None
+
+
+@pytest.mark.parametrize('fmt', ['arrow', 'parquet'])
+def test_binary_formats_answer_501_without_pyarrow(client, monkeypatch, fmt):
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)  # Import fails even if installed
+    response = client.post('/molecules/descriptors', json={'smiles': ['CCO'], 'format': fmt})
+    assert response.status_code == 501
+    assert 'pyarrow' in response.json()['detail']
+
+
+def test_arrow_stream_round_trips(client):
+    pa = pytest.importorskip('pyarrow')
+    response = client.post('/molecules/descriptors', json={'smiles': ['CCO', 'xyz'], 'format': 'arrow'})
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.column_names == list(DESCRIPTOR_COLUMNS)
+    assert table.column('valid').to_pylist() == [True, False]
@@ -0,0 +1,172 @@
+import numpy as np
+import pytest
+
+from services import chem_tasks, docking_grid
+from services.docking_grid import (
+    ATOM_PARAMS, COULOMB, DESOLV_SIGMA, DESOLV_WEIGHT, ELEC_WEIGHT, OUT_OF_GRID_PENALTY, PROBE_TYPES,
+    STERIC_CAP, VDW_WEIGHT, GridMaps, build_grid_maps, dock_rigid, ligand_parameters, score_poses,
+)
+
+CENTER = (10.0, -5.0, 2.0)
+
+
+def _maps(values, spacing=0.5, origin=(1.0, 2.0, 3.0)):
+    """Maps holding `values` in every map (steric for each probe type)"""
+    values = np.asarray(values, dtype=np.float32)
+    return GridMaps(origin=np.asarray(origin, dtype=np.float32), spacing=spacing,
+                    steric=np.stack([values] * len(PROBE_TYPES)), electrostatic=values,
+                    volume=values, solvation=values)
+
+
+def _probe(element='C', charge=1.0):
+    return ligand_parameters([element], [charge])
+
+
+def _at(maps, point):
+    """Steric and electrostatic (unit charge) terms of one atom at `point`"""
+    terms = score_poses(maps, _probe(), np.asarray([[point]], dtype=np.float32))
+    return terms['van_der_waals'][0], terms['electrostatic'][0]
+
+
+def test_interpolation_hits_node_values():
+    values = np.random.default_rng(0).normal(size=(4, 5, 6)).astype(np.float32)
+    maps = _maps(values)
+    for index in [(0, 0, 0), (1, 2, 3), (2, 4, 1), (3, 4, 5)]:
+        point = maps.origin + maps.spacing * np.array(index)
+        vdw, elec = _at(maps, point)
+        assert vdw == pytest.approx(values[index], abs=1e-5)
+        assert elec == pytest.approx(values[index], abs=1e-5)
+
+
+def test_interpolation_averages_at_midpoints():
+    values = np.random.default_rng(1).normal(size=(4, 4, 4)).astype(np.float32)
+    maps = _maps(values)
+    edge = maps.origin + maps.spacing * np.array([1.5, 2, 1])
+    assert _at(maps, edge)[1] == pytest.approx((values[1, 2, 1] + values[2, 2, 1]) / 2, abs=1e-5)
+    face = maps.origin + maps.spacing * np.array([0, 1.5, 2.5])
+    assert _at(maps, face)[1] == pytest.approx(values[0, 1:3, 2:4].mean(), abs=1e-5)
+    cell = maps.origin + maps.spacing * np.array([2.5, 0.5, 1.5])
+    assert _at(maps, cell)[1] == pytest.approx(values[2:4, 0:2, 1:3].mean(), abs=1e-5)
+
+
+def test_interpolation_is_exact_for_linear_fields():
+    axis = np.arange(5, dtype=np.float32)
+    x, y, z = np.meshgrid(axis, axis, axis, indexing='ij')
+    maps = _maps(0.5 * x - 2 * y + 3 * z + 1, spacing=1.0, origin=(0, 0, 0))
+    for point in [(0.3, 1.7, 2.2), (3.9, 0.1, 0.5), (2.25, 2.75, 3.125)]:
+        expected = 0.5 * point[0] - 2 * point[1] + 3 * point[2] + 1
+        assert _at(maps, point)[1] == pytest.approx(expected, abs=1e-4)
+
+
+def test_atoms_outside_the_grid_get_the_penalty_only():
+    maps = _maps(np.ones((3, 3, 3)))
+    vdw, elec = _at(maps, maps.origin - 0.1)
+    assert vdw == OUT_OF_GRID_PENALTY and elec == 0.0
+
+
+def _single_atom_maps(element='C', charge=0.0):
+    return build_grid_maps(np.asarray([CENTER], dtype=np.float32), [element],
+                           np.asarray([charge], dtype=np.float32), CENTER, size=20.0, spacing=1.0)
+
+
+def _node(maps, offset):
+    """Grid index of CENTER + offset"""
+    return tuple(np.round((np.asarray(CENTER) + offset - maps.origin) / maps.spacing).astype(int))
+
+
+def test_steric_map_follows_the_12_6_potential():
+    maps = _single_atom_maps('C')
+    carbon = PROBE_TYPES.index('C')
+    radius, eps = ATOM_PARAMS['C'][:2]  # Same element: Rij = R, eps_ij = eps
+
+    # At the equilibrium distance the well depth is -eps (weighted)
+    assert maps.steric[carbon][_node(maps, (4, 0, 0))] == pytest.approx(-VDW_WEIGHT * eps, rel=1e-4)
+    r = 5.0
+    expected = VDW_WEIGHT * (eps * radius ** 12 / r ** 12 - 2 * eps * radius ** 6 / r ** 6)
+    assert maps.steric[carbon][_node(maps, (3, 4, 0))] == pytest.approx(expected, rel=1e-4)
+    assert maps.steric[carbon][_node(maps, (1, 0, 0))] == STERIC_CAP  # Clash
+    assert maps.steric[carbon][_node(maps, (9, 0, 0))] == 0.0  # Beyond the cutoff
+
+
+def test_electrostatics_attract_opposite_charges():
+    maps = _single_atom_maps('N', charge=1.0)  # e.g. LYS NZ
+    node = _node(maps, (0, 0, 4))
+    assert maps.electrostatic[node] == pytest.approx(ELEC_WEIGHT * COULOMB / 4 / 16, rel=1e-4)
+
+    point = np.asarray([[np.asarray(CENTER) + (0, 0, 4)]], dtype=np.float32)
+    anion = score_poses(maps, _probe('O', -0.5), point)['electrostatic'][0]
+    cation = score_poses(maps, _probe('N', 0.5), point)['electrostatic'][0]
+    assert anion < 0 < cation
+    assert anion == pytest.approx(-cation, rel=1e-5)
+
+
+def test_desolvation_is_gaussian_in_distance():
+    maps = _single_atom_maps('C')
+    r = 3.0
+    gauss = np.exp(-r ** 2 / (2 * DESOLV_SIGMA ** 2))
+    node = _node(maps, (0, 3, 0))
+    assert maps.volume[node] == pytest.approx(ATOM_PARAMS['C'][2] * gauss, rel=1e-4)
+    assert maps.solvation[node] == pytest.approx(ATOM_PARAMS['C'][3] * gauss, rel=1e-4)
+
+    # Two buried carbons desolvate favourably (both solvation parameters negative)
+    point = np.asarray([[np.asarray(CENTER) + (0, 3, 0)]], dtype=np.float32)
+    desolv = score_poses(maps, _probe('C', 0.0), point)['desolvation'][0]
+    expected = DESOLV_WEIGHT * 2 * ATOM_PARAMS['C'][2] * ATOM_PARAMS['C'][3] * gauss
+    assert desolv == pytest.approx(expected, rel=1e-4) and desolv < 0
+
+
+def test_parse_pdb_keeps_protein_and_ions_only():
+    pdb = '\n'.join([
+        'ATOM      1  N   ALA A   1       1.000   2.000   3.000  1.00  0.00           N',
+        'ATOM      2  NZ  LYS A   2       4.000   5.000   6.000  1.00  0.00           N',
+        'HETATM    3  O   HOH A 101       7.000   8.000   9.000  1.00  0.00           O',
+        'HETATM    4 ZN    ZN A 102       0.500   0.500   0.500  1.00  0.00          ZN',
+        'HETATM    5  C1  LIG A 103       1.500   1.500   1.500  1.00  0.00           C',
+    ])
+    coords, elements, charges = docking_grid.parse_pdb_atoms(pdb)
+    assert elements == ['N', 'N', 'Zn']
+    assert charges.tolist() == [-0.25, 1.0, 2.0]
+    assert coords[1].tolist() == [4.0, 5.0, 6.0]
+
+
+def _pocket_maps():
+    """Ring of carbons around CENTER with a charged nitrogen on one side"""
+    angles = np.linspace(0, 2 * np.pi, 10, endpoint=False)
+    ring = np.stack([4.5 * np.cos(angles), 4.5 * np.sin(angles), np.zeros_like(angles)], axis=1)
+    coords = np.vstack([ring, [[0, 0, -4]]]) + np.asarray(CENTER)
+    elements = ['C'] * len(ring) + ['N']
+    charges = np.asarray([0.0] * len(ring) + [1.0], dtype=np.float32)
+    return build_grid_maps(coords.astype(np.float32), elements, charges, CENTER, size=16.0, spacing=0.5)
+
+
+def test_docking_is_deterministic_and_finds_the_pocket():
+    maps = _pocket_maps()
+    coords = np.array([[0, 0, 0], [1.5, 0, 0], [2.2, 1.2, 0]], dtype=np.float32) + 20  # Far from the site
+    ligand = ligand_parameters(['C', 'C', 'O'], [0.0, 0.1, -0.4])
+    rotations = docking_grid.random_rotations(24)
+    offsets = docking_grid.translation_offsets(2.0, 1.0)
+
+    first = dock_rigid(maps, ligand, coords, CENTER, rotations, offsets, refine_rounds=2, torsions=1)
+    second = dock_rigid(maps, ligand, coords, CENTER, rotations, offsets, refine_rounds=2, torsions=1)
+    assert first['affinity'] == second['affinity']
+    assert first['terms'] == second['terms']
+    assert np.array_equal(first['pose']['rotation'], second['pose']['rotation'])
+
+    assert first['affinity'] < 0
+    assert first['terms']['torsional'] == pytest.approx(docking_grid.TORSION_WEIGHT)
+    assert first['affinity'] == pytest.approx(sum(first['terms'].values()))
+    posed = docking_grid.apply_pose(coords, first['pose'])
+    assert np.linalg.norm(posed.mean(axis=0) - np.asarray(CENTER)) < 3.0
+    assert first['poses_scored'] == len(rotations) * len(offsets) * 3
+
+
+def test_docking_an_embedded_ligand_twice_gives_the_same_result(tmp_path):
+    _pocket_maps().save(str(tmp_path))
+    molblock = chem_tasks.embed_3d('CC(=O)O', seed=42)
+    search = {'rotations': 16, 'translation_range': 1.0, 'translation_step': 1.0, 'refine_rounds': 1}
+
+    first = chem_tasks.dock_molblock(molblock, str(tmp_path), CENTER, search)
+    chem_tasks._target_grids.clear()  # Reload the maps, as a fresh worker would
+    second = chem_tasks.dock_molblock(chem_tasks.embed_3d('CC(=O)O', seed=42), str(tmp_path), CENTER, search)
+    assert first == second
+    assert first['affinity'] < 0
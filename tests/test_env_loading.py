@@ -0,0 +1,23 @@
+import ast
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent / 'backend'
+
+
+def _first_line(tree, predicate):
+    return min(node.lineno for node in ast.walk(tree) if predicate(node))
+
+
+def _is_load_dotenv(node):
+    return isinstance(node, ast.Call) and getattr(node.func, 'id', None) == 'load_dotenv'
+
+
+def _imports_app_modules(node):
+    return isinstance(node, ast.ImportFrom) and (node.module or '').split('.')[0] in ('routes', 'services')
+
+
+def test_env_is_loaded_before_services_are_imported():
+    # Service settings are module-level constants read at import, so .env must be loaded first
+    for path in [BACKEND / 'server.py', *sorted((BACKEND / 'scripts').glob('*.py'))]:
+        tree = ast.parse(path.read_text())
+        assert _first_line(tree, _is_load_dotenv) < _first_line(tree, _imports_app_modules), path.name
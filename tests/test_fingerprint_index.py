@@ -0,0 +1,52 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from services import fingerprint_index
+from services.fingerprint_index import FingerprintIndex
+
+
+def _doc(record_id, smiles='CCO'):
+    return {'id': record_id, 'results': [{'smiles': smiles, 'model_name': 'molt5'}]}
+
+
+class FlakyPool:
+    """Stands in for the chem pool: fails the first `failures` maps"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = 0
+
+    async def map(self, fn, items, **kwargs):
+        self.calls += 1
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError('pool unavailable')
+        return [(np.ones(len(chunk), dtype=np.uint64).tobytes(), [True] * len(chunk)) for chunk in items]
+
+
+def test_failed_fingerprinting_leaves_records_unindexed(monkeypatch):
+    pool = FlakyPool(failures=1)
+    monkeypatch.setattr(fingerprint_index, 'chem_executor', pool)
+    index = FingerprintIndex(64, fingerprint_task=None)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(index.add_docs([_doc('r1')]))
+    assert len(index) == 0
+
+    asyncio.run(index.add_docs([_doc('r1')]))  # Saved again: indexed this time
+    assert len(index) == 1 and index.record_ids == ['r1']
+    asyncio.run(index.add_docs([_doc('r1')]))
+    assert len(index) == 1 and pool.calls == 2
+
+
+def test_concurrent_adds_of_one_record_index_it_once(monkeypatch):
+    monkeypatch.setattr(fingerprint_index, 'chem_executor', FlakyPool())
+    index = FingerprintIndex(64, fingerprint_task=None)
+
+    async def scenario():
+        await asyncio.gather(index.add_docs([_doc('r1')]), index.add_docs([_doc('r1')]))
+
+    asyncio.run(scenario())
+    assert index.record_ids == ['r1']
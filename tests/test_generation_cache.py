@@ -0,0 +1,108 @@
+import asyncio
+from types import SimpleNamespace
+
+from services.generation_cache import GenerationCache
+from services.model_clients import ModelResult
+
+OPTIONS = {'num_beams': 5, 'num_return_sequences': 1}
+
+
+def _result(smiles='CCO', version='large', is_mock=False):
+    return ModelResult(smiles=smiles, confidence=0.9, model_name='molt5', model_version=version,
+                       execution_time_ms=10, is_mock=is_mock)
+
+
+def test_hit_for_same_prompt_options_and_version():
+    async def scenario():
+        cache = GenerationCache()
+        await cache.put('Aspirin  analog', 'molt5', OPTIONS, _result(), 'v1')
+        return (
+            await cache.get('aspirin analog', 'molt5', OPTIONS, 'v1'),
+            await cache.get('Aspirin analog', 'molt5', OPTIONS, 'v1'),
+            await cache.get('Aspirin analog', 'molt5', {**OPTIONS, 'num_beams': 6}, 'v1'),
+            cache.stats(),
+        )
+
+    other_case, hit, other_options, stats = asyncio.run(scenario())
+    assert other_case is None  # Prompts are normalized for whitespace, not case
+    assert hit.smiles == 'CCO'
+    assert other_options is None
+    assert stats['memory_hits'] == 1 and stats['misses'] == 2
+
+
+def test_result_without_reported_version_is_not_stored():
+    async def scenario():
+        cache = GenerationCache()
+        await cache.put('aspirin', 'molt5', OPTIONS, _result(version='large'), None)
+        return cache.stats()['memory_entries'], await cache.get('aspirin', 'molt5', OPTIONS, None)
+
+    assert asyncio.run(scenario()) == (0, None)
+
+
+def test_mock_results_are_not_stored():
+    async def scenario():
+        cache = GenerationCache()
+        await cache.put('aspirin', 'molt5', OPTIONS, _result(is_mock=True), 'v1')
+        return await cache.get('aspirin', 'molt5', OPTIONS, 'v1')
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_new_model_version_rotates_keys():
+    async def scenario():
+        cache = GenerationCache()
+        await cache.put('aspirin', 'molt5', OPTIONS, _result('CCO'), 'v1')
+        await cache.put('aspirin', 'molt5', OPTIONS, _result('CCC'), 'v2')
+        return (
+            (await cache.get('aspirin', 'molt5', OPTIONS, 'v2')).smiles,
+            cache.stats()['version_changes'],
+        )
+
+    assert asyncio.run(scenario()) == ('CCC', 1)
+
+
+def test_lru_evicts_least_recently_used_and_expired_entries_miss():
+    async def scenario():
+        cache = GenerationCache(max_entries=2)
+        for prompt in ('a', 'b'):
+            await cache.put(prompt, 'molt5', OPTIONS, _result(), 'v1')
+        await cache.get('a', 'molt5', OPTIONS, 'v1')
+        await cache.put('c', 'molt5', OPTIONS, _result(), 'v1')
+        evicted = await cache.get('b', 'molt5', OPTIONS, 'v1')
+
+        expired = GenerationCache(ttl_seconds=-1)
+        await expired.put('a', 'molt5', OPTIONS, _result(), 'v1')
+        return evicted, await cache.get('a', 'molt5', OPTIONS, 'v1'), await expired.get('a', 'molt5', OPTIONS, 'v1')
+
+    evicted, kept, expired = asyncio.run(scenario())
+    assert evicted is None and kept is not None and expired is None
+
+
+def test_request_path_stores_under_the_version_lookups_use(monkeypatch):
+    from services import molecule_service
+
+    cache = GenerationCache()
+    monkeypatch.setattr(molecule_service, 'generation_cache', cache)
+
+    class StubClient:
+        model_name = 'molt5'
+        replica_urls = ['http://molt5']
+        reported_version = None
+
+        def is_deterministic(self, options):
+            return True
+
+        async def generate(self, prompt, num_candidates=1):
+            return _result(version='large')  # Registry default: the server reported no version
+
+    async def scenario():
+        client = StubClient()
+        await molecule_service._request_model(client, 'aspirin', OPTIONS, 1, batched=False)
+        unversioned = cache.stats()['memory_entries']
+        client.reported_version = 'v7'
+        await molecule_service._request_model(client, 'aspirin', OPTIONS, 1, batched=False)
+        return unversioned, await cache.get('aspirin', 'molt5', OPTIONS, client.reported_version)
+
+    unversioned, hit = asyncio.run(scenario())
+    assert unversioned == 0
+    assert hit is not None
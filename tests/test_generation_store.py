@@ -0,0 +1,222 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from bson.errors import InvalidDocument
+from pymongo.errors import AutoReconnect
+
+from models import GenerationRecord, SingleModelResult
+from services import generation_store
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = []
+
+    async def insert_one(self, doc):
+        self.docs.append(doc)
+
+    async def insert_many(self, docs, ordered=True):
+        self.docs.extend(docs)
+
+    async def bulk_write(self, updates, ordered=True):
+        self.docs.extend(updates)
+
+
+def _db():
+    return SimpleNamespace(generation_history=FakeCollection(), experiments=FakeCollection())
+
+
+def _record(experiment_id=None, **fields):
+    result = SingleModelResult(model_name='molt5', smiles='CCO', confidence=0.9, execution_time=0.1)
+    return GenerationRecord(prompt='ethanol', results=[result], experiment_id=experiment_id, **fields)
+
+
+def test_save_record_does_not_wait_for_listeners(monkeypatch):
+    seen = []
+
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def slow_listener(docs):
+            await gate.wait()
+            seen.extend(doc['id'] for doc in docs)
+
+        async def failing_listener(docs):
+            raise RuntimeError('index down')
+
+        monkeypatch.setattr(generation_store, '_listeners', [slow_listener, failing_listener])
+        doc = await asyncio.wait_for(generation_store.save_record(_db(), _record()), 1)
+        assert seen == []  # Saved before the listener finished
+        gate.set()
+        await asyncio.gather(*generation_store._listener_tasks)
+        return doc
+
+    doc = asyncio.run(scenario())
+    assert seen == [doc['id']]
+    assert not generation_store._listener_tasks
+
+
+def _mongo():
+    return pytest.importorskip('mongomock_motor').AsyncMongoMockClient()['test']
+
+
+class FlakyExperiments:
+    """Applies the first bulk_write, then fails it as a lost connection would"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.failures = 1
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    async def bulk_write(self, updates, ordered=True):
+        result = await self.collection.bulk_write(updates, ordered=ordered)
+        if self.failures:
+            self.failures -= 1
+            raise AutoReconnect('connection lost after the write was applied')
+        return result
+
+
+def test_retried_flush_counts_each_run_once(monkeypatch):
+    monkeypatch.setattr(generation_store, 'HISTORY_RETRY_BACKOFF_SECONDS', (0.01, 0.01))
+    monkeypatch.setattr(generation_store, '_listeners', [])
+
+    async def scenario():
+        mongo = _mongo()
+        db = SimpleNamespace(generation_history=mongo.generation_history,
+                             experiments=FlakyExperiments(mongo.experiments))
+        await mongo.experiments.insert_one({'id': 'exp', 'run_count': 0})
+        writer = generation_store.HistoryWriter(enabled=True, flush_interval_ms=10)
+        writer.start(db)
+        await writer.submit([generation_store.record_to_doc(_record('exp')) for _ in range(3)])
+        await writer.stop()
+        return writer, await mongo.experiments.find_one({'id': 'exp'})
+
+    writer, experiment = asyncio.run(scenario())
+    assert writer.retries == 1 and writer.written == 3
+    assert experiment['run_count'] == 3
+
+
+class UnencodableHistory:
+    """Rejects documents marked `bad` client-side, as BSON encoding would (not a PyMongoError)"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    @staticmethod
+    def _check(docs):
+        if any(doc.get('bad') for doc in docs):
+            raise InvalidDocument('cannot encode object')
+
+    async def insert_many(self, docs, ordered=True):
+        self._check(docs)
+        return await self.collection.insert_many(docs, ordered=ordered)
+
+    async def insert_one(self, doc):
+        self._check([doc])
+        return await self.collection.insert_one(doc)
+
+
+def test_unencodable_record_is_dropped_not_retried(monkeypatch):
+    monkeypatch.setattr(generation_store, '_listeners', [])
+
+    async def scenario():
+        mongo = _mongo()
+        db = SimpleNamespace(generation_history=UnencodableHistory(mongo.generation_history),
+                             experiments=mongo.experiments)
+        await mongo.experiments.insert_one({'id': 'exp', 'run_count': 0})
+        writer = generation_store.HistoryWriter(enabled=True, flush_interval_ms=10)
+        writer.start(db)
+        docs = [generation_store.record_to_doc(_record('exp')) for _ in range(3)]
+        docs[1]['bad'] = True
+        await writer.submit(docs)
+        await asyncio.wait_for(writer.settle(docs[2]['id']), 1)
+        running = writer.running
+        await writer.submit([generation_store.record_to_doc(_record('exp'))])
+        await writer.stop()
+        return writer, running, await mongo.generation_history.count_documents({}), \
+            await mongo.experiments.find_one({'id': 'exp'})
+
+    writer, running, stored, experiment = asyncio.run(scenario())
+    assert running and writer.retries == 0
+    assert writer.rejected == 1 and writer.written == 3
+    assert stored == 3 and experiment['run_count'] == 3
+
+
+def test_dead_flusher_falls_back_to_direct_writes(monkeypatch):
+    monkeypatch.setattr(generation_store, '_listeners', [])
+    notified = []
+
+    def notify(docs):
+        notified.extend(docs)
+        if len(notified) == len(docs):
+            raise RuntimeError('listener bug')  # Kills the flusher after its first batch
+
+    monkeypatch.setattr(generation_store, '_notify', notify)
+
+    async def scenario():
+        db = _mongo()
+        writer = generation_store.HistoryWriter(enabled=True, flush_size=2, flush_interval_ms=60000, max_queued=3)
+        writer.start(db)
+        first = [generation_store.record_to_doc(_record()) for _ in range(3)]
+        await writer.submit(first)  # Two flush at once; the third stays queued
+        # Queue is full: this waits until the dead flusher's queue is written
+        late = [generation_store.record_to_doc(_record())]
+        await asyncio.wait_for(writer.submit(late), 1)
+        await asyncio.wait_for(writer.settle(first[2]['id']), 1)
+        running = writer.running
+        await writer.submit([generation_store.record_to_doc(_record())])
+        await writer.stop()
+        return running, writer, await db.generation_history.count_documents({})
+
+    running, writer, stored = asyncio.run(scenario())
+    assert not running and writer.queued == 0
+    assert stored == 5
+
+
+def test_save_during_drain_is_written(monkeypatch):
+    monkeypatch.setattr(generation_store, '_listeners', [])
+
+    async def scenario():
+        db = _mongo()
+        writer = generation_store.HistoryWriter(enabled=True, flush_interval_ms=60000, max_queued=1)
+        monkeypatch.setattr(generation_store, 'history_writer', writer)
+        writer.start(db)
+        await generation_store.save_record(db, _record())
+        # Passed the `running` check, now waiting for room in the full queue
+        late = asyncio.create_task(generation_store.save_record(db, _record()))
+        await asyncio.sleep(0)
+        await writer.stop()
+        await late
+        return await db.generation_history.count_documents({})
+
+    assert asyncio.run(scenario()) == 2
+
+
+def test_saves_maintain_run_count_and_reconcile_repairs_drift(monkeypatch):
+    monkeypatch.setattr(generation_store, '_listeners', [])
+
+    async def scenario():
+        db = _mongo()
+        await db.experiments.insert_many([{'id': 'exp', 'run_count': 0}, {'id': 'idle', 'run_count': 7}])
+        await generation_store.save_records(db, [_record('exp'), _record('exp'), _record()])
+        # Later than the batch even at MongoDB's millisecond precision
+        latest = await generation_store.save_record(db, _record('exp', created_at=datetime.now(timezone.utc) + timedelta(seconds=1)))
+        counted = await db.experiments.find_one({'id': 'exp'})
+        await db.experiments.update_one({'id': 'exp'}, {'$set': {'run_count': 40}})
+        summary = await generation_store.reconcile_experiment_stats(db)
+        return latest, counted, await db.experiments.find_one({'id': 'exp'}), \
+            await db.experiments.find_one({'id': 'idle'}), summary
+
+    latest, counted, repaired, idle, summary = asyncio.run(scenario())
+    assert counted['run_count'] == 3
+    assert counted['last_run']['id'] == latest['id'] and counted['last_run']['num_valid'] == 1
+    assert repaired['run_count'] == 3 and repaired['last_run']['id'] == latest['id']
+    assert idle['run_count'] == 0 and idle['last_run'] is None
+    assert summary == {'experiments_with_runs': 1, 'experiments_reset': 1}
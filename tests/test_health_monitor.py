@@ -0,0 +1,41 @@
+import asyncio
+
+from services.circuit_breaker import CircuitBreaker, CircuitState
+from services.health_monitor import HealthMonitor, ModelHealth
+
+
+class StubClient:
+    def __init__(self, healthy):
+        self.healthy = healthy
+        self.breaker = CircuitBreaker('molt5', window=5, failure_threshold=1)
+
+    async def health_check(self):
+        if isinstance(self.healthy, Exception):
+            raise self.healthy
+        return self.healthy
+
+
+def test_latency_ewma_and_failure_streak():
+    health = ModelHealth(history_size=3, alpha=0.5)
+    health.record(True, 100)
+    health.record(True, 200)
+    assert health.latency_ewma_ms == 150
+    health.record(False, 5000)  # Failed probes leave the EWMA alone
+    health.record(False, 5000)
+    summary = health.summary()
+    assert summary['healthy'] is False and summary['consecutive_failures'] == 2
+    assert summary['latency_ewma_ms'] == 150
+    assert summary['uptime_ratio'] == round(1 / 3, 3)  # Only the last 3 probes are kept
+
+
+def test_probes_run_for_every_model_and_drive_breakers():
+    clients = {'up': StubClient(True), 'down': StubClient(False), 'broken': StubClient(RuntimeError('dns'))}
+    clients['up'].breaker.record_failure()
+    monitor = HealthMonitor(clients)
+
+    asyncio.run(monitor.probe_all())
+    assert clients['up'].breaker.state == CircuitState.HALF_OPEN
+    assert clients['down'].breaker.is_open and clients['broken'].breaker.is_open
+    assert monitor.snapshot('up')['healthy'] is True
+    assert monitor.snapshot('broken')['healthy'] is False
+    assert monitor.snapshot('unknown')['healthy'] is None
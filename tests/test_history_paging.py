@@ -0,0 +1,97 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services.generation_store import decode_cursor, encode_cursor, history_page
+from services.history_export import export_history
+
+mongomock_motor = pytest.importorskip('mongomock_motor')
+
+T0 = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def _doc(record_id, created_at, experiment_id='exp'):
+    return {
+        'id': record_id, 'created_at': created_at, 'experiment_id': experiment_id, 'prompt': 'ethanol',
+        'results': [{'model_name': 'molt5', 'smiles': 'CCO', 'confidence': 0.9, 'is_valid': True}],
+    }
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2026, 3, 1, 8, 30, tzinfo=timezone.utc)
+    cursor = encode_cursor({'created_at': created_at, 'id': 'r-1'})
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == (created_at, 'r-1')
+
+
+@pytest.mark.parametrize('cursor', ['not-base64!', 'e30', 'WyJub3QgYSBkYXRlIiwgInIiXQ', 'WyIyMDI2LTAxLTAxIiwgMV0'])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_pages_cover_every_record_once_across_equal_timestamps():
+    async def scenario():
+        db = mongomock_motor.AsyncMongoMockClient()['test']
+        # Five records share one timestamp, so paging must break ties on id
+        docs = [_doc(f'r{i}', T0 if i < 5 else T0 + timedelta(minutes=i)) for i in range(12)]
+        await db.generation_history.insert_many(docs)
+        seen, cursor, pages = [], None, 0
+        while True:
+            page, cursor = await history_page(db, {'experiment_id': 'exp'}, 4, cursor)
+            seen.extend(doc['id'] for doc in page)
+            pages += 1
+            if cursor is None:
+                return seen, pages
+
+    seen, pages = asyncio.run(scenario())
+    assert pages == 3
+    assert seen == [f'r{i}' for i in range(11, 4, -1)] + ['r4', 'r3', 'r2', 'r1', 'r0']
+
+
+def test_csv_export_has_one_row_per_model_result():
+    async def scenario():
+        db = mongomock_motor.AsyncMongoMockClient()['test']
+        await db.generation_history.insert_many([_doc('r0', T0), _doc('r1', T0 + timedelta(minutes=1))])
+        return ''.join([chunk async for chunk in export_history(db, {}, 'csv')])
+
+    lines = asyncio.run(scenario()).splitlines()
+    assert lines[0].startswith('record_id,created_at')
+    assert [line.split(',')[0] for line in lines[1:]] == ['r1', 'r0']
+
+
+def test_pages_reach_unmigrated_string_timestamps():
+    async def scenario():
+        db = mongomock_motor.AsyncMongoMockClient()['test']
+        docs = [_doc(f'd{i}', T0 + timedelta(minutes=i)) for i in range(3)]
+        docs += [_doc(f's{i}', (T0 - timedelta(days=1, minutes=i)).isoformat()) for i in range(4)]
+        await db.generation_history.insert_many(docs)
+        seen, cursor = [], None
+        while True:
+            page, cursor = await history_page(db, {'experiment_id': 'exp'}, 2, cursor)
+            seen.extend(doc['id'] for doc in page)
+            if cursor is None:
+                return seen
+
+    # Dated documents first, then the string ones (newest first among each)
+    assert asyncio.run(scenario()) == ['d2', 'd1', 'd0', 's0', 's1', 's2', 's3']
+
+
+def test_string_timestamp_cursor_round_trip():
+    cursor = encode_cursor({'created_at': '2025-12-31T08:00:00', 'id': 'r-1'})
+    assert decode_cursor(cursor) == ('2025-12-31T08:00:00', 'r-1')
+
+
+def test_export_handles_string_timestamps():
+    async def scenario():
+        db = mongomock_motor.AsyncMongoMockClient()['test']
+        await db.generation_history.insert_many([_doc('r0', '2025-12-31T08:00:00'), _doc('r1', T0)])
+        csv_text = ''.join([chunk async for chunk in export_history(db, {}, 'csv')])
+        ndjson = ''.join([chunk async for chunk in export_history(db, {}, 'ndjson')])
+        return csv_text, ndjson
+
+    csv_text, ndjson = asyncio.run(scenario())
+    assert [line.split(',')[:2] for line in csv_text.splitlines()[1:]] == [
+        ['r1', T0.isoformat()], ['r0', '2025-12-31T08:00:00']]
+    assert '"2025-12-31T08:00:00"' in ndjson
@@ -0,0 +1,83 @@
+import asyncio
+
+from services import molecule_service
+from services.model_clients import ModelResult
+
+
+def _result(url, is_mock=False):
+    return ModelResult(smiles='CCO', confidence=0.9, model_name='molt5', model_version=url,
+                       execution_time_ms=1, is_mock=is_mock)
+
+
+class StubClient:
+    """Two replicas; each URL answers after its own delay"""
+
+    model_name = 'molt5'
+    replica_urls = ['http://slow', 'http://fast']
+
+    def __init__(self, delays, mock_urls=()):
+        self.delays = delays
+        self.mock_urls = mock_urls
+        self.cancelled = []
+
+    def pick_replica(self, exclude=None):
+        url = next(url for url in self.replica_urls if url != exclude)
+        return type('Replica', (), {'url': url})
+
+    def latency_quantile(self, q):
+        return 0.05
+
+    async def generate(self, prompt, num_candidates=1, api_url=None):
+        api_url = api_url or self.replica_urls[0]
+        try:
+            await asyncio.sleep(self.delays[api_url])
+        except asyncio.CancelledError:
+            self.cancelled.append(api_url)
+            raise
+        return _result(api_url, is_mock=api_url in self.mock_urls)
+
+
+def test_hedge_wins_when_primary_exceeds_p95():
+    client = StubClient({'http://slow': 5, 'http://fast': 0.01})
+
+    async def scenario():
+        result = await molecule_service._hedged_generate(client, 'aspirin', 1)
+        await asyncio.sleep(0)
+        return result
+
+    result = asyncio.run(scenario())
+    assert result.model_version == 'http://fast' and result.hedged
+    assert client.cancelled == ['http://slow']
+
+
+def test_fast_primary_is_not_hedged():
+    client = StubClient({'http://slow': 0.01, 'http://fast': 0.01})
+    result = asyncio.run(molecule_service._hedged_generate(client, 'aspirin', 1))
+    assert result.model_version == 'http://slow' and not result.hedged
+
+
+def test_mock_from_hedge_waits_for_real_primary():
+    client = StubClient({'http://slow': 0.2, 'http://fast': 0.01}, mock_urls=('http://fast',))
+    result = asyncio.run(molecule_service._hedged_generate(client, 'aspirin', 1))
+    assert result.model_version == 'http://slow' and not result.is_mock
+
+
+def test_calls_past_the_deadline_report_timed_out_or_cancelled(monkeypatch):
+    client = StubClient({'http://slow': 5, 'http://fast': 5})
+    client.build_options = lambda options, n: {'temperature': 0.7}
+    client.is_deterministic = lambda options: False
+
+    async def get_model_client(name):
+        return client
+
+    monkeypatch.setattr(molecule_service, 'get_model_client', get_model_client)
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        timed_out = await molecule_service.call_external_model('molt5', 'aspirin', deadline=loop.time() + 0.05)
+        cancelled = await molecule_service.call_external_model('molt5', 'caffeine', deadline=loop.time() - 1)
+        return timed_out, cancelled
+
+    timed_out, cancelled = asyncio.run(scenario())
+    assert timed_out.status == 'timed_out' and not timed_out.is_valid
+    assert cancelled.status == 'cancelled'
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from services import micro_batcher
+from services.micro_batcher import MicroBatcher
+from services.model_clients import ModelResult
+
+
+class StubClient:
+    model_name = 'molt5'
+
+    def __init__(self, error=None):
+        self.batches = []
+        self.error = error
+
+    async def generate_batch(self, texts, num_candidates=1):
+        self.batches.append((list(texts), num_candidates))
+        if self.error:
+            raise self.error
+        return [ModelResult(smiles=text, confidence=0.9, model_name='molt5', model_version='v1',
+                            execution_time_ms=1) for text in texts]
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    """Registered clients by name, as get_model_client returns them"""
+    registry = {}
+
+    async def get_model_client(name):
+        return registry[name]
+
+    monkeypatch.setattr(micro_batcher, 'get_model_client', get_model_client)
+    return registry
+
+
+def test_full_batch_flushes_without_lingering(clients):
+    client = clients['molt5'] = StubClient()
+
+    async def scenario():
+        batcher = MicroBatcher('molt5', max_batch_size=2, linger_ms=60000)
+        return await asyncio.wait_for(asyncio.gather(batcher.submit('a'), batcher.submit('b')), 1)
+
+    results = asyncio.run(scenario())
+    assert [result.smiles for result in results] == ['a', 'b']
+    assert client.batches == [(['a', 'b'], 1)]
+
+
+def test_partial_batch_flushes_after_linger(clients):
+    client = clients['molt5'] = StubClient()
+
+    async def scenario():
+        batcher = MicroBatcher('molt5', max_batch_size=16, linger_ms=20)
+        return await asyncio.gather(batcher.submit('a'), batcher.submit('b'), batcher.submit('c', num_candidates=3))
+
+    results = asyncio.run(scenario())
+    assert [result.smiles for result in results] == ['a', 'b', 'c']
+    # One batch per candidate count, as a batch shares its options
+    assert sorted(client.batches) == [(['a', 'b'], 1), (['c'], 3)]
+
+
+def test_batch_failure_reaches_every_caller(clients):
+    client = clients['molt5'] = StubClient(error=RuntimeError('model down'))
+
+    async def scenario():
+        batcher = MicroBatcher('molt5', max_batch_size=2, linger_ms=20)
+        return await asyncio.gather(batcher.submit('a'), batcher.submit('b'), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert len(client.batches) == 1
+
+
+def test_batches_follow_reloaded_clients_and_are_tracked(clients):
+    stale = clients['molt5'] = StubClient()
+
+    async def scenario():
+        batcher = MicroBatcher('molt5', max_batch_size=1, linger_ms=20)
+        await batcher.submit('a')
+        clients['molt5'] = StubClient()  # start_model_clients() replaced the client
+        await batcher.submit('b')
+        return batcher
+
+    batcher = asyncio.run(scenario())
+    assert stale.batches == [(['a'], 1)]
+    assert clients['molt5'].batches == [(['b'], 1)]
+    assert not batcher._tasks
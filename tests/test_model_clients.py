@@ -0,0 +1,174 @@
+import asyncio
+import time
+
+import pytest
+
+from services import model_clients
+from services.chem_executor import ChemTaskError
+from services.circuit_breaker import CircuitBreaker
+from services.model_clients import ModelClient
+from services.model_registry import MockSpec, ModelSpec
+
+
+class InlinePool:
+    """Runs chem tasks in-process instead of the process pool, recording them"""
+
+    def __init__(self):
+        self.calls = []
+        self.closed = False
+
+    async def run(self, fn, *args, timeout=None, **kwargs):
+        if self.closed:
+            raise ChemTaskError(f"{fn.__name__}: chem pool is shut down")
+        self.calls.append((fn.__name__, args))
+        return fn(*args, **kwargs)
+
+
+@pytest.fixture(autouse=True)
+def pool(monkeypatch):
+    pool = InlinePool()
+    monkeypatch.setattr(model_clients, 'chem_executor', pool)
+    return pool
+
+
+class FakeResponse:
+    def __init__(self, status, body=None):
+        self.status = status
+        self._body = body
+
+    async def json(self):
+        return self._body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """Answers POSTs with queued (status, body) pairs and counts every call"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.posts = []
+        self.gets = 0
+        self.closed = False
+
+    def post(self, url, json=None):
+        self.posts.append(url)
+        return FakeResponse(*self.responses.pop(0))
+
+    def get(self, url, timeout=None):
+        self.gets += 1
+        return FakeResponse(200, {'model_version': 'probed'})
+
+
+def _client(session, threshold=5):
+    spec = ModelSpec(name='molt5', urls=['http://model/api/text2mol'],
+                     mock=MockSpec(delay_seconds=(5, 5), version='mock'))
+    client = ModelClient(spec)
+    client._session = session
+    client.breaker = CircuitBreaker('molt5', window=10, failure_threshold=threshold)
+    return client
+
+
+def _ok(smiles='CCO', version='v1'):
+    return {'smiles': [smiles], 'confidence': [0.9], 'model_version': version}
+
+
+def test_open_breaker_falls_back_without_mock_delay():
+    session = FakeSession()
+    client = _client(session, threshold=1)
+    client.breaker.record_failure()
+
+    started = time.monotonic()
+    result = asyncio.run(client.generate('aspirin'))
+    assert time.monotonic() - started < 1  # The mock's simulated latency is 5s
+    assert result.is_mock
+    assert session.posts == []
+
+
+def test_current_version_never_probes():
+    session = FakeSession((200, {'success': True, 'data': _ok(version='v1')}))
+    client = _client(session)
+
+    async def scenario():
+        before = client.current_version()
+        await client.generate('aspirin')
+        return before, client.current_version()
+
+    assert asyncio.run(scenario()) == (None, 'v1')
+    assert session.gets == 0
+
+
+def test_batch_server_error_counts_against_breaker():
+    session = FakeSession((503, None))
+    client = _client(session, threshold=1)
+
+    results = asyncio.run(client.generate_batch(['aspirin', 'caffeine']))
+    assert client.breaker.is_open
+    assert session.posts == ['http://model/api/text2mol/batch']  # Singles fail fast
+    assert all(result.is_mock for result in results)
+
+
+def test_batch_takes_the_half_open_trial_slot():
+    session = FakeSession((200, {'success': True, 'data': [_ok('CCO'), _ok('CCN')]}))
+    client = _client(session, threshold=1)
+    client.breaker.record_failure()
+    client.breaker.record_probe(True)
+
+    async def scenario():
+        assert client.breaker.allow_request()  # Another caller holds the trial
+        return await client.generate_batch(['aspirin', 'caffeine'])
+
+    results = asyncio.run(scenario())
+    assert session.posts == []
+    assert all(result.is_mock for result in results)
+
+
+def test_batch_success_closes_half_open_breaker():
+    session = FakeSession((200, {'success': True, 'data': [_ok('CCO'), _ok('CCN')]}))
+    client = _client(session, threshold=1)
+    client.breaker.record_failure()
+    client.breaker.record_probe(True)
+
+    results = asyncio.run(client.generate_batch(['aspirin', 'caffeine']))
+    assert [result.smiles for result in results] == ['CCO', 'CCN']
+    assert client.breaker.state.value == 'closed'
+
+
+def test_missing_batch_endpoint_falls_back_to_single_calls():
+    session = FakeSession(
+        (404, None),
+        (200, {'success': True, 'data': _ok('CCO')}),
+        (200, {'success': True, 'data': _ok('CCO')}),
+    )
+    client = _client(session, threshold=1)
+
+    results = asyncio.run(client.generate_batch(['aspirin', 'caffeine']))
+    assert not client.breaker.is_open and client._batch_supported is False
+    assert [result.smiles for result in results] == ['CCO', 'CCO']
+
+
+def test_batch_candidates_are_canonicalized_in_one_pool_task(pool):
+    body = {'success': True, 'data': [
+        {'smiles': ['OCC', 'CCO', 'C1CC'], 'confidence': [0.5, 0.9, 0.95], 'model_version': 'v1'},
+        {'smiles': ['CCN'], 'confidence': [0.8], 'model_version': 'v1'},
+    ]}
+    client = _client(FakeSession((200, body)))
+
+    first, second = asyncio.run(client.generate_batch(['ethanol', 'ethylamine'], num_candidates=5))
+    assert pool.calls == [('canonicalize', (['OCC', 'CCO', 'C1CC', 'CCN'],))]
+    # Spellings of one molecule collapse to the most confident; invalid SMILES rank last
+    assert [(c['smiles'], c['canonical_smiles'], c['is_valid']) for c in first.candidates] == [
+        ('CCO', 'CCO', True), ('C1CC', None, False)]
+    assert second.smiles == 'CCN'
+
+
+def test_canonicalization_falls_back_in_process_when_pool_is_shut_down(pool):
+    pool.closed = True
+    client = _client(FakeSession((200, {'success': True, 'data': _ok('OCC')})))
+
+    result = asyncio.run(client.generate('ethanol'))
+    assert result.candidates[0]['canonical_smiles'] == 'CCO'
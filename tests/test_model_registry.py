@@ -0,0 +1,33 @@
+import asyncio
+
+from services import model_clients
+from services.health_monitor import health_monitor
+from services.molecule_service import normalize_model_name
+
+
+def test_env_overrides_set_after_import_apply_at_startup(monkeypatch):
+    # backend/.env may only be loaded after services are imported
+    monkeypatch.setenv('MOLT5_API_URLS', 'http://a:5002/api/text2mol, http://b:5002/api/text2mol')
+    monkeypatch.setenv('MODEL_LOAD_BALANCING', 'p2c')
+
+    async def scenario():
+        await model_clients.start_model_clients()
+        try:
+            # Loaded in place, so the health monitor probes the same clients
+            return await model_clients.get_model_client('molt5'), health_monitor.clients.get('molt5')
+        finally:
+            await model_clients.close_model_clients()
+            model_clients.MODEL_CLIENTS.clear()
+
+    client, monitored = asyncio.run(scenario())
+    assert client.replica_urls == ['http://a:5002/api/text2mol', 'http://b:5002/api/text2mol']
+    assert client.spec.load_balancing == 'p2c'
+    assert monitored is client
+
+
+def test_registry_is_resolved_lazily_outside_the_app(monkeypatch):
+    monkeypatch.setattr(model_clients, 'MODEL_CLIENTS', {})
+    monkeypatch.setenv('MODEL_REGISTRY_JSON',
+                       '{"models": [{"name": "m1", "aliases": ["First"], "urls": ["http://m1/api/text2mol"]}]}')
+    assert normalize_model_name('FIRST') == 'm1'
+    assert list(model_clients.get_model_clients()) == ['m1']
@@ -0,0 +1,24 @@
+from services.mol_cache import MolCache
+
+
+def test_parses_once_and_caches_invalid_smiles():
+    cache = MolCache(max_entries=10)
+    assert cache.canonical('OCC') == 'CCO'
+    assert cache.get_mol('OCC') is cache.get_mol('OCC')
+    assert cache.canonical('not a smiles') is None
+    assert cache.get_mol('not a smiles') is None
+    stats = cache.stats()
+    assert (stats['misses'], stats['hits']) == (2, 3)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = MolCache(max_entries=2)
+    cache.canonical('C')
+    cache.canonical('CC')
+    cache.canonical('C')  # Refreshes C, so CC is the oldest
+    cache.canonical('CCC')
+    assert cache.stats()['evictions'] == 1
+    cache.canonical('C')
+    assert cache.stats()['misses'] == 3
+    cache.canonical('CC')
+    assert cache.stats()['misses'] == 4
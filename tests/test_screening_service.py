@@ -0,0 +1,53 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from services import screening_service
+from services.screening_service import ScreeningJobs
+
+mongomock_motor = pytest.importorskip('mongomock_motor')
+
+
+class FakeTargets:
+    targets = {'kinase': SimpleNamespace(target_id='kinase', center=(0.0, 0.0, 0.0))}
+
+    async def get_grids(self, target_id):
+        return None
+
+    def grid_dir(self, target_id):
+        return '/tmp/kinase'
+
+
+class FakePool:
+    max_workers = 2
+
+    async def run(self, fn, ligands, *args, timeout=None):
+        return [{'smiles': smiles, 'affinity': -7.0, 'score_breakdown': {'vdw': -7.0}} for smiles in ligands]
+
+
+def test_resume_recounts_results_stored_before_a_crash(monkeypatch):
+    monkeypatch.setattr(screening_service, 'target_store', FakeTargets())
+    monkeypatch.setattr(screening_service, 'chem_executor', FakePool())
+
+    async def scenario():
+        db = mongomock_motor.AsyncMongoMockClient()['test']
+        jobs = ScreeningJobs(chunk_size=1)
+        jobs._db = db
+        await db.screening_jobs.insert_one({
+            'id': 'job', 'target_id': 'kinase', 'status': 'running', 'total': 4, 'completed': 0,
+            'failed': 0, 'search': {}, 'started_at': None, 'ligands': ['C', 'CC', 'CCC', 'CCCC'],
+        })
+        # Results of the first chunks were inserted, the crash hit before their $inc
+        await db.screening_results.insert_many([
+            {'job_id': 'job', 'index': 0, 'smiles': 'C', 'affinity': -9.5, 'error': None},
+            {'job_id': 'job', 'index': 1, 'smiles': 'CC', 'affinity': None, 'error': 'embedding failed'},
+        ])
+        await jobs._run('job')
+        return await jobs.get('job')
+
+    job = asyncio.run(scenario())
+    assert job['status'] == 'completed'
+    assert (job['completed'], job['failed']) == (3, 1)
+    assert job['best_affinity'] == -9.5
+    assert job['progress'] == 1.0
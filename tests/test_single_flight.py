@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from services.single_flight import SingleFlight, make_flight_key, normalize_prompt
+
+
+def test_normalize_prompt_collapses_whitespace_and_unicode_forms():
+    assert normalize_prompt('  caffeine\n  analog ') == 'caffeine analog'
+    assert normalize_prompt('café') == normalize_prompt('café')
+
+
+def test_flight_key_separates_call_modes():
+    base = make_flight_key('aspirin', 'molt5', {'num_beams': 5})
+    assert base == make_flight_key(' aspirin ', 'molt5', {'num_beams': 5})
+    assert make_flight_key('aspirin', 'molt5', {'num_beams': 5}, hedge=True) != base
+    assert make_flight_key('aspirin', 'molt5', {'num_beams': 5}, batched=True) != base
+    assert make_flight_key('aspirin', 'molt5', {'num_beams': 5}, hedge=False, batched=False) == \
+        make_flight_key('aspirin', 'molt5', {'num_beams': 5}, batched=False, hedge=False)
+
+
+def test_concurrent_callers_share_one_call():
+    async def scenario():
+        flight = SingleFlight()
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return 'CCO'
+
+        results = await asyncio.gather(*(flight.do('k', work) for _ in range(5)))
+        return results, calls, flight.stats()
+
+    results, calls, stats = asyncio.run(scenario())
+    assert results == ['CCO'] * 5
+    assert calls == 1
+    assert stats == {'calls': 5, 'executed': 1, 'coalesced': 4, 'in_flight': 0}
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError('model down')
+
+        outcomes = await asyncio.gather(flight.do('k', fail), flight.do('k', fail), return_exceptions=True)
+        again = await flight.do('k', _value('ok'))
+        return outcomes, again
+
+    outcomes, again = asyncio.run(scenario())
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+    assert again == 'ok'
+
+
+def _value(value):
+    async def fn():
+        return value
+    return fn
+
+
+def test_one_waiter_cancelling_does_not_cancel_the_others():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.02)
+            return 'CCO'
+
+        first = asyncio.create_task(flight.do('k', work))
+        second = asyncio.create_task(flight.do('k', work))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second, first
+
+    result, first = asyncio.run(scenario())
+    assert result == 'CCO'
+    assert first.cancelled()
+
+
+def test_caller_arriving_while_abandoned_call_is_cancelling_starts_a_fresh_call():
+    async def scenario():
+        flight = SingleFlight()
+        started = 0
+
+        async def work():
+            nonlocal started
+            started += 1
+            await asyncio.sleep(0.05)
+            return started
+
+        only_waiter = asyncio.create_task(flight.do('k', work))
+        await asyncio.sleep(0)
+        only_waiter.cancel()
+        await asyncio.sleep(0)  # The waiter's cleanup cancels the upstream task, which has not finished yet
+        result = await flight.do('k', work)
+        return result, started
+
+    result, started = asyncio.run(scenario())
+    assert (result, started) == (2, 2)
+
+
+def test_abandoned_call_is_cancelled():
+    async def scenario():
+        flight = SingleFlight()
+        upstream_cancelled = asyncio.Event()
+
+        async def work():
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                upstream_cancelled.set()
+                raise
+
+        waiter = asyncio.create_task(flight.do('k', work))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        await asyncio.wait_for(upstream_cancelled.wait(), 1)
+        return flight.stats()['in_flight']
+
+    assert asyncio.run(scenario()) == 0
@@ -0,0 +1,89 @@
+import asyncio
+import json
+
+from models import GenerationRecord, SingleModelResult
+from services import streaming
+
+
+def _result(model_name):
+    return SingleModelResult(model_name=model_name, smiles='CCO', confidence=0.9, execution_time=0.1)
+
+
+def _fake_models(delays):
+    """stream_molecules stand-in: model i finishes after delays[i] seconds"""
+
+    async def stream_molecules(prompt, models, num_candidates=1, **kwargs):
+        tasks = [asyncio.create_task(asyncio.sleep(delay, (i, _result(models[i])))) for i, delay in enumerate(delays)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return stream_molecules
+
+
+class Persist:
+    def __init__(self):
+        self.saved = []
+
+    async def __call__(self, results):
+        self.saved.append([result.model_name for result in results])
+        return GenerationRecord(prompt='ethanol', results=results)
+
+
+def _events(monkeypatch, delays, persist, fmt='ndjson'):
+    monkeypatch.setattr(streaming, 'stream_molecules', _fake_models(delays))
+    return streaming.stream_generation_events('ethanol', ['a', 'b', 'c'], fmt, persist)
+
+
+def test_results_stream_in_completion_order_then_the_record(monkeypatch):
+    persist = Persist()
+
+    async def scenario():
+        return [json.loads(line) async for line in _events(monkeypatch, [0.03, 0.01, 0.02], persist)]
+
+    events = asyncio.run(scenario())
+    assert [event['type'] for event in events] == ['result', 'result', 'result', 'record']
+    assert [event['data']['index'] for event in events[:3]] == [1, 2, 0]
+    assert [r['model_name'] for r in events[3]['data']['results']] == ['a', 'b', 'c']
+    assert persist.saved == [['a', 'b', 'c']]
+
+
+def test_sse_frames():
+    frame = streaming.format_event('result', {'index': 0}, 'sse')
+    assert frame == 'event: result\ndata: {"index": 0}\n\n'
+
+
+def test_disconnect_saves_the_results_that_arrived(monkeypatch):
+    persist = Persist()
+
+    async def scenario():
+        events = _events(monkeypatch, [0.01, 5, 0.02], persist)
+        await events.__anext__()
+        await events.__anext__()
+        await events.aclose()  # Client went away
+
+    asyncio.run(scenario())
+    assert persist.saved == [['a', 'c']]
+
+
+def test_cancelled_stream_still_saves(monkeypatch):
+    persist = Persist()
+
+    async def scenario():
+        events = _events(monkeypatch, [0.01, 5, 5], persist)
+
+        async def consume():
+            async for _ in events:
+                pass
+
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.1)
+        task.cancel()  # The server cancels the response task on disconnect
+        await asyncio.gather(task, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert persist.saved == [['a']]
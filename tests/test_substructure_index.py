@@ -0,0 +1,116 @@
+import asyncio
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from rdkit import Chem
+
+from routes import molecule_routes
+from services import chem_tasks, fingerprint_index, substructure_index as substructure_module
+from services.substructure_index import SubstructureIndex, screen
+
+MOLECULES = [
+    'CCO', 'CC(=O)O', 'CC(=O)Oc1ccccc1C(=O)O', 'c1ccccc1', 'Cc1ccccc1', 'c1ccncc1',
+    'CCN(CC)CC', 'NCC(=O)O', 'C1CCCCC1', 'O=C1CCCCC1', 'c1ccc2ccccc2c1', 'CC(C)Cc1ccc(C(C)C(=O)O)cc1',
+    'Cn1cnc2c1c(=O)n(C)c(=O)n2C', 'OC[C@H]1OC(O)[C@H](O)[C@@H](O)[C@@H]1O', 'ClC(Cl)Cl', 'C#N',
+    'CCS', 'c1ccsc1', 'FC(F)(F)c1ccccc1', 'CC(=O)Nc1ccc(O)cc1',
+]
+QUERIES = [
+    'c1ccccc1', 'C(=O)[OH]', '[#7]', 'C=O', '[CX4][OX2H]', 'a', '[R2]', '[$(C=O)]N',
+    '[Cl,F]', 'C-,=C', '[!#6;!#1]', 'S', 'c1ccccn1', 'C1CCCCC1', '[CH3]', 'C#N',
+]
+
+
+class InlinePool:
+    """Runs chem tasks in-process instead of the process pool"""
+
+    max_workers = 2
+
+    async def run(self, fn, *args, timeout=None, **kwargs):
+        return fn(*args, **kwargs)
+
+    async def map(self, fn, items, **kwargs):
+        return [fn(item, **kwargs) for item in items]
+
+
+@pytest.fixture
+def index(monkeypatch):
+    pool = InlinePool()
+    monkeypatch.setattr(substructure_module, 'chem_executor', pool)
+    monkeypatch.setattr(fingerprint_index, 'chem_executor', pool)
+    index = SubstructureIndex(n_bits=1024)
+    docs = [
+        {'id': f'r{i}', 'experiment_id': 'even' if i % 2 == 0 else None,
+         'results': [{'smiles': smiles, 'model_name': 'molt5'}]}
+        for i, smiles in enumerate(MOLECULES)
+    ]
+    asyncio.run(index.add_docs(docs))
+    return index
+
+
+def _brute_force(smarts, molecules=MOLECULES):
+    query = Chem.MolFromSmarts(smarts)
+    return [smiles for smiles in molecules if Chem.MolFromSmiles(smiles).HasSubstructMatch(query)]
+
+
+def _fingerprints(n_bits=1024):
+    packed, valid = chem_tasks.pattern_fingerprints(MOLECULES, n_bits=n_bits)
+    assert all(valid)
+    return np.frombuffer(packed, dtype=np.uint64).reshape(len(MOLECULES), -1)
+
+
+@pytest.mark.parametrize('smarts', QUERIES)
+def test_screen_never_drops_a_true_match(smarts):
+    fps = _fingerprints()
+    query = np.frombuffer(chem_tasks.query_pattern_fingerprint(smarts, n_bits=1024), dtype=np.uint64)
+    survivors = {MOLECULES[i] for i in screen(fps, np.full(len(MOLECULES), -1, dtype=np.int32), query,
+                                              block_rows=3)}
+    assert set(_brute_force(smarts)) <= survivors
+
+
+def test_screen_filters_experiment_and_returns_last_row_first():
+    fps = _fingerprints()
+    query = np.frombuffer(chem_tasks.query_pattern_fingerprint('[#6]', n_bits=1024), dtype=np.uint64)
+    experiments = np.array([i % 3 for i in range(len(MOLECULES))], dtype=np.int32)
+    rows = screen(fps, experiments, query, experiment_code=1, block_rows=4)
+    assert list(rows) == sorted(rows, reverse=True)
+    assert rows.size and all(experiments[rows] == 1)
+
+
+@pytest.mark.parametrize('smarts', QUERIES)
+def test_search_agrees_with_brute_force(index, smarts):
+    page = asyncio.run(index.search(smarts, limit=100))
+    assert sorted(hit['smiles'] for hit in page['hits']) == sorted(_brute_force(smarts))
+    assert page['next_cursor'] is None
+
+
+def test_pages_cover_every_match_once(index):
+    expected = _brute_force('[#6]')
+    seen = []
+    cursor = None
+    while True:
+        page = asyncio.run(index.search('[#6]', limit=4, cursor=cursor))
+        seen += [hit['smiles'] for hit in page['hits']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted(expected) and len(seen) == len(set(seen))
+    assert seen == [smiles for smiles in reversed(MOLECULES) if smiles in expected]
+
+
+def test_experiment_filter(index):
+    page = asyncio.run(index.search('[#6]', limit=100, experiment_id='even'))
+    assert {hit['experiment_id'] for hit in page['hits']} == {'even'}
+    assert asyncio.run(index.search('[#6]', experiment_id='unknown'))['hits'] == []
+
+
+@pytest.mark.parametrize('smarts', ['[C', 'C1CC', '((C))', ''])
+def test_invalid_smarts_is_a_client_error(index, monkeypatch, smarts):
+    monkeypatch.setattr(molecule_routes, 'substructure_index', index)
+    app = FastAPI()
+    app.include_router(molecule_routes.router)
+
+    response = TestClient(app).get('/molecules/substructure', params={'smarts': smarts})
+    assert response.status_code == 400
+    assert response.json()['detail'] == 'Invalid SMARTS pattern'
@@ -0,0 +1,130 @@
+import asyncio
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import simulation_routes
+from services import chem_tasks
+from services import target_store as target_store_module
+from services.target_store import MOCK_PROTEIN_PDB, MOCK_SITE_DISTANCE, TargetStore, TargetUnavailable, mock_pdb
+
+RECEPTOR_PDB = MOCK_PROTEIN_PDB.replace('ALA', 'GLY')
+
+
+class InlinePool:
+    """Runs chem tasks in a thread instead of the process pool, counting them"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def run(self, fn, *args, timeout=None, **kwargs):
+        self.calls += 1
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = InlinePool()
+    monkeypatch.setattr(target_store_module, 'chem_executor', pool)
+    return pool
+
+
+def _store(tmp_path):
+    return TargetStore(str(tmp_path), grid_size=4, grid_spacing=1, fetch_url='')
+
+
+def _cache_dirs(store):
+    return sorted(path.name for path in store.cache_root.iterdir() if path.is_dir())
+
+
+def test_target_without_structure_is_docked_against_the_mock(tmp_path, pool):
+    store = _store(tmp_path)
+
+    async def scenario():
+        await store.get_grids('hiv_protease')
+        return await store.get_pdb_text('hiv_protease')
+
+    assert asyncio.run(scenario()) == mock_pdb(store.targets['hiv_protease'].center)
+    assert store._status['hiv_protease'] == 'mock'
+
+
+def test_mock_structure_sits_beside_the_target_center(tmp_path, pool):
+    store = _store(tmp_path)
+    center = np.asarray(store.targets['hiv_protease'].center)
+    asyncio.run(store.get_grids('hiv_protease'))
+
+    coords = np.asarray(store.get_atoms('hiv_protease')['coords'])
+    assert np.allclose(coords.mean(axis=0), center - (0, 0, MOCK_SITE_DISTANCE), atol=1e-3)
+    # Same shape as the template, only moved
+    template = np.array([[float(line[30:38]), float(line[38:46]), float(line[46:54])]
+                         for line in MOCK_PROTEIN_PDB.splitlines()])
+    assert np.allclose(coords - coords.mean(axis=0), template - template.mean(axis=0), atol=1e-3)
+
+
+def test_mock_scores_rank_ligands(tmp_path, pool):
+    store = TargetStore(str(tmp_path), grid_size=16, grid_spacing=0.5, fetch_url='')
+    target = store.targets['covid_protease']
+    asyncio.run(store.get_grids('covid_protease'))
+    search = {'rotations': 16, 'translation_range': 2.0, 'translation_step': 1.0, 'refine_rounds': 1}
+
+    scores = {}
+    for smiles in ('C', 'CCO', 'c1ccccc1O'):
+        molblock = chem_tasks.embed_3d(smiles)
+        docked = chem_tasks.dock_molblock(molblock, store.grid_dir('covid_protease'), target.center, search,
+                                          include_pdb=False)
+        scores[smiles] = docked['score_breakdown']
+    # Every ligand touches the mock receptor, and larger ones make more contacts
+    assert all(terms['van_der_waals'] < 0 for terms in scores.values())
+    assert scores['c1ccccc1O']['van_der_waals'] < scores['CCO']['van_der_waals'] < scores['C']['van_der_waals']
+
+
+def test_register_replaces_the_previous_cache(tmp_path, pool):
+    store = _store(tmp_path)
+
+    async def scenario():
+        await store.register('kinase', 'Kinase', (0.0, 0.0, 0.0))
+        mock_dirs = _cache_dirs(store)
+        await store.register('kinase', 'Kinase', (0.0, 0.0, 0.0), pdb_text=RECEPTOR_PDB)
+        return mock_dirs, _cache_dirs(store), await store.get_pdb_text('kinase')
+
+    mock_dirs, dirs, pdb_text = asyncio.run(scenario())
+    assert len(mock_dirs) == 1 and len(dirs) == 1 and dirs != mock_dirs
+    assert pdb_text == RECEPTOR_PDB
+    assert store._status['kinase'] == 'ready'
+
+
+def test_register_with_unchanged_structure_reuses_the_cache(tmp_path, pool):
+    store = _store(tmp_path)
+
+    async def scenario():
+        await store.register('kinase', 'Kinase', (0.0, 0.0, 0.0), pdb_text=RECEPTOR_PDB)
+        await store.register('kinase', 'Kinase renamed', (0.0, 0.0, 0.0), pdb_text=RECEPTOR_PDB)
+
+    asyncio.run(scenario())
+    assert pool.calls == 1
+    assert len(_cache_dirs(store)) == 1
+
+
+def test_pdb_text_of_unknown_or_unprepared_target(tmp_path, pool):
+    store = _store(tmp_path)
+    with pytest.raises(TargetUnavailable):
+        asyncio.run(store.get_pdb_text('nope'))
+    with pytest.raises(TargetUnavailable):
+        asyncio.run(store.get_pdb_text('hiv_protease'))
+
+
+def test_docking_route_maps_unavailable_targets(monkeypatch):
+    async def dock(smiles, target_id):
+        raise TargetUnavailable('failed: bad structure')
+
+    monkeypatch.setattr(simulation_routes.docking_engine, 'dock', dock)
+    app = FastAPI()
+    app.include_router(simulation_routes.router)
+    client = TestClient(app)
+
+    unknown = client.post('/simulation/docking/run', json={'ligand_smiles': 'CCO', 'target_id': 'nope'})
+    failed = client.post('/simulation/docking/run', json={'ligand_smiles': 'CCO', 'target_id': 'hiv_protease'})
+    assert unknown.status_code == 404
+    assert failed.status_code == 503
@@ -0,0 +1,44 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from services.timestamp_migration import MIGRATION_ID, migrate_timestamps, parse_timestamp
+
+mongomock_motor = pytest.importorskip('mongomock_motor')
+
+
+def test_parse_timestamp():
+    assert parse_timestamp('2026-01-02T03:04:05+00:00') == datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    assert parse_timestamp('2026-01-02T03:04:05').tzinfo == timezone.utc  # Naive strings are UTC
+    assert parse_timestamp('yesterday') is None
+
+
+def test_converts_strings_resumes_from_checkpoint_and_counts_unparseable():
+    async def scenario():
+        db = mongomock_motor.AsyncMongoMockClient()['test']
+        await db.generation_history.insert_many([
+            {'_id': i, 'id': f'r{i}', 'created_at': f'2026-01-0{i + 1}T00:00:00+00:00'} for i in range(3)
+        ] + [{'_id': 3, 'id': 'r3', 'created_at': 'garbage'}])
+        await db.experiments.insert_one({
+            '_id': 0, 'id': 'exp', 'created_at': '2026-01-01T00:00:00',
+            'last_run': {'id': 'r2', 'created_at': '2026-01-03T00:00:00+00:00'},
+        })
+        # An earlier run stopped after the first generation_history document
+        await db.migrations.insert_one({'_id': MIGRATION_ID, 'collections': {'generation_history': {
+            'last_id': 0, 'converted': 1, 'unparseable': 0, 'done': False}}})
+
+        summary = await migrate_timestamps(db, batch_size=2)
+        again = await migrate_timestamps(db, batch_size=2)
+        history = await db.generation_history.find({}, {'_id': 1, 'created_at': 1}).sort('_id', 1).to_list(10)
+        return summary, again, history, await db.experiments.find_one({'id': 'exp'})
+
+    summary, again, history, experiment = asyncio.run(scenario())
+    assert summary['generation_history'] == {'last_id': 3, 'converted': 3, 'unparseable': 1, 'done': True}
+    assert summary['experiments']['converted'] == 1
+    assert isinstance(history[1]['created_at'], datetime) and isinstance(history[2]['created_at'], datetime)
+    assert history[0]['created_at'] == '2026-01-01T00:00:00+00:00'  # Before the checkpoint: left to the earlier run
+    assert history[3]['created_at'] == 'garbage'
+    assert isinstance(experiment['created_at'], datetime)
+    assert isinstance(experiment['last_run']['created_at'], datetime)
+    assert again == summary  # Finished collections are skipped